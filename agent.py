@@ -2,28 +2,46 @@ from __future__ import annotations
 
 import asyncio
 import json
+import logging
+import time
 from collections.abc import AsyncGenerator
+from concurrent.futures import Executor
+from contextlib import aclosing
 from typing import Any, TypedDict, Union
 
+from opentelemetry.trace import Span
+
+from answer_cache import AnswerCache
+from executors import Executors, run_in
+from history import HistoryManager, approximate_token_count
+from metrics import MetricsSink
 from providers import (
     ChatMessage,
     LLMProvider,
-    StreamDelta,
     SystemMessage,
     ToolCall,
     UserMessage,
 )
-from tools import ToolRegistry
+from providers.embedding_cache import EmbeddingCache
+from providers.scheduler import CONTINUATION, NEW_REQUEST, GenerationTicket, scheduling
+from routing import choose_mode
+from streaming import ThinkingFilter, ToolCallAssembler
+from tools import PrefetchResult, Tool, ToolRegistry
+from tracing import call_in_span, start_span
+
+log = logging.getLogger(__name__)
 
 
 class ToolStartEvent(TypedDict):
     type: str
+    id: str
     tool: str
     arguments: dict[str, Any]
 
 
 class ToolEndEvent(TypedDict):
     type: str
+    id: str
     tool: str
     success: bool
 
@@ -33,6 +51,11 @@ class AnswerChunkEvent(TypedDict):
     chunk: str
 
 
+class ThinkingChunkEvent(TypedDict):
+    type: str
+    chunk: str
+
+
 class AnswerDoneEvent(TypedDict):
     type: str
 
@@ -42,7 +65,314 @@ class ErrorEvent(TypedDict):
     message: str
 
 
-AgentEvent = Union[ToolStartEvent, ToolEndEvent, AnswerChunkEvent, AnswerDoneEvent, ErrorEvent]
+class StatsEvent(TypedDict):
+    type: str
+    stats: dict[str, Any]
+
+
+AgentEvent = Union[
+    ToolStartEvent, ToolEndEvent, AnswerChunkEvent, ThinkingChunkEvent, AnswerDoneEvent, ErrorEvent, StatsEvent,
+]
+
+
+AGENT_MODES = ("auto", "tools", "direct")
+# Assumed cost of a generation under a latency budget, until the run has timed one
+DEFAULT_GENERATION_SECONDS = 2.0
+MIN_TOOL_TIMEOUT = 1.0
+DIRECT_CONTEXT_PROMPT = "Answer the question using these handbook search results:"
+
+
+class RunStats:
+    """Latency and token accounting for one Agent.run.
+
+    Each generation records the time it waited for a scheduler slot, its time
+    to first token after that and its streaming rate, and each tool call its
+    wall time. Output tokens are counted as streamed
+    deltas, which LM Studio sends one token at a time. The same points open
+    and close the run's tracing spans.
+    """
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.generations = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.iterations: list[dict[str, Any]] = []
+        self.tools: list[dict[str, Any]] = []
+        self.soft_cap = False
+        self.error = False
+        self.deadline: float | None = None  # perf_counter time the answer is due by, if budgeted
+        self._generation_started: float | None = None
+        self._first_token: float | None = None
+        self._generation_tokens = 0
+        self.ticket = GenerationTicket()
+        # New spans are children of the current iteration's span, or of the run's
+        self.span = start_span("agent.run", mode=mode)
+        self.parent: Span = self.span
+        self._generation_span: Span | None = None
+
+    def start_iteration(self, iteration: int) -> None:
+        self.end_iteration()
+        self.parent = start_span("agent.iteration", self.span, iteration=iteration)
+
+    def end_iteration(self) -> None:
+        if self.parent is not self.span:
+            self.parent.end()
+            self.parent = self.span
+
+    def start_generation(self, prompt_tokens: int) -> None:
+        self.generations += 1
+        self.prompt_tokens += prompt_tokens
+        self._generation_started = time.perf_counter()
+        self._first_token = None
+        self._generation_tokens = 0
+        self._generation_span = start_span("llm.generate_stream", self.parent, prompt_tokens=prompt_tokens)
+        # Later rounds of a run go ahead of new requests when generations are queued
+        self.ticket = GenerationTicket(CONTINUATION if self.generations > 1 else NEW_REQUEST)
+
+    def count_token(self) -> None:
+        if self._first_token is None:
+            self._first_token = time.perf_counter()
+        self._generation_tokens += 1
+        self.output_tokens += 1
+
+    def end_generation(self) -> None:
+        if self._generation_started is None:
+            return
+        now = time.perf_counter()
+        first = self._first_token if self._first_token is not None else now
+        streaming = now - first
+        queue_wait = self.ticket.queue_wait
+        generation = {
+            "seconds": now - self._generation_started,
+            "queue_wait": queue_wait,
+            "ttft": first - self._generation_started - queue_wait,
+            "tokens": self._generation_tokens,
+            "tokens_per_sec": self._generation_tokens / streaming if streaming > 0 else 0.0,
+        }
+        self.iterations.append(generation)
+        self._generation_started = None
+        if self._generation_span is not None:
+            self._generation_span.set_attributes({
+                "output_tokens": generation["tokens"],
+                "queue_wait": queue_wait,
+                "ttft": generation["ttft"],
+                "tokens_per_sec": generation["tokens_per_sec"],
+            })
+            self._generation_span.end()
+            self._generation_span = None
+
+    def remaining(self) -> float | None:
+        return None if self.deadline is None else self.deadline - time.perf_counter()
+
+    def generation_estimate(self) -> float:
+        """Longest generation of this run so far, or a default before one has finished."""
+        return max((g["seconds"] for g in self.iterations), default=DEFAULT_GENERATION_SECONDS)
+
+    def tool_timeout(self) -> float | None:
+        """Time a tool may take and still leave room for the generation that reads its result."""
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        return max(MIN_TOOL_TIMEOUT, remaining - self.generation_estimate())
+
+    def record_tool(self, tc: ToolCall, seconds: float, success: bool) -> None:
+        self.tools.append({"id": tc.id, "tool": tc.name, "seconds": seconds, "success": success})
+
+    def degraded(self) -> bool:
+        """Whether the answer may be worse than an unhurried run's: cut short, budgeted, or missing tool results."""
+        return (
+            self.soft_cap
+            or self.error
+            or self.deadline is not None
+            or not all(tool["success"] for tool in self.tools)
+        )
+
+    def as_dict(self, cancelled: bool = False) -> dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "cancelled": cancelled,
+            "latency": time.perf_counter() - self.started,
+            "generations": self.generations,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+            "iterations": self.iterations,
+            "tools": self.tools,
+            "soft_cap": self.soft_cap,
+            "error": self.error,
+        }
+
+    def finish(self, cancelled: bool) -> None:
+        """Close any open spans once the run is over."""
+        self.end_generation()
+        self.end_iteration()
+        self.span.set_attributes({
+            "cancelled": cancelled,
+            "error": self.error,
+            "soft_cap": self.soft_cap,
+            "generations": self.generations,
+            "prompt_tokens": self.prompt_tokens,
+            "output_tokens": self.output_tokens,
+        })
+        self.span.end()
+
+    def log_summary(self) -> None:
+        log.info(
+            f"Run finished: mode={self.mode} latency={time.perf_counter() - self.started:.2f}s "
+            f"generations={self.generations} prompt_tokens={self.prompt_tokens} output_tokens={self.output_tokens}"
+        )
+
+
+class CancellationStats:
+    """Counters for runs abandoned by the client before the answer finished.
+
+    Tokens saved is an estimate: the average output of completed runs minus
+    what the cancelled run had already generated.
+    """
+
+    def __init__(self) -> None:
+        self.completed = 0
+        self.cancelled = 0
+        self.tokens_saved = 0
+        self._completed_tokens = 0
+
+    def record(self, stats: RunStats, cancelled: bool) -> None:
+        if not cancelled:
+            self.completed += 1
+            self._completed_tokens += stats.output_tokens
+            return
+        self.cancelled += 1
+        if self.completed:
+            self.tokens_saved += max(0, self._completed_tokens // self.completed - stats.output_tokens)
+        log.info(f"Run cancelled by client: {self.as_dict()}")
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+class PrefetchStats:
+    """Counters for speculative prefetches, used to judge whether the mode pays off."""
+
+    def __init__(self) -> None:
+        self.started = 0
+        self.reused = 0  # the model asked for (nearly) the prefetched search
+        self.merged = 0  # results were merged into a different search
+        self.unused = 0  # the model never called the tool
+        self.time_saved = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "started": self.started,
+            "reused": self.reused,
+            "merged": self.merged,
+            "unused": self.unused,
+            "hit_rate": self.reused / self.started if self.started else 0.0,
+            "time_saved": self.time_saved,
+        }
+
+
+class _Prefetch:
+    """Speculative call of one tool on the raw user input, started with the turn."""
+
+    def __init__(self, tool: Tool, input: str, stats: PrefetchStats, parent: Span, executor: Executor | None):
+        self.tool_name = tool.name
+        self._stats = stats
+        span = start_span("tool.prefetch", parent, tool=tool.name)
+        self._task = asyncio.ensure_future(run_in(executor, call_in_span, span, tool.prefetch, input))
+        self._task.add_done_callback(lambda _: span.end())
+        self._taken = False
+        self._waited = 0.0
+        self._result: PrefetchResult | None = None
+        stats.started += 1
+
+    async def take(self, tc: ToolCall) -> PrefetchResult | None:
+        """Hand the prefetch to the first call of its tool; later calls get None."""
+        if self._taken or tc.name != self.tool_name:
+            return None
+        self._taken = True
+        started = time.perf_counter()
+        try:
+            self._result = await self._task
+        except Exception:
+            log.warning("Prefetch failed", exc_info=True)
+        self._waited = time.perf_counter() - started
+        return self._result
+
+    def finish(self) -> None:
+        """Record the outcome once the turn is over."""
+        if not self._taken:
+            self._task.cancel()
+            self._stats.unused += 1
+        elif self._result is not None and self._result.reused:
+            self._stats.reused += 1
+            self._stats.time_saved += max(0.0, self._result.elapsed - self._waited)
+        elif self._result is not None:
+            self._stats.merged += 1
+        log.info(f"Prefetch stats: {self._stats.as_dict()}")
+
+
+class _ToolBatch:
+    """Tool calls dispatched during one agent turn, run concurrently up to a limit."""
+
+    def __init__(self, agent: Agent, limit: int, stats: RunStats, prefetch: _Prefetch | None = None):
+        self._agent = agent
+        self._stats = stats
+        self._prefetch = prefetch
+        self._semaphore = asyncio.Semaphore(limit)
+        self._pending: dict[asyncio.Future, int] = {}
+        self.calls: list[ToolCall] = []
+        self.results: list[tuple[str, bool]] = []
+
+    def start(self, tc: ToolCall) -> None:
+        self._pending[asyncio.ensure_future(self._run(tc))] = len(self.calls)
+        self.calls.append(tc)
+        self.results.append(("", False))
+
+    async def _run(self, tc: ToolCall) -> tuple[str, bool]:
+        async with self._semaphore:
+            return await self._agent._execute_tool(tc, self._stats, self._prefetch)
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._pending)
+
+    def pop_finished(self) -> list[int]:
+        """Collect results of calls that have finished, returning their indices."""
+        finished = []
+        for task in [t for t in self._pending if t.done()]:
+            index = self._pending.pop(task)
+            self.results[index] = task.result()
+            finished.append(index)
+        return finished
+
+    async def wait_next(self) -> list[int]:
+        await asyncio.wait(list(self._pending), return_when=asyncio.FIRST_COMPLETED)
+        return self.pop_finished()
+
+    def cancel(self) -> list[int]:
+        """Cancel the calls still running, returning their indices."""
+        cancelled = sorted(self._pending.values())
+        for task in self._pending:
+            task.cancel()
+        self._pending.clear()
+        return cancelled
+
+    def abandon(self) -> list[ToolEndEvent]:
+        """Cancel what is still running; tool_end events for every call whose end was not reported yet."""
+        events = [
+            ToolEndEvent(type="tool_end", id=self.calls[i].id, tool=self.calls[i].name, success=self.results[i][1])
+            for i in self.pop_finished()
+        ]
+        events.extend(
+            ToolEndEvent(type="tool_end", id=self.calls[i].id, tool=self.calls[i].name, success=False)
+            for i in self.cancel()
+        )
+        return events
 
 
 class Agent:
@@ -52,41 +382,272 @@ class Agent:
         registry: ToolRegistry,
         system_prompt: str,
         max_iterations: int = 5,
+        max_parallel_tools: int = 4,
+        emit_thinking: bool = False,
+        history: HistoryManager | None = None,
+        answer_cache: AnswerCache | None = None,
+        embedding_cache: EmbeddingCache | None = None,
+        prefetch_tool: str | None = None,
+        mode: str = "tools",
+        retrieval_tool: str | None = None,
+        emit_stats: bool = False,
+        metrics: MetricsSink | None = None,
+        executors: Executors | None = None,
     ):
         self.provider = provider
         self.registry = registry
         self.system_prompt = system_prompt
         self.max_iterations = max_iterations
+        self.max_parallel_tools = max_parallel_tools
+        self.emit_thinking = emit_thinking
+        self.history = history
+        self.answer_cache = answer_cache
+        # Used by the provider's CachedEmbeddingProvider; kept here so its hit rate can be reported
+        self.embedding_cache = embedding_cache
+        # Opt-in: speculatively run this tool on the raw input while the first generation streams
+        self.prefetch_tool = prefetch_tool
+        self.prefetch_stats = PrefetchStats()
+        self.cancellation_stats = CancellationStats()
+        # "tools" runs the tool loop, "direct" retrieves with retrieval_tool and answers in one
+        # generation, "auto" picks per question
+        self.mode = mode
+        self.retrieval_tool = retrieval_tool
+        # Per-run timings go to the metrics sink, and to the client as a final
+        # "stats" event when emit_stats is set
+        self.emit_stats = emit_stats
+        self.metrics = metrics
+        # Tool calls and embeddings run on their own pools so they cannot starve each other
+        self.executors = executors or Executors()
+
+    def _content_events(self, segments: list[tuple[bool, str]]) -> list[AgentEvent]:
+        """Turn ThinkingFilter segments into answer (and optionally thinking) events."""
+        events: list[AgentEvent] = []
+        for is_thinking, text in segments:
+            if not is_thinking:
+                events.append(AnswerChunkEvent(type="answer_chunk", chunk=text))
+            elif self.emit_thinking:
+                events.append(ThinkingChunkEvent(type="thinking_chunk", chunk=text))
+        return events
+
+    def _prompt(
+        self,
+        messages: list[ChatMessage],
+        history_end: int,
+        live_from: int,
+        stats: RunStats,
+    ) -> list[ChatMessage]:
+        """Messages to send for the next generation, compacted to the token budget if configured."""
+        prompt = messages
+        if self.history is not None:
+            prompt = self.history.compact(messages, history_end, live_from)
+            stats.start_generation(self.history.total_tokens(prompt))
+        else:
+            stats.start_generation(sum(approximate_token_count(m.content or "") for m in prompt))
+        return prompt
+
+    def _resolve_mode(self, input: str, mode: str) -> str:
+        if mode != "tools" and (self.retrieval_tool is None or self.registry.get(self.retrieval_tool) is None):
+            return "tools"
+        if mode == "auto":
+            return choose_mode(input)
+        return mode
+
+    async def _stream_answer(self, prompt: list[ChatMessage], stats: RunStats) -> AsyncGenerator[AgentEvent, None]:
+        """Stream a final answer without tools."""
+        content_filter = ThinkingFilter()
+        try:
+            with scheduling(stats.ticket):
+                stream = self.provider.generate_stream_async(messages=prompt)
+            async with aclosing(stream):
+                async for delta in stream:
+                    if delta.content:
+                        stats.count_token()
+                        for event in self._content_events(content_filter.feed(delta.content)):
+                            yield event
+                    if delta.finish_reason:
+                        for event in self._content_events(content_filter.flush()):
+                            yield event
+                        yield AnswerDoneEvent(type="answer_done")
+                        return
+        except Exception as e:
+            yield ErrorEvent(type="error", message=str(e))
+        finally:
+            stats.end_generation()
 
-    def _parse_tool_calls(self, deltas: list[StreamDelta]) -> list[ToolCall]:
-        """Parse buffered tool call deltas into ToolCall objects."""
-        calls: dict[int, dict] = {}
-        idx = 0
-        for d in deltas:
-            if d.tool_call_id:
-                calls[idx] = {"id": d.tool_call_id, "name": "", "arguments": ""}
-            if d.tool_call_name:
-                calls.setdefault(idx, {"id": "", "name": "", "arguments": ""})
-                calls[idx]["name"] = d.tool_call_name
-            if d.tool_call_arguments:
-                calls.setdefault(idx, {"id": "", "name": "", "arguments": ""})
-                calls[idx]["arguments"] += d.tool_call_arguments
-            if d.tool_call_id and len(calls) > 1:
-                idx += 1
-
-        result = []
-        for tc_data in calls.values():
+    async def _execute_tool(
+        self,
+        tc: ToolCall,
+        stats: RunStats,
+        prefetch: _Prefetch | None = None,
+    ) -> tuple[str, bool]:
+        """Run one tool call in a worker thread, returning (content, success).
+
+        Waiting for a prefetch counts against the same timeout as the call itself.
+        """
+        started = time.perf_counter()
+        span = start_span("tool.execute", stats.parent, tool=tc.name)
+        try:
             try:
-                args = json.loads(tc_data["arguments"]) if tc_data["arguments"] else {}
-            except json.JSONDecodeError:
-                args = {}
-            result.append(ToolCall(id=tc_data["id"], name=tc_data["name"], arguments=args))
-        return result
+                content, success = await asyncio.wait_for(self._call_tool(tc, prefetch, span), stats.tool_timeout())
+            except TimeoutError:
+                # The worker thread cannot be stopped; its result is dropped
+                content, success = f"Error: Tool '{tc.name}' timed out.", False
+            span.set_attribute("success", success)
+        finally:
+            span.end()
+        stats.record_tool(tc, time.perf_counter() - started, success)
+        return content, success
+
+    async def _call_tool(self, tc: ToolCall, prefetch: _Prefetch | None, span: Span) -> tuple[str, bool]:
+        tool = self.registry.get(tc.name)
+        if tool is None:
+            return f"Error: Tool '{tc.name}' not found.", False
+        try:
+            prefetched = await prefetch.take(tc) if prefetch is not None else None
+            if prefetched is not None:
+                result = await run_in(
+                    self.executors.tools, call_in_span, span, tool.execute_prefetched, prefetched, **tc.arguments,
+                )
+            else:
+                result = await run_in(self.executors.tools, call_in_span, span, tool.execute, **tc.arguments)
+            return result.content, result.success
+        except Exception as e:
+            return f"Error: {e}", False
+
+    def _with_retrieval_options(self, tc: ToolCall, n_results: int | None) -> ToolCall:
+        """Apply the request's retrieval settings to calls of the retrieval tool."""
+        if n_results is None or tc.name != self.retrieval_tool:
+            return tc
+        return tc.model_copy(update={"arguments": {**tc.arguments, "n_results": n_results}})
+
+    def _start_prefetch(self, input: str, stats: RunStats) -> _Prefetch | None:
+        tool = self.registry.get(self.prefetch_tool) if self.prefetch_tool else None
+        if tool is None:
+            return None
+        return _Prefetch(tool, input, self.prefetch_stats, stats.span, self.executors.tools)
 
     async def run(
         self,
         input: str,
         chat_history: list[ChatMessage],
+        mode: str | None = None,
+        latency_budget: float | None = None,
+        n_results: int | None = None,
+    ) -> AsyncGenerator[AgentEvent, None]:
+        """Answer input, streaming events.
+
+        ``latency_budget`` (seconds) cuts the tool loop short and bounds tool
+        calls so the answer starts in time; ``n_results`` overrides how many
+        results the retrieval tool fetches per query.
+        """
+        mode = mode or self.mode
+        if mode not in AGENT_MODES:
+            yield ErrorEvent(type="error", message=f"Unknown agent mode: {mode}")
+            return
+
+        # Only history-free first turns are answered from (and stored in) the cache
+        started = time.perf_counter()
+        use_cache = self.answer_cache is not None and not chat_history
+        cached, vector = None, None
+        if use_cache:
+            try:
+                cached, vector = await run_in(self.executors.embedding, self.answer_cache.lookup, input)
+            except Exception:
+                log.warning("Answer cache lookup failed", exc_info=True)
+                use_cache = False
+
+        # Cache hits are recorded as runs of their own mode, so their latency shows up next to generated answers
+        stats = RunStats("cache" if cached is not None else self._resolve_mode(input, mode))
+        stats.started = started
+        if latency_budget is not None:
+            stats.deadline = stats.started + latency_budget
+        prefetch = self._start_prefetch(input, stats) if stats.mode == "tools" else None
+        if cached is not None:
+            use_cache = False
+            events = self._replay_cached(cached)
+        elif stats.mode == "direct":
+            events = self._run_direct(input, chat_history, stats, n_results)
+        else:
+            events = self._run_loop(input, chat_history, stats, prefetch, n_results)
+
+        answer: list[str] = []
+        cancelled = False
+        try:
+            # Closing this generator (the client went away) closes the inner one
+            # right away, which ends the upstream generation and drops pending tools
+            async with aclosing(events):
+                async for event in events:
+                    if event["type"] == "error":
+                        stats.error = True
+                    if use_cache:
+                        if event["type"] == "answer_chunk":
+                            answer.append(event["chunk"])
+                        elif event["type"] == "answer_done" and answer and not stats.degraded():
+                            try:
+                                self.answer_cache.store(vector, "".join(answer))
+                            except Exception:
+                                log.warning("Answer cache store failed", exc_info=True)
+                    yield event
+            if self.emit_stats:
+                yield StatsEvent(type="stats", stats=stats.as_dict())
+        except (GeneratorExit, asyncio.CancelledError):
+            cancelled = True
+            raise
+        finally:
+            if prefetch is not None:
+                prefetch.finish()
+            # Replayed answers would drag down the average output the tokens-saved estimate uses
+            if stats.mode != "cache":
+                self.cancellation_stats.record(stats, cancelled)
+            stats.finish(cancelled)
+            stats.log_summary()
+            self._record_metrics(stats, cancelled)
+
+    async def _replay_cached(self, answer: str) -> AsyncGenerator[AgentEvent, None]:
+        yield AnswerChunkEvent(type="answer_chunk", chunk=answer)
+        yield AnswerDoneEvent(type="answer_done")
+
+    def _record_metrics(self, stats: RunStats, cancelled: bool) -> None:
+        if self.metrics is None:
+            return
+        try:
+            self.metrics.record(stats.as_dict(cancelled))
+        except Exception:
+            log.warning("Metrics sink failed", exc_info=True)
+
+    async def _run_direct(
+        self,
+        input: str,
+        chat_history: list[ChatMessage],
+        stats: RunStats,
+        n_results: int | None = None,
+    ) -> AsyncGenerator[AgentEvent, None]:
+        """Retrieve on the question server-side and answer in a single generation without tools."""
+        tc = self._with_retrieval_options(
+            ToolCall(id="direct_0", name=self.retrieval_tool, arguments={"queries": [input]}),
+            n_results,
+        )
+        yield ToolStartEvent(type="tool_start", id=tc.id, tool=tc.name, arguments=tc.arguments)
+        context, success = await self._execute_tool(tc, stats)
+        yield ToolEndEvent(type="tool_end", id=tc.id, tool=tc.name, success=success)
+
+        messages: list[ChatMessage] = [
+            SystemMessage(self.system_prompt),
+            *chat_history,
+            UserMessage(f"{input}\n\n{DIRECT_CONTEXT_PROMPT}\n\n{context}"),
+        ]
+        history_end = 1 + len(chat_history)
+        prompt = self._prompt(messages, history_end, len(messages), stats)
+        async for event in self._stream_answer(prompt, stats):
+            yield event
+
+    async def _run_loop(
+        self,
+        input: str,
+        chat_history: list[ChatMessage],
+        stats: RunStats,
+        prefetch: _Prefetch | None = None,
+        n_results: int | None = None,
     ) -> AsyncGenerator[AgentEvent, None]:
         messages: list[ChatMessage] = [
             SystemMessage(self.system_prompt),
@@ -96,83 +657,95 @@ class Agent:
 
         tool_defs = self.registry.get_tool_definitions()
         iterations = 0
+        # messages[1:history_end] is prior chat history; messages[live_from:]
+        # holds the latest iteration's tool exchange
+        history_end = 1 + len(chat_history)
+        live_from = len(messages)
 
         while iterations < self.max_iterations:
+            # Another tool round costs a generation plus the final answer; under a
+            # latency budget, answer now if the rest of it cannot cover both
+            remaining = stats.remaining()
+            if iterations > 0 and remaining is not None and remaining < 2 * stats.generation_estimate():
+                log.info(f"Latency budget nearly spent ({remaining:.2f}s left), answering after {iterations} iterations")
+                break
+
+            stats.start_iteration(iterations)
             choice = "auto"
-            tool_call_buffer: list[StreamDelta] = []
+            assembler = ToolCallAssembler()
+            batch = _ToolBatch(self, self.max_parallel_tools, stats, prefetch)
             finish_reason = None
-            thinking = False
-            content_buffer = ""
+            content_filter = ThinkingFilter()
 
             try:
-                gen = self.provider.generate_stream(
-                    messages=messages,
-                    tools=tool_defs,
-                    tool_choice=choice,
-                )
-                while True:
-                    delta = await asyncio.to_thread(next, gen, None)
-                    if delta is None:
-                        break
-
-                    if delta.content:
-                        content_buffer += delta.content
-
-                        # Detect thinking block boundaries
-                        while True:
-                            if thinking:
-                                end = content_buffer.find("<channel|>")
-                                if end == -1:
-                                    content_buffer = ""
-                                    break
-                                content_buffer = content_buffer[end + len("<channel|>"):]
-                                thinking = False
-                            else:
-                                start = content_buffer.find("<|channel>")
-                                if start == -1:
-                                    # No thinking tag — flush buffer as answer
-                                    if content_buffer:
-                                        yield AnswerChunkEvent(type="answer_chunk", chunk=content_buffer)
-                                        content_buffer = ""
-                                    break
-                                # Flush content before the thinking tag
-                                if start > 0:
-                                    yield AnswerChunkEvent(type="answer_chunk", chunk=content_buffer[:start])
-                                content_buffer = content_buffer[start + len("<|channel>"):]
-                                thinking = True
-
-                    if delta.tool_call_id or delta.tool_call_name or delta.tool_call_arguments:
-                        tool_call_buffer.append(delta)
-
-                    if delta.finish_reason:
-                        finish_reason = delta.finish_reason
+                prompt = self._prompt(messages, history_end, live_from, stats)
+                with scheduling(stats.ticket):
+                    stream = self.provider.generate_stream_async(
+                        messages=prompt,
+                        tools=tool_defs,
+                        tool_choice=choice,
+                    )
+                async with aclosing(stream):
+                    async for delta in stream:
+                        if delta.content or delta.tool_call_arguments:
+                            stats.count_token()
+                        if delta.content:
+                            for event in self._content_events(content_filter.feed(delta.content)):
+                                yield event
+
+                        # Start each tool as soon as its arguments are complete,
+                        # while the model keeps streaming the rest of the turn
+                        if delta.tool_call_id or delta.tool_call_name or delta.tool_call_arguments:
+                            for tc in assembler.feed(delta):
+                                tc = self._with_retrieval_options(tc, n_results)
+                                yield ToolStartEvent(type="tool_start", id=tc.id, tool=tc.name, arguments=tc.arguments)
+                                batch.start(tc)
+
+                        for index in batch.pop_finished():
+                            tc = batch.calls[index]
+                            yield ToolEndEvent(type="tool_end", id=tc.id, tool=tc.name, success=batch.results[index][1])
+
+                        if delta.finish_reason:
+                            finish_reason = delta.finish_reason
+
+                for event in self._content_events(content_filter.flush()):
+                    yield event
             except Exception as e:
+                for event in batch.abandon():
+                    yield event
                 yield ErrorEvent(type="error", message=str(e))
                 return
+            except BaseException:
+                # Client went away: in-flight tool results are no longer needed
+                batch.cancel()
+                raise
+            finally:
+                stats.end_generation()
 
             if finish_reason == "stop":
+                # Calls the model dispatched but then answered without are closed off for the client
+                for event in batch.abandon():
+                    yield event
                 yield AnswerDoneEvent(type="answer_done")
                 return
 
-            if finish_reason == "tool_calls" and tool_call_buffer:
-                parsed_calls = self._parse_tool_calls(tool_call_buffer)
-
-                for tc in parsed_calls:
-                    yield ToolStartEvent(type="tool_start", tool=tc.name, arguments=tc.arguments)
-
-                    tool = self.registry.get(tc.name)
-                    if tool is None:
-                        tool_content = f"Error: Tool '{tc.name}' not found."
-                        yield ToolEndEvent(type="tool_end", tool=tc.name, success=False)
-                    else:
-                        try:
-                            result = await asyncio.to_thread(tool.execute, **tc.arguments)
-                            tool_content = result.content
-                            yield ToolEndEvent(type="tool_end", tool=tc.name, success=result.success)
-                        except Exception as e:
-                            tool_content = f"Error: {e}"
-                            yield ToolEndEvent(type="tool_end", tool=tc.name, success=False)
-
+            if finish_reason == "tool_calls":
+                for tc in assembler.finish():
+                    tc = self._with_retrieval_options(tc, n_results)
+                    yield ToolStartEvent(type="tool_start", id=tc.id, tool=tc.name, arguments=tc.arguments)
+                    batch.start(tc)
+
+                try:
+                    while batch.pending:
+                        for index in await batch.wait_next():
+                            tc = batch.calls[index]
+                            yield ToolEndEvent(type="tool_end", id=tc.id, tool=tc.name, success=batch.results[index][1])
+                finally:
+                    batch.cancel()
+
+                # Results go back to the model in the original call order
+                live_from = len(messages)
+                for tc, (tool_content, _) in zip(batch.calls, batch.results):
                     messages.append(ChatMessage(
                         role="assistant",
                         content=None,
@@ -187,42 +760,16 @@ class Agent:
                         tool_call_id=tc.id,
                         content=tool_content,
                     ))
+            else:
+                # Cut off ("length") or no finish reason: the turn is retried without these calls
+                for event in batch.abandon():
+                    yield event
 
             iterations += 1
 
         # Soft cap — stream without tools
+        stats.end_iteration()
+        stats.soft_cap = True
         messages.append(UserMessage("Please respond now with the information you have."))
-        thinking = False
-        content_buffer = ""
-        try:
-            gen = self.provider.generate_stream(messages=messages)
-            while True:
-                delta = await asyncio.to_thread(next, gen, None)
-                if delta is None:
-                    break
-                if delta.content:
-                    content_buffer += delta.content
-                    while True:
-                        if thinking:
-                            end = content_buffer.find("<channel|>")
-                            if end == -1:
-                                content_buffer = ""
-                                break
-                            content_buffer = content_buffer[end + len("<channel|>"):]
-                            thinking = False
-                        else:
-                            start = content_buffer.find("<|channel>")
-                            if start == -1:
-                                if content_buffer:
-                                    yield AnswerChunkEvent(type="answer_chunk", chunk=content_buffer)
-                                    content_buffer = ""
-                                break
-                            if start > 0:
-                                yield AnswerChunkEvent(type="answer_chunk", chunk=content_buffer[:start])
-                            content_buffer = content_buffer[start + len("<|channel>"):]
-                            thinking = True
-                if delta.finish_reason:
-                    yield AnswerDoneEvent(type="answer_done")
-                    return
-        except Exception as e:
-            yield ErrorEvent(type="error", message=str(e))
+        async for event in self._stream_answer(self._prompt(messages, history_end, live_from, stats), stats):
+            yield event
@@ -1,26 +1,174 @@
 """Shared application factory. Assembles tools and agent for use by server.py, cli.py, etc."""
 
+import logging
+import os
+
 from agent import Agent
+from answer_cache import AnswerCache
+from bm25 import CollectionBM25Index
+from executors import Executors, create_executors
+from history import HistoryManager, load_token_counter
+from keyword_index import load_keyword_index
 from llm import provider
+from metrics import MetricsSink
 from prompt import build_agent_system_prompt
+from providers import LLMProvider
+from providers.composite import CompositeProvider
+from providers.embedding_cache import CachedEmbeddingProvider, EmbeddingCache
+from providers.onnx_embedder import OnnxEmbeddingProvider
+from providers.scheduler import GenerationScheduler, ScheduledProvider
 from tools import ToolRegistry
 from tools.calculate import CalculateTool
 from tools.get_page import GetPageTool
 from tools.search_handbook import SearchHandbookTool
-from vector_store import load_vector_store
+from vector_store import (
+    DEFAULT_DB_PATH,
+    FaissVectorIndex,
+    InMemoryVectorIndex,
+    VectorStore,
+    embedder_matches_collection,
+    load_vector_store,
+)
+
+log = logging.getLogger(__name__)
+
+
+def create_local_embedder() -> LLMProvider:
+    """Build the in-process ONNX embedder configured through ONNX_EMBEDDING_* variables."""
+    return OnnxEmbeddingProvider(
+        model_dir=os.environ.get("ONNX_EMBEDDING_MODEL_DIR", "./models/nomic-embed-text-v2-moe"),
+        model_name=os.environ.get("ONNX_EMBEDDING_MODEL_NAME", provider.embedding_model),
+        model_file=os.environ.get("ONNX_EMBEDDING_MODEL_FILE", "model.onnx"),
+        max_batch_size=int(os.environ.get("ONNX_EMBEDDING_BATCH_SIZE", "16")),
+        intra_op_threads=int(os.environ.get("ONNX_EMBEDDING_THREADS", "0")),
+    )
+
+
+def create_scheduler() -> GenerationScheduler | None:
+    """Build the generation scheduler configured through LLM_MAX_CONCURRENT and LLM_MAX_QUEUE, if enabled."""
+    max_concurrent = int(os.environ.get("LLM_MAX_CONCURRENT", "0"))
+    if max_concurrent <= 0:
+        return None
+    return GenerationScheduler(
+        max_concurrent=max_concurrent,
+        max_queue=int(os.environ.get("LLM_MAX_QUEUE", "32")),
+    )
+
+
+def create_faiss_index(store: VectorStore, refresh_interval: float = 30.0) -> FaissVectorIndex:
+    """Build the FAISS index configured through FAISS_* variables."""
+    default_directory = os.path.join(os.environ.get("VECTOR_DB_PATH", DEFAULT_DB_PATH), "faiss")
+    return FaissVectorIndex(
+        store,
+        index_type=os.environ.get("FAISS_INDEX_TYPE", "hnsw"),
+        directory=os.environ.get("FAISS_INDEX_DIR", default_directory),
+        hnsw_m=int(os.environ.get("FAISS_HNSW_M", "32")),
+        ef_construction=int(os.environ.get("FAISS_EF_CONSTRUCTION", "200")),
+        ef_search=int(os.environ.get("FAISS_EF_SEARCH", "64")),
+        nlist=int(os.environ.get("FAISS_NLIST", "1024")),
+        pq_m=int(os.environ.get("FAISS_PQ_M", "64")),
+        pq_bits=int(os.environ.get("FAISS_PQ_BITS", "8")),
+        nprobe=int(os.environ.get("FAISS_NPROBE", "16")),
+        refresh_interval=refresh_interval,
+    )
 
 
-def create_agent(max_iterations: int = 5) -> Agent:
-    collection = load_vector_store()
+def create_agent(
+    max_iterations: int = 5,
+    embedder: LLMProvider | None = None,
+    embedding_cache_size: int | None = None,
+    embedding_cache_path: str | None = None,
+    metrics: MetricsSink | None = None,
+    scheduler: GenerationScheduler | None = None,
+    executors: Executors | None = None,
+    store: VectorStore | None = None,
+) -> Agent:
+    # Streams, tool calls and embeddings get separate pools, sized by STREAM_THREADS, TOOL_THREADS and EMBEDDING_THREADS
+    if executors is None:
+        executors = create_executors()
+    provider.stream_executor = executors.stream
+
+    # Chunks come from the Chroma collection at VECTOR_DB_PATH unless another store is passed in
+    if store is None:
+        store = load_vector_store()
+
+    # Queries can be embedded locally instead of through LM Studio, as long as
+    # the vectors agree with the ones stored in the collection
+    if embedder is None and os.environ.get("EMBEDDING_BACKEND", "lm_studio") == "onnx":
+        embedder = create_local_embedder()
+    if embedder is not None and not embedder_matches_collection(embedder, store):
+        log.warning("Local embedder does not match the collection, falling back to LM Studio embeddings")
+        embedder = None
+    search_provider = CompositeProvider(chat=provider, embedder=embedder) if embedder else provider
+
+    # Query embeddings are cached in memory and in SQLite; EMBEDDING_CACHE_SIZE=0 disables it
+    if embedding_cache_size is None:
+        embedding_cache_size = int(os.environ.get("EMBEDDING_CACHE_SIZE", "4096"))
+    if embedding_cache_path is None:
+        embedding_cache_path = os.environ.get("EMBEDDING_CACHE_PATH", "./embedding_cache.db")
+
+    embedding_cache = None
+    if embedding_cache_size > 0:
+        embedding_cache = EmbeddingCache(max_entries=embedding_cache_size, path=embedding_cache_path or None)
+        search_provider = CachedEmbeddingProvider(search_provider, embedding_cache)
+
+    # In-memory indexes check the collection for changes every INDEX_REFRESH_INTERVAL seconds
+    refresh_interval = float(os.environ.get("INDEX_REFRESH_INTERVAL", "30"))
+
+    # Handbook searches also run BM25 over the same chunks unless HYBRID_SEARCH=0
+    lexical_index = None
+    if os.environ.get("HYBRID_SEARCH", "1") == "1":
+        lexical_index = CollectionBM25Index(store, refresh_interval=refresh_interval)
+
+    # VECTOR_BACKEND=numpy or faiss answers vector queries from an in-memory index instead of Chroma
+    search_store = store
+    vector_backend = os.environ.get("VECTOR_BACKEND", "chroma")
+    if vector_backend == "numpy":
+        search_store = InMemoryVectorIndex(store, refresh_interval=refresh_interval)
+    elif vector_backend == "faiss":
+        search_store = create_faiss_index(store, refresh_interval)
 
     registry = ToolRegistry()
-    registry.register(SearchHandbookTool(provider=provider, collection=collection))
+    registry.register(SearchHandbookTool(
+        provider=search_provider,
+        store=search_store,
+        embed_executor=executors.embedding,
+        lexical_index=lexical_index,
+        keyword_index=load_keyword_index(store),
+    ))
     registry.register(GetPageTool())
     registry.register(CalculateTool())
 
+    # Prompts are compacted to HISTORY_TOKEN_BUDGET, counted with the chat model's tokenizer when available
+    history = HistoryManager(
+        token_budget=int(os.environ.get("HISTORY_TOKEN_BUDGET", "8192")),
+        count_tokens=load_token_counter(os.environ.get("TOKENIZER_PATH")),
+    )
+
+    # Near-duplicate first questions are answered from ANSWER_CACHE_SIZE earlier answers
+    answer_cache = None
+    answer_cache_size = int(os.environ.get("ANSWER_CACHE_SIZE", "512"))
+    if answer_cache_size > 0:
+        answer_cache = AnswerCache(
+            embedder=search_provider,
+            max_entries=answer_cache_size,
+            max_distance=float(os.environ.get("ANSWER_CACHE_MAX_DISTANCE", "0.05")),
+            version=store.version,
+        )
+
     return Agent(
-        provider=provider,
+        provider=ScheduledProvider(provider, scheduler) if scheduler else provider,
         registry=registry,
         system_prompt=build_agent_system_prompt(),
         max_iterations=max_iterations,
+        history=history,
+        answer_cache=answer_cache,
+        embedding_cache=embedding_cache,
+        # Opt-in: search the raw question while the first generation is still streaming
+        prefetch_tool=SearchHandbookTool.name if os.environ.get("AGENT_PREFETCH") == "1" else None,
+        mode=os.environ.get("AGENT_MODE", "tools"),
+        retrieval_tool=SearchHandbookTool.name,
+        emit_stats=os.environ.get("AGENT_EMIT_STATS") == "1",
+        metrics=metrics,
+        executors=executors,
     )
@@ -0,0 +1,103 @@
+"""Reuses earlier answers for near-duplicate first-turn questions."""
+
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+
+from providers import LLMProvider
+
+
+class AnswerCache:
+    """Semantic cache of final answers keyed on question embeddings.
+
+    A lookup embeds the question and returns the stored answer whose question
+    is within ``max_distance`` (cosine distance), if any. Entries are evicted
+    least recently used first, and all of them are dropped when ``version``
+    reports that the handbook collection has changed.
+    """
+
+    def __init__(
+        self,
+        embedder: LLMProvider,
+        max_entries: int = 512,
+        max_distance: float = 0.05,
+        version: Callable[[], str] | None = None,
+    ):
+        self._embedder = embedder
+        self._max_entries = max_entries
+        self._max_distance = max_distance
+        self._version = version
+        self._current_version: str | None = None
+        self._lock = threading.Lock()
+
+        # Question vectors live in a fixed matrix; _answers maps slot -> answer in LRU order
+        self._matrix: np.ndarray | None = None
+        self._used = np.zeros(max_entries, dtype=bool)
+        self._answers: OrderedDict[int, str] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, question: str) -> tuple[str | None, np.ndarray]:
+        """Return (cached answer or None, normalized question vector)."""
+        vector = np.asarray(self._embedder.embed(question, "search_query"), dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+
+        with self._lock:
+            self._check_version()
+            if self._matrix is not None and self._answers:
+                similarities = np.where(self._used, self._matrix @ vector, -np.inf)
+                slot = int(np.argmax(similarities))
+                if 1.0 - similarities[slot] <= self._max_distance:
+                    self._answers.move_to_end(slot)
+                    self.hits += 1
+                    return self._answers[slot], vector
+            self.misses += 1
+            return None, vector
+
+    def store(self, vector: np.ndarray, answer: str) -> None:
+        with self._lock:
+            self._check_version()
+            if self._matrix is None:
+                self._matrix = np.zeros((self._max_entries, vector.shape[0]), dtype=np.float32)
+
+            if len(self._answers) < self._max_entries:
+                slot = int(np.argmin(self._used))
+            else:
+                slot, _ = self._answers.popitem(last=False)
+
+            self._matrix[slot] = vector
+            self._used[slot] = True
+            self._answers[slot] = answer
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def _clear(self) -> None:
+        self._answers.clear()
+        self._used[:] = False
+        # Reallocated on the next store, so a rebuilt collection may use another embedding dimension
+        self._matrix = None
+
+    def _check_version(self) -> None:
+        if self._version is None:
+            return
+        version = self._version()
+        if version != self._current_version:
+            self._current_version = version
+            self._clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._answers),
+            }
@@ -0,0 +1,78 @@
+"""
+Compare handbook-style queries against Chroma and the in-memory NumPy index.
+
+Usage: python benchmark_vector_index.py [--sizes 1000 10000 100000] [--dim 768]
+"""
+
+import argparse
+import logging
+import time
+
+import chromadb
+import numpy as np
+
+from keyword_index import KeywordIndex
+from vector_store import ChromaVectorStore, InMemoryVectorIndex
+
+QUERIES_PER_CALL = 3
+N_RESULTS = 3
+ADD_BATCH = 5000
+
+
+def build_collection(client, size: int, dim: int, rng: np.random.Generator):
+    """A collection of random chunks, every tenth tagged "fees" in the returned keyword index."""
+    collection = client.create_collection(f"bench_{size}")
+    keywords = KeywordIndex()
+    for start in range(0, size, ADD_BATCH):
+        count = min(ADD_BATCH, size - start)
+        ids = [f"doc_{i}" for i in range(start, start + count)]
+        collection.add(
+            ids=ids,
+            embeddings=rng.standard_normal((count, dim), dtype=np.float32),
+            documents=[f"chunk {i}" for i in range(start, start + count)],
+            metadatas=[{"page_number": i % 100} for i in range(start, start + count)],
+        )
+        for i, doc_id in enumerate(ids, start=start):
+            keywords.add(doc_id, ["fees"] if i % 10 == 0 else [])
+    return collection, keywords
+
+
+def time_queries(store, calls: list[np.ndarray], ids: list[str] | None) -> float:
+    """Median milliseconds per call."""
+    durations = []
+    for embeddings in calls:
+        started = time.perf_counter()
+        store.query_batch(embeddings.tolist(), N_RESULTS, ids=ids)
+        durations.append(time.perf_counter() - started)
+    return float(np.median(durations)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--calls", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    rng = np.random.default_rng(0)
+    client = chromadb.EphemeralClient()
+
+    print(f"{'chunks':>8} {'filter':>7} {'chroma ms':>10} {'numpy ms':>9} {'load s':>7}")
+    for size in args.sizes:
+        collection, keywords = build_collection(client, size, args.dim, rng)
+        chroma_store = ChromaVectorStore(collection)
+        started = time.perf_counter()
+        index = InMemoryVectorIndex(chroma_store)
+        load = time.perf_counter() - started
+        calls = [rng.standard_normal((QUERIES_PER_CALL, args.dim), dtype=np.float32) for _ in range(args.calls)]
+
+        for label, ids in (("none", None), ("keyword", keywords.lookup(["fees"]))):
+            chroma = time_queries(chroma_store, calls, ids)
+            numpy = time_queries(index, calls, ids)
+            print(f"{size:>8} {label:>7} {chroma:>10.2f} {numpy:>9.2f} {load:>7.2f}")
+        client.delete_collection(collection.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""In-memory BM25 index over the handbook chunks, for exact-term matches vector search ranks poorly."""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from vector_store import VectorStore
+
+log = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of documents.
+
+    Each posting stores its document's full term weight (all but the IDF), so
+    a query costs one vectorized add per query term.
+    """
+
+    def __init__(self, documents: list[str], k1: float = 1.5, b: float = 0.75):
+        self.documents = documents
+        postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        lengths = np.zeros(len(documents), dtype=np.float32)
+        for i, doc in enumerate(documents):
+            counts = Counter(tokenize(doc))
+            lengths[i] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((i, tf))
+
+        avg_length = float(lengths.mean()) if len(documents) else 0.0
+        n = len(documents)
+        self._postings: dict[str, tuple[np.ndarray, np.ndarray, float]] = {}
+        for term, entries in postings.items():
+            ids = np.fromiter((i for i, _ in entries), dtype=np.int32, count=len(entries))
+            tf = np.fromiter((t for _, t in entries), dtype=np.float32, count=len(entries))
+            norm = k1 * (1 - b + b * lengths[ids] / max(avg_length, 1e-9))
+            idf = math.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+            self._postings[term] = (ids, tf * (k1 + 1) / (tf + norm), idf)
+
+    def search(self, query: str, k: int) -> list[tuple[str, float]]:
+        """Top k (document, score) pairs for the query, best first; documents without a query term are left out."""
+        scores = np.zeros(len(self.documents), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                ids, weights, idf = posting
+                scores[ids] += idf * weights
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k)[:k]]
+        ranked = matched[np.argsort(-scores[matched])]
+        return [(self.documents[i], float(scores[i])) for i in ranked]
+
+
+class CollectionBM25Index:
+    """BM25 index kept in sync with the chunks of a vector store.
+
+    The index is built when created. Every ``refresh_interval`` seconds a
+    search starts a background check of the store's version, which rebuilds
+    the index if the chunks have changed; searches keep using the current
+    index until the new one is swapped in.
+    """
+
+    def __init__(self, store: VectorStore, refresh_interval: float = 30.0):
+        self._store = store
+        self._refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._version: str | None = None
+        self._index = BM25Index([])
+        self._refresh_thread: threading.Thread | None = None
+        self._refresh()
+
+    def search(self, query: str, k: int) -> list[tuple[str, float]]:
+        if time.monotonic() - self._checked_at > self._refresh_interval:
+            self._refresh_in_background()
+        return self._index.search(query, k)
+
+    def _refresh_in_background(self) -> None:
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        # Checked now so the searches arriving while the thread starts do not start another
+        self._checked_at = time.monotonic()
+        self._refresh_thread = threading.Thread(target=self._refresh, name="bm25-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def _refresh(self) -> None:
+        with self._lock:
+            self._checked_at = time.monotonic()
+            version = self._store.version()
+            if version == self._version:
+                return
+            started = time.perf_counter()
+            documents = self._store.get_by_ids().documents
+            index = BM25Index(documents)
+            self._index = index
+            self._version = version
+            log.info(f"Built BM25 index over {len(documents)} chunks in {time.perf_counter() - started:.2f}s")
@@ -7,7 +7,8 @@ from requests.exceptions import ConnectionError
 
 from llm import provider
 from extractor import extract_content
-from vector_store import load_vector_store
+from keyword_index import KeywordIndex, default_keyword_index_path
+from vector_store import VectorStore, load_vector_store
 from nlp import extract_keywords, nlp
 
 MAX_CHUNK_CHARS = 1200
@@ -37,58 +38,82 @@ def split_chunk(text: str) -> list[str]:
     return chunks
 
 
-def embed_documents(docs: Iterable[Tuple[int, str, str]], max_docs_per_request: int = 2, extra_tags: list[str] = None):
-    vector_store = load_vector_store()
+def embed_documents(
+    docs: Iterable[Tuple[int, str, str]],
+    max_docs_per_request: int = 2,
+    extra_tags: list[str] = None,
+    vector_store: VectorStore | None = None,
+    keyword_index_path: str | None = None,
+):
+    if vector_store is None:
+        vector_store = load_vector_store()
+    # Keywords go to an inverted index saved next to the collection, not into chunk metadata
+    if keyword_index_path is None:
+        keyword_index_path = default_keyword_index_path(vector_store)
+    keyword_index = KeywordIndex.load(keyword_index_path) if keyword_index_path is not None else None
+    if keyword_index is not None and keyword_index.version != vector_store.version():
+        # Postings saved for another state of the collection would point at the wrong chunks
+        print(f"Discarding keyword index at {keyword_index_path}, it does not match the collection")
+        keyword_index = None
+    if keyword_index is None:
+        keyword_index = KeywordIndex()
     doc_id = 0
 
-    for i, doc in enumerate(docs):
-        page_number, context_meta, content = doc
-
-        # Prepend context to content for better embeddings
-        enriched_content = f"{context_meta}\n\n{content}" if context_meta else content
-
-        # Split oversized chunks
-        chunks = split_chunk(enriched_content)
-
-        for chunk in chunks:
-            while True:
-                try:
-                    print(f"Embedding doc {doc_id + 1} (from segment {i + 1}, {len(chunk)} chars)")
-
-                    content_keywords = extract_keywords(chunk)
-                    context_keywords = extract_keywords(context_meta)
-                    all_keywords = list(set(content_keywords + context_keywords))
-
-                    if extra_tags:
-                        all_keywords.extend(extra_tags)
-                    all_keywords = list(set(all_keywords))
-
-                    metadata = {
-                        "page_number": page_number,
-                        "context": context_meta,
-                        **{f"tag_{keyword}": True for keyword in all_keywords}
-                    }
-
-                    embedding = provider.embed(chunk, 'search_document')
-                    vector_store.add(
-                        embeddings=[embedding],
-                        documents=[chunk],
-                        metadatas=[metadata],
-                        ids=[f"doc_{doc_id}"]
-                    )
-
-                    doc_id += 1
-
-                    if doc_id % max_docs_per_request == 0:
-                        time.sleep(1)
-
-                    break
-                except (KeyError, ConnectionError):
-                    print("Error occurred, retrying in 5 seconds")
-                    time.sleep(5)
-                    continue
+    try:
+        for i, doc in enumerate(docs):
+            page_number, context_meta, content = doc
+
+            # Prepend context to content for better embeddings
+            enriched_content = f"{context_meta}\n\n{content}" if context_meta else content
+
+            # Split oversized chunks
+            chunks = split_chunk(enriched_content)
+
+            for chunk in chunks:
+                while True:
+                    try:
+                        print(f"Embedding doc {doc_id + 1} (from segment {i + 1}, {len(chunk)} chars)")
+
+                        content_keywords = extract_keywords(chunk)
+                        context_keywords = extract_keywords(context_meta)
+                        all_keywords = list(set(content_keywords + context_keywords))
+
+                        if extra_tags:
+                            all_keywords.extend(extra_tags)
+                        all_keywords = list(set(all_keywords))
+
+                        metadata = {
+                            "page_number": page_number,
+                            "context": context_meta,
+                        }
+
+                        embedding = provider.embed(chunk, 'search_document')
+                        vector_store.add_batch(
+                            ids=[f"doc_{doc_id}"],
+                            documents=[chunk],
+                            embeddings=[embedding],
+                            metadatas=[metadata],
+                        )
+                        keyword_index.add(f"doc_{doc_id}", all_keywords)
+
+                        doc_id += 1
+
+                        if doc_id % max_docs_per_request == 0:
+                            time.sleep(1)
+
+                        break
+                    except (KeyError, ConnectionError):
+                        print("Error occurred, retrying in 5 seconds")
+                        time.sleep(5)
+                        continue
+    finally:
+        keyword_index.version = vector_store.version()
+        if keyword_index_path is not None:
+            keyword_index.save(keyword_index_path)
 
     print(f"Embedded {doc_id} documents from {i + 1} segments.")
+    if keyword_index_path is not None:
+        print(f"Saved keyword index with {keyword_index.keyword_count} keywords to {keyword_index_path}")
 
 
 if __name__ == "__main__":
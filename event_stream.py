@@ -0,0 +1,79 @@
+"""Encoding and coalescing of agent events on their way to the SSE response."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator
+from typing import Any
+
+import orjson
+
+# Consecutive events of these types carry text that can be concatenated
+_CHUNK_TYPES = ("answer_chunk", "thinking_chunk")
+
+
+def encode_event(event: dict[str, Any]) -> str:
+    return orjson.dumps(event).decode()
+
+
+async def coalesce_chunks(
+    events: AsyncIterator[dict[str, Any]],
+    window: float,
+    max_chars: int = 1024,
+) -> AsyncGenerator[dict[str, Any], None]:
+    """Merge runs of same-type chunk events into one event.
+
+    Merged text is flushed ``window`` seconds after its first chunk arrived,
+    once it reaches ``max_chars``, or right before any other event, so event
+    order and types are unchanged.
+    """
+    loop = asyncio.get_running_loop()
+    pending: dict[str, Any] | None = None
+    parts: list[str] = []
+    size = 0
+    flush_at = 0.0
+    next_event: asyncio.Future | None = None
+
+    def flush() -> dict[str, Any]:
+        nonlocal pending, parts, size
+        merged = {**pending, "chunk": "".join(parts)}
+        pending, parts, size = None, [], 0
+        return merged
+
+    try:
+        while True:
+            if next_event is None:
+                next_event = asyncio.ensure_future(anext(events))
+            timeout = max(0.0, flush_at - loop.time()) if pending is not None else None
+            done, _ = await asyncio.wait({next_event}, timeout=timeout)
+            if not done:
+                yield flush()
+                continue
+
+            task, next_event = next_event, None
+            try:
+                event = task.result()
+            except StopAsyncIteration:
+                break
+
+            if pending is not None and event["type"] != pending["type"]:
+                yield flush()
+            if event["type"] not in _CHUNK_TYPES:
+                yield event
+                continue
+
+            if pending is None:
+                pending = event
+                flush_at = loop.time() + window
+            parts.append(event["chunk"])
+            size += len(event["chunk"])
+            if size >= max_chars:
+                yield flush()
+
+        if pending is not None:
+            yield flush()
+    finally:
+        # Let the source finish its step before anyone tries to close it
+        if next_event is not None:
+            next_event.cancel()
+            await asyncio.wait({next_event})
@@ -0,0 +1,98 @@
+"""Named thread pools that keep streaming, tool calls and embeddings from starving each other."""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+class NamedExecutor(ThreadPoolExecutor):
+    """Thread pool that knows its name and how many of its tasks are running or waiting."""
+
+    def __init__(self, name: str, max_workers: int):
+        super().__init__(max_workers=max_workers, thread_name_prefix=name)
+        self.name = name
+        self.max_workers = max_workers
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> Future[T]:
+        return super().submit(self._counted, fn, *args, **kwargs)
+
+    def _counted(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        with self._lock:
+            self._active += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queued(self) -> int:
+        return self._work_queue.qsize()
+
+    def stats(self) -> dict[str, Any]:
+        return {"max_workers": self.max_workers, "active": self._active, "queued": self.queued}
+
+
+async def run_in(executor: ThreadPoolExecutor | None, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Like asyncio.to_thread, but on the given executor (None means the loop's default)."""
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+
+class Executors:
+    """The pools used by one agent. A missing pool falls back to the loop's default executor."""
+
+    def __init__(
+        self,
+        stream: NamedExecutor | None = None,
+        tools: NamedExecutor | None = None,
+        embedding: NamedExecutor | None = None,
+    ):
+        self.stream = stream
+        self.tools = tools
+        self.embedding = embedding
+
+    def all(self) -> list[NamedExecutor]:
+        return [e for e in (self.stream, self.tools, self.embedding) if e is not None]
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {e.name: e.stats() for e in self.all()}
+
+    def shutdown(self) -> None:
+        for executor in self.all():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_executors(
+    stream_threads: int | None = None,
+    tool_threads: int | None = None,
+    embedding_threads: int | None = None,
+) -> Executors:
+    """Build the pools, sized by argument or by STREAM_THREADS, TOOL_THREADS and EMBEDDING_THREADS."""
+    if stream_threads is None:
+        stream_threads = int(os.environ.get("STREAM_THREADS", "32"))
+    if tool_threads is None:
+        tool_threads = int(os.environ.get("TOOL_THREADS", "8"))
+    if embedding_threads is None:
+        embedding_threads = int(os.environ.get("EMBEDDING_THREADS", "4"))
+    return Executors(
+        stream=NamedExecutor("stream", stream_threads),
+        tools=NamedExecutor("tools", tool_threads),
+        embedding=NamedExecutor("embedding", embedding_threads),
+    )
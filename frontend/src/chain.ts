@@ -1,11 +1,13 @@
 import { fetchEventSource } from '@microsoft/fetch-event-source';
 
 type ChainEvent =
-    | { type: "tool_start"; tool: string; arguments: Record<string, unknown> }
-    | { type: "tool_end"; tool: string; success: boolean }
+    | { type: "tool_start"; id: string; tool: string; arguments: Record<string, unknown> }
+    | { type: "tool_end"; id: string; tool: string; success: boolean }
     | { type: "answer_chunk"; chunk: string }
+    | { type: "thinking_chunk"; chunk: string }
     | { type: "answer_done" }
-    | { type: "error"; message: string };
+    | { type: "error"; message: string }
+    | { type: "stats"; stats: Record<string, unknown> };
 
 type InvokeCallbacks = {
     onEvent?: (event: ChainEvent) => void;
@@ -0,0 +1,119 @@
+"""Keeps the prompt sent to the model within a token budget."""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Callable
+
+from tokenizers import Tokenizer
+
+from providers import ChatMessage
+
+TokenCounter = Callable[[str], int]
+
+# Rough per-message cost of role markers and separators in the chat template
+MESSAGE_OVERHEAD_TOKENS = 4
+MAX_SUMMARY_QUESTIONS = 10
+MAX_SUMMARY_QUESTION_CHARS = 120
+
+
+def approximate_token_count(text: str) -> int:
+    """Fallback counter (~4 characters per token) when no tokenizer is configured."""
+    return (len(text) + 3) // 4
+
+
+def load_token_counter(tokenizer_path: str | None = None) -> TokenCounter:
+    """Count tokens with the model's tokenizer.json, or approximate when no path is given."""
+    if not tokenizer_path:
+        return approximate_token_count
+    tokenizer = Tokenizer.from_file(tokenizer_path)
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+class HistoryManager:
+    """Compacts an agent conversation so every prompt fits in ``token_budget``.
+
+    Compaction only kicks in once the prompt is over budget. Tool outputs
+    from earlier iterations are cut to stubs first; if that is not enough,
+    chat turns are dropped oldest first and replaced by a one-line summary of
+    what was asked, so the latest turns stay verbatim the longest. The system
+    prompt, the current question and the latest tool results are always kept.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 8192,
+        tool_stub_chars: int = 200,
+        count_tokens: TokenCounter = approximate_token_count,
+    ):
+        self.token_budget = token_budget
+        self.tool_stub_chars = tool_stub_chars
+        self.count_tokens = count_tokens
+
+    def message_tokens(self, message: ChatMessage) -> int:
+        tokens = MESSAGE_OVERHEAD_TOKENS
+        if message.content:
+            tokens += self.count_tokens(message.content)
+        if message.tool_calls:
+            tokens += self.count_tokens(json.dumps(message.tool_calls))
+        return tokens
+
+    def total_tokens(self, messages: list[ChatMessage]) -> int:
+        return sum(self.message_tokens(m) for m in messages)
+
+    def compact(self, messages: list[ChatMessage], history_end: int, live_from: int) -> list[ChatMessage]:
+        """Return a prompt that fits the budget.
+
+        ``messages[1:history_end]`` is the prior chat history and everything
+        from ``live_from`` on was produced by the latest agent iteration.
+        """
+        costs = [self.message_tokens(m) for m in messages]
+        if sum(costs) <= self.token_budget:
+            return messages
+
+        # 1. Stale tool outputs become short stubs
+        messages = list(messages)
+        for i in range(history_end, live_from):
+            m = messages[i]
+            if m.role == "tool" and m.content and len(m.content) > self.tool_stub_chars:
+                messages[i] = m.model_copy(update={
+                    "content": m.content[:self.tool_stub_chars] + " ...[truncated earlier result]",
+                })
+                costs[i] = self.message_tokens(messages[i])
+        if sum(costs) <= self.token_budget:
+            return messages
+
+        # 2. Drop whole chat turns, oldest first, until the rest fits
+        system, current = messages[0], messages[history_end:]
+        turns = self._split_turns(messages[1:history_end])
+        turn_costs = [sum(self.message_tokens(m) for m in turn) for turn in turns]
+        budget = self.token_budget - sum(costs[history_end:])
+
+        dropped = 0
+        while dropped < len(turns):
+            summary_cost = self.message_tokens(self._summarized_system(system, turns[:dropped]))
+            if summary_cost + sum(turn_costs[dropped:]) <= budget:
+                break
+            dropped += 1
+
+        kept = [m for turn in turns[dropped:] for m in turn]
+        return [self._summarized_system(system, turns[:dropped]), *kept, *current]
+
+    def _split_turns(self, history: list[ChatMessage]) -> list[list[ChatMessage]]:
+        turns: list[list[ChatMessage]] = []
+        for m in history:
+            if m.role == "user" or not turns:
+                turns.append([])
+            turns[-1].append(m)
+        return turns
+
+    def _summarized_system(self, system: ChatMessage, dropped: list[list[ChatMessage]]) -> ChatMessage:
+        questions = [
+            m.content[:MAX_SUMMARY_QUESTION_CHARS]
+            for turn in dropped for m in turn
+            if m.role == "user" and m.content
+        ][-MAX_SUMMARY_QUESTIONS:]
+        if not questions:
+            return system
+        summary = "Earlier in this conversation the student asked about: " + "; ".join(questions)
+        return system.model_copy(update={"content": f"{system.content}\n\n{summary}"})
@@ -0,0 +1,149 @@
+"""Keyword → document id postings, kept in a file next to the vector store instead of as per-keyword metadata."""
+
+from __future__ import annotations
+
+import logging
+import os
+from collections.abc import Iterable
+
+import numpy as np
+
+from vector_store import VectorStore
+
+log = logging.getLogger(__name__)
+
+# Metadata prefix used by collections ingested before the keyword index existed
+LEGACY_TAG_PREFIX = "tag_"
+
+
+def default_keyword_index_path(store: VectorStore) -> str | None:
+    """``<collection>.keywords.npz`` next to the store's data, or None if the store is not saved to disk."""
+    return store.sidecar_path("keywords.npz")
+
+
+class KeywordIndex:
+    """Inverted index from keyword to the sorted row numbers of the documents tagged with it.
+
+    Rows number the ids in the order they were added. Postings are built up
+    in lists while ingesting and frozen into int32 arrays on the first
+    lookup, so a lookup costs one dict access per keyword plus a merge of
+    the (short) posting lists.
+    """
+
+    def __init__(self, ids: list[str] | None = None, postings: dict[str, np.ndarray] | None = None, version: str = ""):
+        self.ids: list[str] = list(ids or [])
+        self.version = version
+        self._rows = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._pending: dict[str, list[int]] = {}
+        self._postings: dict[str, np.ndarray] = dict(postings or {})
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def keyword_count(self) -> int:
+        return len(self._postings.keys() | self._pending.keys())
+
+    def add(self, doc_id: str, keywords: Iterable[str]) -> None:
+        row = self._rows.get(doc_id)
+        if row is None:
+            row = self._rows[doc_id] = len(self.ids)
+            self.ids.append(doc_id)
+        for keyword in set(keywords):
+            self._pending.setdefault(keyword, []).append(row)
+
+    def lookup(self, keywords: Iterable[str], match_all: bool = False) -> list[str]:
+        """Ids of the documents tagged with any (or, with ``match_all``, every) keyword."""
+        self._freeze()
+        lists = [self._postings.get(keyword) for keyword in set(keywords)]
+        if match_all:
+            if not lists or any(rows is None for rows in lists):
+                return []
+            rows = lists[0]
+            for other in lists[1:]:
+                rows = np.intersect1d(rows, other, assume_unique=True)
+        else:
+            lists = [rows for rows in lists if rows is not None]
+            if not lists:
+                return []
+            rows = np.unique(np.concatenate(lists))
+        return [self.ids[i] for i in rows]
+
+    def save(self, path: str) -> None:
+        """Write the index as one ``.npz`` file: ids, keywords, and all postings concatenated with offsets."""
+        self._freeze()
+        keywords = sorted(self._postings)
+        lengths = [len(self._postings[k]) for k in keywords]
+        offsets = np.zeros(len(keywords) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        rows = np.concatenate([self._postings[k] for k in keywords]) if keywords else np.zeros(0, dtype=np.int32)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            ids=np.array(self.ids, dtype=str),
+            keywords=np.array(keywords, dtype=str),
+            offsets=offsets,
+            rows=rows.astype(np.int32),
+            version=np.array(self.version),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> KeywordIndex | None:
+        """The index saved at ``path``, or None if there is none."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            offsets, rows = data["offsets"], data["rows"]
+            postings = {
+                str(keyword): rows[offsets[i]:offsets[i + 1]]
+                for i, keyword in enumerate(data["keywords"])
+            }
+            return cls(ids=data["ids"].tolist(), postings=postings, version=str(data["version"]))
+
+    @classmethod
+    def from_tag_metadata(cls, store: VectorStore) -> KeywordIndex:
+        """Build the index from the ``tag_<keyword>`` metadata of an older collection."""
+        stored = store.get_by_ids()
+        index = cls(version=store.version())
+        for doc_id, metadata in zip(stored.ids, stored.metadatas):
+            index.add(doc_id, [
+                key[len(LEGACY_TAG_PREFIX):]
+                for key, value in (metadata or {}).items()
+                if key.startswith(LEGACY_TAG_PREFIX) and value is True
+            ])
+        return index
+
+    def _freeze(self) -> None:
+        if not self._pending:
+            return
+        for keyword, new_rows in self._pending.items():
+            rows = np.asarray(new_rows, dtype=np.int32)
+            if keyword in self._postings:
+                rows = np.concatenate([self._postings[keyword], rows])
+            self._postings[keyword] = np.unique(rows)
+        self._pending = {}
+
+
+def load_keyword_index(store: VectorStore, path: str | None = None) -> KeywordIndex:
+    """Load the saved index for ``store``; collections tagged through metadata are converted once and saved.
+
+    An index saved for another version of the collection is ignored rather
+    than trusted, since its ids may belong to other chunks.
+    """
+    if path is None:
+        path = default_keyword_index_path(store)
+    index = KeywordIndex.load(path) if path is not None else None
+    version = store.version()
+    if index is not None and index.version != version:
+        log.warning(f"Ignoring keyword index at {path}, built for collection version {index.version} instead of {version}; re-run ingestion to update it")
+        index = None
+    if index is None:
+        index = KeywordIndex.from_tag_metadata(store)
+        if len(index) and path is not None:
+            index.save(path)
+            log.info(f"Converted tag metadata of {len(index)} chunks into a keyword index at {path}")
+    log.info(f"Loaded keyword index with {index.keyword_count} keywords over {len(index)} chunks")
+    return index
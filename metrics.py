@@ -0,0 +1,128 @@
+"""Sinks for the per-run timings reported by Agent.run, and the Prometheus metrics served at /metrics."""
+
+from __future__ import annotations
+
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any
+
+import numpy as np
+from prometheus_client import Counter, Gauge, Histogram
+
+from executors import NamedExecutor
+from providers.scheduler import GenerationScheduler
+
+log = logging.getLogger(__name__)
+
+# Buckets in seconds, from a cached embedding up to a slow multi-iteration answer
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+INVOKE_LATENCY = Histogram("emma_invoke_seconds", "End-to-end /invoke stream duration", buckets=SLOW_BUCKETS)
+QUEUE_WAIT = Histogram("emma_queue_wait_seconds", "Time a generation waited for a scheduler slot", buckets=SLOW_BUCKETS)
+TTFT = Histogram("emma_ttft_seconds", "Time to first token of each model generation", buckets=SLOW_BUCKETS)
+TOOL_LATENCY = Histogram("emma_tool_seconds", "Tool execution wall time", ["tool"], buckets=FAST_BUCKETS + (10.0, 30.0))
+EMBEDDING_LATENCY = Histogram("emma_embedding_seconds", "Query embedding latency", buckets=FAST_BUCKETS)
+CHROMA_QUERY_LATENCY = Histogram("emma_chroma_query_seconds", "Chroma query latency", buckets=FAST_BUCKETS)
+LEXICAL_SEARCH_LATENCY = Histogram("emma_bm25_search_seconds", "BM25 search latency", buckets=(0.001, 0.0025) + FAST_BUCKETS)
+IN_FLIGHT_STREAMS = Gauge("emma_in_flight_streams", "Answer streams currently open")
+THREAD_POOL_QUEUE = Gauge("emma_thread_pool_queue_depth", "Work items waiting for a worker thread", ["pool"])
+THREAD_POOL_ACTIVE = Gauge("emma_thread_pool_active", "Work items running on a worker thread", ["pool"])
+GENERATIONS_RUNNING = Gauge("emma_generations_running", "Model generations holding a scheduler slot")
+GENERATIONS_QUEUED = Gauge("emma_generations_queued", "Model generations waiting for a scheduler slot")
+REJECTED_REQUESTS = Counter("emma_rejected_requests", "Requests refused with 429 because the generation queue was full")
+AGENT_ITERATIONS = Counter("emma_agent_iterations", "Model generations run by the agent")
+SOFT_CAP_FALLBACKS = Counter("emma_soft_cap_fallbacks", "Runs that hit max_iterations and were forced to answer")
+AGENT_ERRORS = Counter("emma_agent_errors", "Runs that ended with an error event")
+
+
+def track_thread_pool(executor: NamedExecutor) -> None:
+    """Report the pool's running and waiting work; read at scrape time only."""
+    THREAD_POOL_QUEUE.labels(executor.name).set_function(lambda: executor.queued)
+    THREAD_POOL_ACTIVE.labels(executor.name).set_function(lambda: executor.active)
+
+
+def track_scheduler(scheduler: GenerationScheduler) -> None:
+    GENERATIONS_RUNNING.set_function(lambda: scheduler.running)
+    GENERATIONS_QUEUED.set_function(lambda: scheduler.queued)
+
+
+class MetricsSink(ABC):
+    @abstractmethod
+    def record(self, stats: dict[str, Any]) -> None:
+        """Receive the stats of one finished (or cancelled) run."""
+        ...
+
+
+class LoggingMetricsSink(MetricsSink):
+    def record(self, stats: dict[str, Any]) -> None:
+        log.info(f"Run stats: {stats}")
+
+
+class CompositeMetricsSink(MetricsSink):
+    def __init__(self, *sinks: MetricsSink):
+        self._sinks = sinks
+
+    def record(self, stats: dict[str, Any]) -> None:
+        for sink in self._sinks:
+            sink.record(stats)
+
+
+class PrometheusMetricsSink(MetricsSink):
+    """Feeds run stats into the Prometheus collectors.
+
+    Runs are recorded once they end, so nothing is observed per token.
+    """
+
+    def record(self, stats: dict[str, Any]) -> None:
+        AGENT_ITERATIONS.inc(stats["generations"])
+        for generation in stats["iterations"]:
+            QUEUE_WAIT.observe(generation["queue_wait"])
+            TTFT.observe(generation["ttft"])
+        for tool in stats["tools"]:
+            TOOL_LATENCY.labels(tool["tool"]).observe(tool["seconds"])
+        if stats["soft_cap"]:
+            SOFT_CAP_FALLBACKS.inc()
+        if stats["error"]:
+            AGENT_ERRORS.inc()
+
+
+class AggregatingMetricsSink(MetricsSink):
+    """Keeps the stats of the last ``max_runs`` runs and summarizes them on demand."""
+
+    def __init__(self, max_runs: int = 1000):
+        self._runs: deque[dict[str, Any]] = deque(maxlen=max_runs)
+        self._lock = threading.Lock()
+
+    def record(self, stats: dict[str, Any]) -> None:
+        with self._lock:
+            self._runs.append(stats)
+
+    def summary(self) -> dict[str, Any]:
+        with self._lock:
+            runs = list(self._runs)
+        if not runs:
+            return {"runs": 0}
+
+        generations = [g for run in runs for g in run["iterations"]]
+        tool_times: dict[str, list[float]] = {}
+        for run in runs:
+            for tool in run["tools"]:
+                tool_times.setdefault(tool["tool"], []).append(tool["seconds"])
+
+        latency = np.array([run["latency"] for run in runs])
+        return {
+            "runs": len(runs),
+            "cancelled": sum(1 for run in runs if run["cancelled"]),
+            "modes": {mode: sum(1 for run in runs if run["mode"] == mode) for mode in {run["mode"] for run in runs}},
+            "latency_p50": float(np.percentile(latency, 50)),
+            "latency_p95": float(np.percentile(latency, 95)),
+            "mean_generations": float(np.mean([run["generations"] for run in runs])),
+            "mean_prompt_tokens": float(np.mean([run["prompt_tokens"] for run in runs])),
+            "mean_queue_wait": float(np.mean([g["queue_wait"] for g in generations])) if generations else 0.0,
+            "mean_ttft": float(np.mean([g["ttft"] for g in generations])) if generations else 0.0,
+            "mean_tokens_per_sec": float(np.mean([g["tokens_per_sec"] for g in generations])) if generations else 0.0,
+            "mean_tool_seconds": {name: float(np.mean(times)) for name, times in tool_times.items()},
+        }
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import asyncio
+import threading
 from abc import ABC, abstractmethod
-from collections.abc import Generator
+from concurrent.futures import Executor
+from collections.abc import AsyncGenerator, Generator
 from typing import Any, BinaryIO, Literal
 
 from pydantic import BaseModel
@@ -63,6 +66,14 @@ class StreamDelta(BaseModel):
 
 
 class LLMProvider(ABC):
+    # Worker threads for the default generate_stream_async; None means the loop's default executor
+    stream_executor: Executor | None = None
+
+    @property
+    def embedding_model(self) -> str:
+        """Name of the model behind embed, used to key cached vectors."""
+        return type(self).__name__
+
     @abstractmethod
     def generate(self, messages: list[ChatMessage], temperature: float = 0.7, max_tokens: int = -1) -> str:
         ...
@@ -87,10 +98,64 @@ class LLMProvider(ABC):
     ) -> Generator[StreamDelta, None, None]:
         ...
 
+    async def generate_stream_async(
+        self,
+        messages: list[ChatMessage],
+        tools: list[ToolDefinition] | None = None,
+        temperature: float = 0.7,
+        tool_choice: str = "auto",
+    ) -> AsyncGenerator[StreamDelta, None]:
+        """Async counterpart of generate_stream.
+
+        The default implementation pulls the sync generator from a worker thread
+        of ``stream_executor``. Providers with a native async client should
+        override it. Closing the async generator early closes the sync one, so
+        the upstream request ends.
+        """
+        gen = self.generate_stream(
+            messages=messages,
+            tools=tools,
+            temperature=temperature,
+            tool_choice=tool_choice,
+        )
+        # A cancelled read may still be running in its thread; the lock makes the
+        # close wait for it instead of failing with "generator already executing"
+        lock = threading.Lock()
+
+        def pull() -> StreamDelta | None:
+            with lock:
+                return next(gen, None)
+
+        def close() -> None:
+            with lock:
+                gen.close()
+
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                delta = await loop.run_in_executor(self.stream_executor, pull)
+                if delta is None:
+                    break
+                yield delta
+        finally:
+            loop.run_in_executor(self.stream_executor, close)
+
     @abstractmethod
     def embed(self, text: str, purpose: Literal["search_query", "search_document"]) -> list[float]:
         ...
 
+    def embed_batch(
+        self,
+        texts: list[str],
+        purpose: Literal["search_query", "search_document"],
+    ) -> list[list[float]]:
+        """Embed several texts, returning vectors in input order.
+
+        The default implementation calls embed once per text. Providers whose
+        backend accepts batched input should override it.
+        """
+        return [self.embed(text, purpose) for text in texts]
+
     @abstractmethod
     def vision(
         self,
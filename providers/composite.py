@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from collections.abc import AsyncGenerator, Generator
+from typing import Any, BinaryIO, Literal
+
+from providers import (
+    ChatMessage,
+    LLMProvider,
+    LLMResponse,
+    StreamDelta,
+    ToolDefinition,
+)
+
+
+class CompositeProvider(LLMProvider):
+    """Routes generation and vision to one provider and embeddings to another."""
+
+    def __init__(self, chat: LLMProvider, embedder: LLMProvider):
+        self._chat = chat
+        self._embedder = embedder
+
+    @property
+    def embedding_model(self) -> str:
+        return self._embedder.embedding_model
+
+    def generate(self, messages: list[ChatMessage], temperature: float = 0.7, max_tokens: int = -1) -> str:
+        return self._chat.generate(messages, temperature=temperature, max_tokens=max_tokens)
+
+    def generate_with_tools(
+        self,
+        messages: list[ChatMessage],
+        tools: list[ToolDefinition],
+        temperature: float = 0.7,
+        tool_choice: str = "auto",
+    ) -> LLMResponse:
+        return self._chat.generate_with_tools(
+            messages, tools, temperature=temperature, tool_choice=tool_choice,
+        )
+
+    def generate_stream(
+        self,
+        messages: list[ChatMessage],
+        tools: list[ToolDefinition] | None = None,
+        temperature: float = 0.7,
+        tool_choice: str = "auto",
+    ) -> Generator[StreamDelta, None, None]:
+        return self._chat.generate_stream(
+            messages, tools=tools, temperature=temperature, tool_choice=tool_choice,
+        )
+
+    def generate_stream_async(
+        self,
+        messages: list[ChatMessage],
+        tools: list[ToolDefinition] | None = None,
+        temperature: float = 0.7,
+        tool_choice: str = "auto",
+    ) -> AsyncGenerator[StreamDelta, None]:
+        return self._chat.generate_stream_async(
+            messages, tools=tools, temperature=temperature, tool_choice=tool_choice,
+        )
+
+    def embed(self, text: str, purpose: Literal["search_query", "search_document"]) -> list[float]:
+        return self._embedder.embed(text, purpose)
+
+    def embed_batch(
+        self,
+        texts: list[str],
+        purpose: Literal["search_query", "search_document"],
+    ) -> list[list[float]]:
+        return self._embedder.embed_batch(texts, purpose)
+
+    def vision(
+        self,
+        image_data: str | BinaryIO | bytes,
+        prompt: str,
+        temperature: float = 0.1,
+        response_format: Any | None = None,
+    ) -> str | dict:
+        return self._chat.vision(
+            image_data, prompt, temperature=temperature, response_format=response_format,
+        )
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Literal
+
+from providers import LLMProvider
+from providers.composite import CompositeProvider
+
+CacheKey = tuple[str, str, str]
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+class EmbeddingCache:
+    """LRU cache of embeddings keyed on (model, purpose, normalized text).
+
+    Entries live in memory and, when ``path`` is given, in a SQLite file so
+    they survive restarts. The on-disk store is cleared automatically when a
+    different embedding model is bound to it. SQLite is only touched under
+    its own lock, so a slow commit does not hold up in-memory hits.
+    """
+
+    def __init__(self, max_entries: int = 4096, path: str | None = None):
+        self._max_entries = max_entries
+        self._entries: OrderedDict[CacheKey, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._model: str | None = None
+        self.hits = 0
+        self.misses = 0
+
+        self._db: sqlite3.Connection | None = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT, purpose TEXT, text TEXT, vector BLOB, "
+                "PRIMARY KEY (model, purpose, text))"
+            )
+            self._db.commit()
+
+    def bind_model(self, model: str) -> None:
+        """Drop every cached vector if they were produced by another model."""
+        with self._lock:
+            if self._model == model:
+                return
+            self._model = model
+            self._entries.clear()
+            if self._db is None:
+                return
+            with self._db_lock:
+                row = self._db.execute("SELECT value FROM meta WHERE key = 'model'").fetchone()
+                if row is None or row[0] != model:
+                    self._db.execute("DELETE FROM embeddings")
+                    self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('model', ?)", (model,))
+                    self._db.commit()
+
+    def get(self, key: CacheKey) -> list[float] | None:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+
+        row = None
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND purpose = ? AND text = ?", key
+                ).fetchone()
+
+        with self._lock:
+            if row is not None:
+                vector = array("d", row[0]).tolist()
+                self._remember(key, vector)
+                self.hits += 1
+                return vector
+            self.misses += 1
+            return None
+
+    def put(self, key: CacheKey, vector: list[float]) -> None:
+        self.put_many([(key, vector)])
+
+    def put_many(self, entries: list[tuple[CacheKey, list[float]]]) -> None:
+        """Cache several vectors, written to SQLite in one transaction."""
+        with self._lock:
+            for key, vector in entries:
+                self._remember(key, vector)
+        if self._db is None or not entries:
+            return
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, purpose, text, vector) VALUES (?, ?, ?, ?)",
+                [(*key, array("d", vector).tobytes()) for key, vector in entries],
+            )
+            self._db.commit()
+
+    def _remember(self, key: CacheKey, vector: list[float]) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+            }
+
+
+class CachedEmbeddingProvider(CompositeProvider):
+    """Wraps any provider and answers embed/embed_batch from an EmbeddingCache."""
+
+    def __init__(self, provider: LLMProvider, cache: EmbeddingCache):
+        super().__init__(chat=provider, embedder=provider)
+        self._cache = cache
+        self._cache.bind_model(provider.embedding_model)
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    def _key(self, text: str, purpose: str) -> CacheKey:
+        return (self._embedder.embedding_model, purpose, normalize_text(text))
+
+    def embed(self, text: str, purpose: Literal["search_query", "search_document"]) -> list[float]:
+        return self.embed_batch([text], purpose)[0]
+
+    def embed_batch(
+        self,
+        texts: list[str],
+        purpose: Literal["search_query", "search_document"],
+    ) -> list[list[float]]:
+        self._cache.bind_model(self._embedder.embedding_model)
+        keys = [self._key(text, purpose) for text in texts]
+        vectors: list[list[float] | None] = [self._cache.get(key) for key in keys]
+
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            fresh = self._embedder.embed_batch([texts[i] for i in missing], purpose)
+            self._cache.put_many([(keys[i], vector) for i, vector in zip(missing, fresh)])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+
+        return vectors
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 import json
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
 from typing import Any, BinaryIO, Literal
 
+import httpx
 import lmstudio as lms
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI
 
 from providers import (
     ChatMessage,
@@ -23,6 +24,43 @@ def _to_dicts(messages: list[ChatMessage]) -> list[dict]:
     return [m.model_dump(exclude_none=True) for m in messages]
 
 
+def _to_openai_tools(tools: list[ToolDefinition]) -> list[dict]:
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": t.name,
+                "description": t.description,
+                "parameters": t.parameters,
+            },
+        }
+        for t in tools
+    ]
+
+
+def _chunk_to_deltas(chunk: Any) -> list[StreamDelta]:
+    choice = chunk.choices[0]
+    delta = choice.delta
+    finish = choice.finish_reason
+    deltas: list[StreamDelta] = []
+
+    if delta.content:
+        deltas.append(StreamDelta(content=delta.content))
+
+    if delta.tool_calls:
+        for tc in delta.tool_calls:
+            deltas.append(StreamDelta(
+                tool_call_id=tc.id if tc.id else None,
+                tool_call_name=tc.function.name if tc.function.name else None,
+                tool_call_arguments=tc.function.arguments if tc.function.arguments else None,
+            ))
+
+    if finish:
+        deltas.append(StreamDelta(finish_reason=finish))
+
+    return deltas
+
+
 class LMStudioProvider(LLMProvider):
     def __init__(
         self,
@@ -31,12 +69,28 @@ class LMStudioProvider(LLMProvider):
         llm_model: str,
         vlm_model: str,
         embedding_model: str,
+        max_connections: int = 100,
     ):
         self._client = OpenAI(base_url=base_url, api_key=api_key)
+        # One pooled async client shared by every open stream
+        self._async_client = AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                ),
+            ),
+        )
         self._llm_model = llm_model
         self._vlm_model = vlm_model
         self._embedding_model = embedding_model
 
+    @property
+    def embedding_model(self) -> str:
+        return self._embedding_model
+
     def generate(self, messages: list[ChatMessage], temperature: float = 0.7, max_tokens: int = -1) -> str:
         params: dict[str, Any] = {
             "model": self._llm_model,
@@ -56,22 +110,10 @@ class LMStudioProvider(LLMProvider):
         temperature: float = 0.7,
         tool_choice: str = "auto",
     ) -> LLMResponse:
-        openai_tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": t.name,
-                    "description": t.description,
-                    "parameters": t.parameters,
-                },
-            }
-            for t in tools
-        ]
-
         response = self._client.chat.completions.create(
             model=self._llm_model,
             messages=_to_dicts(messages),
-            tools=openai_tools,
+            tools=_to_openai_tools(tools),
             tool_choice=tool_choice,
             temperature=temperature,
         )
@@ -91,13 +133,13 @@ class LMStudioProvider(LLMProvider):
 
         return TextResponse(content=message.content.strip() if message.content else "")
 
-    def generate_stream(
+    def _stream_params(
         self,
         messages: list[ChatMessage],
-        tools: list[ToolDefinition] | None = None,
-        temperature: float = 0.7,
-        tool_choice: str = "auto",
-    ) -> Generator[StreamDelta, None, None]:
+        tools: list[ToolDefinition] | None,
+        temperature: float,
+        tool_choice: str,
+    ) -> dict[str, Any]:
         params: dict[str, Any] = {
             "model": self._llm_model,
             "messages": _to_dicts(messages),
@@ -106,39 +148,40 @@ class LMStudioProvider(LLMProvider):
         }
 
         if tools:
-            params["tools"] = [
-                {
-                    "type": "function",
-                    "function": {
-                        "name": t.name,
-                        "description": t.description,
-                        "parameters": t.parameters,
-                    },
-                }
-                for t in tools
-            ]
+            params["tools"] = _to_openai_tools(tools)
             params["tool_choice"] = tool_choice
 
-        stream = self._client.chat.completions.create(**params)
+        return params
 
-        for chunk in stream:
-            choice = chunk.choices[0]
-            delta = choice.delta
-            finish = choice.finish_reason
+    def generate_stream(
+        self,
+        messages: list[ChatMessage],
+        tools: list[ToolDefinition] | None = None,
+        temperature: float = 0.7,
+        tool_choice: str = "auto",
+    ) -> Generator[StreamDelta, None, None]:
+        params = self._stream_params(messages, tools, temperature, tool_choice)
+        stream = self._client.chat.completions.create(**params)
 
-            if delta.content:
-                yield StreamDelta(content=delta.content)
+        # Closing the generator early closes the HTTP response, which stops generation upstream
+        with stream:
+            for chunk in stream:
+                yield from _chunk_to_deltas(chunk)
 
-            if delta.tool_calls:
-                for tc in delta.tool_calls:
-                    yield StreamDelta(
-                        tool_call_id=tc.id if tc.id else None,
-                        tool_call_name=tc.function.name if tc.function.name else None,
-                        tool_call_arguments=tc.function.arguments if tc.function.arguments else None,
-                    )
+    async def generate_stream_async(
+        self,
+        messages: list[ChatMessage],
+        tools: list[ToolDefinition] | None = None,
+        temperature: float = 0.7,
+        tool_choice: str = "auto",
+    ) -> AsyncGenerator[StreamDelta, None]:
+        params = self._stream_params(messages, tools, temperature, tool_choice)
+        stream = await self._async_client.chat.completions.create(**params)
 
-            if finish:
-                yield StreamDelta(finish_reason=finish)
+        async with stream:
+            async for chunk in stream:
+                for delta in _chunk_to_deltas(chunk):
+                    yield delta
 
     def embed(self, text: str, purpose: Literal["search_query", "search_document"]) -> list[float]:
         response = self._client.embeddings.create(
@@ -147,6 +190,19 @@ class LMStudioProvider(LLMProvider):
         )
         return response.data[0].embedding
 
+    def embed_batch(
+        self,
+        texts: list[str],
+        purpose: Literal["search_query", "search_document"],
+    ) -> list[list[float]]:
+        if not texts:
+            return []
+        response = self._client.embeddings.create(
+            model=self._embedding_model,
+            input=[f"{purpose}: {text}" for text in texts],
+        )
+        return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
     def vision(
         self,
         image_data: str | BinaryIO | bytes,
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import os
+from collections.abc import Generator
+from typing import Any, BinaryIO, Literal
+
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+
+from providers import (
+    ChatMessage,
+    LLMProvider,
+    LLMResponse,
+    StreamDelta,
+    ToolDefinition,
+)
+
+
+class OnnxEmbeddingProvider(LLMProvider):
+    """Embedding-only provider that runs a sentence embedding model in-process on CPU.
+
+    ``model_dir`` must contain the ONNX export of the model and its
+    ``tokenizer.json``. Vectors are mean-pooled over the attention mask and L2
+    normalized, matching what LM Studio returns for the same model. Combine it
+    with a chat provider through CompositeProvider.
+    """
+
+    def __init__(
+        self,
+        model_dir: str,
+        model_name: str,
+        model_file: str = "model.onnx",
+        max_batch_size: int = 16,
+        max_length: int = 512,
+        intra_op_threads: int = 0,
+    ):
+        self._model_name = model_name
+        self._max_batch_size = max_batch_size
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=max_length)
+        self._tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        self._session = ort.InferenceSession(
+            os.path.join(model_dir, model_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._input_names = {i.name for i in self._session.get_inputs()}
+
+    @property
+    def embedding_model(self) -> str:
+        return self._model_name
+
+    def generate(self, messages: list[ChatMessage], temperature: float = 0.7, max_tokens: int = -1) -> str:
+        raise NotImplementedError("OnnxEmbeddingProvider only supports embeddings")
+
+    def generate_with_tools(
+        self,
+        messages: list[ChatMessage],
+        tools: list[ToolDefinition],
+        temperature: float = 0.7,
+        tool_choice: str = "auto",
+    ) -> LLMResponse:
+        raise NotImplementedError("OnnxEmbeddingProvider only supports embeddings")
+
+    def generate_stream(
+        self,
+        messages: list[ChatMessage],
+        tools: list[ToolDefinition] | None = None,
+        temperature: float = 0.7,
+        tool_choice: str = "auto",
+    ) -> Generator[StreamDelta, None, None]:
+        raise NotImplementedError("OnnxEmbeddingProvider only supports embeddings")
+
+    def embed(self, text: str, purpose: Literal["search_query", "search_document"]) -> list[float]:
+        return self.embed_batch([text], purpose)[0]
+
+    def embed_batch(
+        self,
+        texts: list[str],
+        purpose: Literal["search_query", "search_document"],
+    ) -> list[list[float]]:
+        inputs = [f"{purpose}: {text}" for text in texts]
+        vectors: list[list[float]] = []
+        for start in range(0, len(inputs), self._max_batch_size):
+            vectors.extend(self._run(inputs[start:start + self._max_batch_size]).tolist())
+        return vectors
+
+    def _run(self, batch: list[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(batch)
+
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feed["token_type_ids"] = np.zeros_like(input_ids)
+
+        output = self._session.run(None, feed)[0]
+        if output.ndim == 3:
+            # Token embeddings: mean-pool over the real (unpadded) tokens
+            mask = attention_mask[..., None].astype(output.dtype)
+            output = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return output / np.clip(norms, 1e-12, None)
+
+    def vision(
+        self,
+        image_data: str | BinaryIO | bytes,
+        prompt: str,
+        temperature: float = 0.1,
+        response_format: Any | None = None,
+    ) -> str | dict:
+        raise NotImplementedError("OnnxEmbeddingProvider only supports embeddings")
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections.abc import AsyncGenerator, Iterator
+from contextlib import aclosing, contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from providers import (
+    ChatMessage,
+    LLMProvider,
+    StreamDelta,
+    ToolDefinition,
+)
+from providers.composite import CompositeProvider
+
+# Lower values are served first
+CONTINUATION = 0
+NEW_REQUEST = 1
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"The assistant is busy, please retry in {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class GenerationTicket:
+    """Priority of one generation, and the time it then spent queued."""
+
+    def __init__(self, priority: int = NEW_REQUEST):
+        self.priority = priority
+        self.queue_wait = 0.0
+
+
+_ticket: ContextVar[GenerationTicket | None] = ContextVar("generation_ticket", default=None)
+
+
+@contextmanager
+def scheduling(ticket: GenerationTicket) -> Iterator[None]:
+    """Attach a ticket to generate_stream_async calls made inside the block."""
+    token = _ticket.set(ticket)
+    try:
+        yield
+    finally:
+        _ticket.reset(token)
+
+
+class GenerationScheduler:
+    """Admission control for model generations.
+
+    At most ``max_concurrent`` generations run at once. Others wait in a
+    priority queue, so rounds of agent loops already in progress go before
+    new requests. New requests are refused with QueueFullError once
+    ``max_queue`` generations are waiting. Continuations are always queued,
+    since refusing them would waste the work already done.
+    """
+
+    def __init__(self, max_concurrent: int = 2, max_queue: int = 32):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._running = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._avg_generation = 5.0  # seconds, smoothed over finished generations
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def saturated(self) -> bool:
+        return len(self._waiters) >= self.max_queue
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained."""
+        rounds = (len(self._waiters) + self.max_concurrent) / self.max_concurrent
+        return max(1, math.ceil(rounds * self._avg_generation))
+
+    async def acquire(self, priority: int) -> float:
+        """Wait for a generation slot; return the seconds spent queued."""
+        if self._running < self.max_concurrent and not self._waiters:
+            self._running += 1
+            return 0.0
+        if priority != CONTINUATION and self.saturated:
+            raise QueueFullError(self.retry_after())
+
+        entry = (priority, next(self._seq), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, entry)
+        started = time.perf_counter()
+        try:
+            await entry[2]
+        except asyncio.CancelledError:
+            if entry[2].done() and not entry[2].cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+        return time.perf_counter() - started
+
+    def release(self, duration: float | None = None) -> None:
+        """Free a slot, handing it straight to the next waiter if there is one."""
+        if duration is not None:
+            self._avg_generation = 0.8 * self._avg_generation + 0.2 * duration
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "running": self._running,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+        }
+
+
+class ScheduledProvider(CompositeProvider):
+    """Wraps a provider so streamed generations go through a GenerationScheduler.
+
+    The priority comes from the GenerationTicket attached with ``scheduling``;
+    calls without one are treated as new requests. Only generate_stream_async
+    is scheduled, the other methods pass straight through.
+    """
+
+    def __init__(self, provider: LLMProvider, scheduler: GenerationScheduler):
+        super().__init__(chat=provider, embedder=provider)
+        self._scheduler = scheduler
+
+    @property
+    def scheduler(self) -> GenerationScheduler:
+        return self._scheduler
+
+    def generate_stream_async(
+        self,
+        messages: list[ChatMessage],
+        tools: list[ToolDefinition] | None = None,
+        temperature: float = 0.7,
+        tool_choice: str = "auto",
+    ) -> AsyncGenerator[StreamDelta, None]:
+        # The ticket is read now: the generator body runs later, outside the caller's block
+        ticket = _ticket.get() or GenerationTicket()
+        return self._scheduled_stream(ticket, messages, tools, temperature, tool_choice)
+
+    async def _scheduled_stream(
+        self,
+        ticket: GenerationTicket,
+        messages: list[ChatMessage],
+        tools: list[ToolDefinition] | None,
+        temperature: float,
+        tool_choice: str,
+    ) -> AsyncGenerator[StreamDelta, None]:
+        ticket.queue_wait = await self._scheduler.acquire(ticket.priority)
+        started = time.perf_counter()
+        finished = False
+        try:
+            stream = self._chat.generate_stream_async(
+                messages, tools=tools, temperature=temperature, tool_choice=tool_choice,
+            )
+            async with aclosing(stream):
+                async for delta in stream:
+                    yield delta
+            finished = True
+        finally:
+            # Only complete generations teach the scheduler how long one takes
+            self._scheduler.release(time.perf_counter() - started if finished else None)
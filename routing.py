@@ -0,0 +1,33 @@
+"""Cheap heuristics for picking how the agent answers a question."""
+
+import re
+
+# Page lookups need get_page
+_PAGE_PATTERN = re.compile(r"\b(page|pg\.?|p\.)\s*\d+", re.IGNORECASE)
+# Arithmetic or explicit calculation requests need calculate
+_MATH_PATTERN = re.compile(r"\d\s*[-+*/x×%^]\s*\d", re.IGNORECASE)
+_CALC_WORDS = re.compile(
+    r"\b(calculate|compute|how many .*\b(left|remaining|total|more)|percent(age)?|average|sum of)\b",
+    re.IGNORECASE,
+)
+# Several questions in one message are searched part by part
+_FOLLOW_UP_PATTERN = re.compile(
+    r"\b(and|also)\s+(what|how|when|where|who|why|which|can|is|are|do|does)\b",
+    re.IGNORECASE,
+)
+MAX_DIRECT_QUESTION_CHARS = 300
+
+
+def needs_tools(question: str) -> bool:
+    """True when a question likely needs the full tool loop rather than a single retrieval."""
+    if _PAGE_PATTERN.search(question):
+        return True
+    if _MATH_PATTERN.search(question) or _CALC_WORDS.search(question):
+        return True
+    if question.count("?") > 1 or _FOLLOW_UP_PATTERN.search(question):
+        return True
+    return len(question) > MAX_DIRECT_QUESTION_CHARS
+
+
+def choose_mode(question: str) -> str:
+    return "tools" if needs_tools(question) else "direct"
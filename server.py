@@ -1,19 +1,38 @@
+import asyncio
 import json
 import os
+from contextlib import aclosing, asynccontextmanager
+from typing import Literal
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from pydantic import BaseModel, Field
 from sse_starlette.sse import EventSourceResponse
 import starlette.status as status
 import uvicorn
 
 import meta
-from agent_setup import create_agent
-from models import ChatMessage
+from agent_setup import create_agent, create_scheduler
+from event_stream import coalesce_chunks, encode_event
+from executors import NamedExecutor
+from metrics import (
+    INVOKE_LATENCY,
+    IN_FLIGHT_STREAMS,
+    REJECTED_REQUESTS,
+    AggregatingMetricsSink,
+    CompositeMetricsSink,
+    PrometheusMetricsSink,
+    track_scheduler,
+    track_thread_pool,
+)
+from models import AIMessage, ChatMessage, UserMessage
+from sessions import InMemorySessionStore, SessionStore
+from tracing import configure_tracing
 
 # App environment
 environment = os.environ.get("ENV", "development")
@@ -23,12 +42,41 @@ if environment != "development":
     with open("public/.vite/manifest.json") as f:
         manifest = json.load(f)
 
-agent = create_agent()
+metrics = AggregatingMetricsSink()
+# Answer chunks are merged for up to SSE_COALESCE_MS (0 sends every chunk as its own frame)
+coalesce_window = int(os.environ.get("SSE_COALESCE_MS", "0")) / 1000
+coalesce_chars = int(os.environ.get("SSE_COALESCE_CHARS", "1024"))
+
+# Conversations can be kept server-side; idle ones expire after SESSION_TTL seconds
+sessions: SessionStore = InMemorySessionStore(
+    max_sessions=int(os.environ.get("SESSION_MAX_COUNT", "1000")),
+    ttl=float(os.environ.get("SESSION_TTL", "3600")),
+)
+
+# LLM_MAX_CONCURRENT caps simultaneous generations; extra ones queue, and new requests get 429 when the queue is full
+scheduler = create_scheduler()
+if scheduler is not None:
+    track_scheduler(scheduler)
+agent = create_agent(metrics=CompositeMetricsSink(metrics, PrometheusMetricsSink()), scheduler=scheduler)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Whatever still uses the loop's default executor gets a named pool too, so its load is reported
+    default = NamedExecutor("default", min(32, (os.cpu_count() or 1) + 4))
+    asyncio.get_running_loop().set_default_executor(default)
+    for executor in (default, *agent.executors.all()):
+        track_thread_pool(executor)
+    yield
+    agent.executors.shutdown()
+    default.shutdown(wait=False)
+
 
 app = FastAPI(
     title=f"{meta.title} API",
     version=meta.version,
     description=f"API for the {meta.title} chatbot",
+    lifespan=lifespan,
 )
 
 templates = Jinja2Templates(directory="templates")
@@ -39,17 +87,26 @@ if environment == "development":
 else:
     app.mount("/public", StaticFiles(directory="public", html=True), name="public")
 
+if configure_tracing():
+    FastAPIInstrumentor.instrument_app(app)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
+    expose_headers=["X-Session-Id"],
 )
 
 
 class InvokeChainInput(BaseModel):
     input: str
     chat_history: list[ChatMessage] | None = None
-    n_results: int = 10
+    n_results: int | None = Field(None, gt=0)  # results per search query; the tool's default when unset
+    mode: Literal["auto", "tools", "direct"] | None = None
+    latency_budget: float | None = Field(None, gt=0)  # seconds the answer should be started within
+    # Server-side history: set session to start one, then send only session_id and the new input
+    session: bool = False
+    session_id: str | None = None
 
 
 class InvokeChainRequest(BaseModel):
@@ -68,6 +125,24 @@ async def index(request: Request):
     })
 
 
+@app.get("/stats")
+async def stats():
+    return {
+        "runs": metrics.summary(),
+        "cancellation": agent.cancellation_stats.as_dict(),
+        "prefetch": agent.prefetch_stats.as_dict(),
+        "answer_cache": agent.answer_cache.stats() if agent.answer_cache is not None else None,
+        "embedding_cache": agent.embedding_cache.stats() if agent.embedding_cache is not None else None,
+        "scheduler": scheduler.stats() if scheduler is not None else None,
+        "executors": agent.executors.stats(),
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/{full_path}")
 async def catch_all(request: Request, full_path: str):
     return RedirectResponse(url="/public/" + full_path, status_code=status.HTTP_302_FOUND)
@@ -75,14 +150,54 @@ async def catch_all(request: Request, full_path: str):
 
 @app.post("/invoke")
 async def invoke_chain(request: InvokeChainRequest):
+    if scheduler is not None and scheduler.saturated:
+        REJECTED_REQUESTS.inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="The assistant is busy, please try again shortly.",
+            headers={"Retry-After": str(scheduler.retry_after())},
+        )
+
     input_text = request.input.input
     chat_history = list(request.input.chat_history) if request.input.chat_history else []
 
-    async def event_generator():
-        async for event in agent.run(input_text, chat_history):
-            yield {"event": event["type"], "data": json.dumps(event)}
+    session_id = request.input.session_id
+    if session_id is not None:
+        stored = sessions.get(session_id)
+        if stored is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Unknown or expired session, start a new one with the full chat history.",
+            )
+        chat_history = stored
+    elif request.input.session:
+        session_id = sessions.create()
+        sessions.append(session_id, chat_history)
 
-    return EventSourceResponse(event_generator())
+    async def event_generator():
+        # When the client disconnects this generator is cancelled; closing the
+        # agent run right away stops the upstream generation too
+        with IN_FLIGHT_STREAMS.track_inprogress(), INVOKE_LATENCY.time():
+            run = agent.run(
+                input_text,
+                chat_history,
+                mode=request.input.mode,
+                latency_budget=request.input.latency_budget,
+                n_results=request.input.n_results,
+            )
+            async with aclosing(run):
+                events = coalesce_chunks(run, coalesce_window, coalesce_chars) if coalesce_window > 0 else run
+                answer: list[str] = []
+                async with aclosing(events):
+                    async for event in events:
+                        if event["type"] == "answer_chunk":
+                            answer.append(event["chunk"])
+                        elif event["type"] == "answer_done" and session_id is not None:
+                            sessions.append(session_id, [UserMessage(input_text), AIMessage("".join(answer))])
+                        yield {"event": event["type"], "data": encode_event(event)}
+
+    headers = {"X-Session-Id": session_id} if session_id is not None else None
+    return EventSourceResponse(event_generator(), headers=headers)
 
 
 def run_server(host="localhost", port=8000):
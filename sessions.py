@@ -0,0 +1,81 @@
+"""Server-side conversation history, so clients can send only their new message."""
+
+from __future__ import annotations
+
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from providers import ChatMessage
+
+
+class SessionStore(ABC):
+    @abstractmethod
+    def create(self) -> str:
+        """Start an empty session and return its id."""
+        ...
+
+    @abstractmethod
+    def get(self, session_id: str) -> list[ChatMessage] | None:
+        """History of a session, or None if it is unknown or expired."""
+        ...
+
+    @abstractmethod
+    def append(self, session_id: str, messages: list[ChatMessage]) -> None:
+        ...
+
+
+class InMemorySessionStore(SessionStore):
+    """Sessions kept in process memory.
+
+    A session expires ``ttl`` seconds after it was last used, and the least
+    recently used sessions are evicted past ``max_sessions``. Histories only
+    grow by appending, so earlier turns stay a stable prompt prefix.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = 3600.0):
+        self._max_sessions = max_sessions
+        self._ttl = ttl
+        self._sessions: OrderedDict[str, tuple[float, list[ChatMessage]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self) -> str:
+        session_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._sessions[session_id] = (time.monotonic(), [])
+            self._evict()
+        return session_id
+
+    def get(self, session_id: str) -> list[ChatMessage] | None:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self._ttl:
+                del self._sessions[session_id]
+                return None
+            self._sessions[session_id] = (time.monotonic(), entry[1])
+            self._sessions.move_to_end(session_id)
+            return list(entry[1])
+
+    def append(self, session_id: str, messages: list[ChatMessage]) -> None:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return
+            self._sessions[session_id] = (time.monotonic(), entry[1] + messages)
+            self._sessions.move_to_end(session_id)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self) -> None:
+        # Oldest first: drop expired sessions, then any over the limit
+        now = time.monotonic()
+        while self._sessions:
+            used, _ = next(iter(self._sessions.values()))
+            if now - used <= self._ttl and len(self._sessions) <= self._max_sessions:
+                break
+            self._sessions.popitem(last=False)
@@ -0,0 +1,148 @@
+"""Incremental parsers for the agent's token stream."""
+
+from __future__ import annotations
+
+import json
+
+from providers import StreamDelta, ToolCall
+
+
+class _PendingCall:
+    def __init__(self, call_id: str):
+        self.id = call_id
+        self.name = ""
+        self.arguments: list[str] = []
+        self.emitted = False
+        # JSON scanner state, used to notice when the arguments object closes
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escaped = False
+
+    def append(self, text: str) -> bool:
+        """Add an arguments fragment; return True once the top-level object is closed."""
+        self.arguments.append(text)
+        closed = False
+        for ch in text:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+                self._started = True
+            elif ch in "}]":
+                self._depth -= 1
+                if self._started and self._depth == 0:
+                    closed = True
+        return closed
+
+    def to_tool_call(self, index: int) -> ToolCall:
+        raw = "".join(self.arguments)
+        try:
+            args = json.loads(raw) if raw.strip() else {}
+        except json.JSONDecodeError:
+            args = {}
+        if not isinstance(args, dict):
+            args = {}
+        return ToolCall(id=self.id or f"call_{index}", name=self.name, arguments=args)
+
+
+class ToolCallAssembler:
+    """Assembles streamed tool call deltas and reports each call as soon as it is complete.
+
+    A call is complete when its JSON arguments close, or when the next call
+    starts. Calls are returned once, in stream order.
+    """
+
+    def __init__(self) -> None:
+        self._calls: list[_PendingCall] = []
+
+    def feed(self, delta: StreamDelta) -> list[ToolCall]:
+        ready: list[ToolCall] = []
+
+        # A new id starts the next call; later deltas of a call carry no id
+        if not self._calls or (delta.tool_call_id and delta.tool_call_id != self._calls[-1].id):
+            if self._calls:
+                ready.extend(self._emit(len(self._calls) - 1))
+            self._calls.append(_PendingCall(delta.tool_call_id or ""))
+
+        current = self._calls[-1]
+        if delta.tool_call_name:
+            current.name = delta.tool_call_name
+        if delta.tool_call_arguments and current.append(delta.tool_call_arguments):
+            ready.extend(self._emit(len(self._calls) - 1))
+        return ready
+
+    def finish(self) -> list[ToolCall]:
+        """Return every call not reported yet, once the stream has ended."""
+        ready: list[ToolCall] = []
+        for i in range(len(self._calls)):
+            ready.extend(self._emit(i))
+        return ready
+
+    def _emit(self, index: int) -> list[ToolCall]:
+        call = self._calls[index]
+        if call.emitted or not call.name:
+            return []
+        call.emitted = True
+        return [call.to_tool_call(index)]
+
+
+THINKING_OPEN_TAG = "<|channel>"
+THINKING_CLOSE_TAG = "<channel|>"
+
+
+def _partial_tag_length(text: str, start: int, tag: str) -> int:
+    """Length of the longest suffix of text[start:] that is a proper prefix of tag."""
+    for k in range(min(len(tag) - 1, len(text) - start), 0, -1):
+        if text.endswith(tag[:k]):
+            return k
+    return 0
+
+
+class ThinkingFilter:
+    """Splits streamed content into answer text and thinking-channel text.
+
+    Thinking blocks are delimited by ``<|channel>`` and ``<channel|>``. The
+    filter works incrementally with constant work per character, and only holds
+    back the few trailing characters that could be the start of a tag split
+    across two deltas.
+    """
+
+    def __init__(self) -> None:
+        self.thinking = False
+        self._held = ""
+
+    def feed(self, text: str) -> list[tuple[bool, str]]:
+        """Return (is_thinking, text) segments that are safe to emit."""
+        buf = self._held + text if self._held else text
+        segments: list[tuple[bool, str]] = []
+        pos = 0
+
+        while True:
+            tag = THINKING_CLOSE_TAG if self.thinking else THINKING_OPEN_TAG
+            found = buf.find(tag, pos)
+            if found == -1:
+                break
+            if found > pos:
+                segments.append((self.thinking, buf[pos:found]))
+            pos = found + len(tag)
+            self.thinking = not self.thinking
+
+        tag = THINKING_CLOSE_TAG if self.thinking else THINKING_OPEN_TAG
+        end = len(buf) - _partial_tag_length(buf, pos, tag)
+        if end > pos:
+            segments.append((self.thinking, buf[pos:end]))
+        self._held = buf[end:]
+        return segments
+
+    def flush(self) -> list[tuple[bool, str]]:
+        """Release held-back text once the stream has ended."""
+        held, self._held = self._held, ""
+        return [(self.thinking, held)] if held else []
@@ -5,8 +5,8 @@ from providers import StreamDelta, ToolDefinition
 
 
 def _mock_text_stream(text):
-    """Create a generator that yields StreamDelta for text content."""
-    def stream(*args, **kwargs):
+    """Create an async generator that yields StreamDelta for text content."""
+    async def stream(*args, **kwargs):
         for word in text.split(" "):
             yield StreamDelta(content=word + " ")
         yield StreamDelta(finish_reason="stop")
@@ -16,7 +16,7 @@ def _mock_text_stream(text):
 def _mock_tool_then_text_stream(tool_name, tool_args_json, text):
     """First call yields tool call deltas, second call yields text deltas."""
     calls = [0]
-    def stream(*args, **kwargs):
+    async def stream(*args, **kwargs):
         calls[0] += 1
         if calls[0] == 1:
             yield StreamDelta(tool_call_id="call_1", tool_call_name=tool_name)
@@ -46,7 +46,7 @@ def _make_agent(provider=None, max_iterations=5):
 
     if provider is None:
         provider = MagicMock()
-        provider.generate_stream.side_effect = _mock_text_stream("Hello!")
+        provider.generate_stream_async.side_effect = _mock_text_stream("Hello!")
 
     return Agent(
         provider=provider,
@@ -82,7 +82,7 @@ async def test_agent_streams_text_directly():
 @pytest.mark.asyncio
 async def test_agent_executes_tool_then_streams_answer():
     provider = MagicMock()
-    provider.generate_stream.side_effect = _mock_tool_then_text_stream(
+    provider.generate_stream_async.side_effect = _mock_tool_then_text_stream(
         "echo", '{"text": "world"}', "The echo said: world"
     )
 
@@ -90,13 +90,13 @@ async def test_agent_executes_tool_then_streams_answer():
     events = await _collect_events(agent, "echo world")
 
     assert _get_answer(events) == "The echo said: world"
-    assert provider.generate_stream.call_count == 2
+    assert provider.generate_stream_async.call_count == 2
 
 
 @pytest.mark.asyncio
 async def test_agent_yields_tool_and_answer_events():
     provider = MagicMock()
-    provider.generate_stream.side_effect = _mock_tool_then_text_stream(
+    provider.generate_stream_async.side_effect = _mock_tool_then_text_stream(
         "echo", '{"text": "test"}', "done"
     )
 
@@ -113,7 +113,7 @@ async def test_agent_yields_tool_and_answer_events():
 @pytest.mark.asyncio
 async def test_agent_handles_unknown_tool():
     provider = MagicMock()
-    provider.generate_stream.side_effect = _mock_tool_then_text_stream(
+    provider.generate_stream_async.side_effect = _mock_tool_then_text_stream(
         "nonexistent", '{}', "Sorry"
     )
 
@@ -126,7 +126,7 @@ async def test_agent_handles_unknown_tool():
 @pytest.mark.asyncio
 async def test_agent_respects_max_iterations():
     call_count = [0]
-    def always_tool_call(*args, **kwargs):
+    async def always_tool_call(*args, **kwargs):
         call_count[0] += 1
         if call_count[0] <= 2:
             yield StreamDelta(tool_call_id="call_1", tool_call_name="echo")
@@ -138,7 +138,7 @@ async def test_agent_respects_max_iterations():
             yield StreamDelta(finish_reason="stop")
 
     provider = MagicMock()
-    provider.generate_stream.side_effect = always_tool_call
+    provider.generate_stream_async.side_effect = always_tool_call
 
     agent = _make_agent(provider=provider, max_iterations=2)
     events = await _collect_events(agent, "loop forever")
@@ -160,7 +160,7 @@ async def test_agent_handles_tool_execution_error():
             raise RuntimeError("Something broke")
 
     provider = MagicMock()
-    provider.generate_stream.side_effect = _mock_tool_then_text_stream(
+    provider.generate_stream_async.side_effect = _mock_tool_then_text_stream(
         "fail", '{}', "Tool failed"
     )
 
@@ -181,12 +181,12 @@ async def test_agent_handles_tool_execution_error():
 @pytest.mark.asyncio
 async def test_agent_includes_system_prompt_in_messages():
     provider = MagicMock()
-    provider.generate_stream.side_effect = _mock_text_stream("hi")
+    provider.generate_stream_async.side_effect = _mock_text_stream("hi")
 
     agent = _make_agent(provider=provider)
     await _collect_events(agent, "hello")
 
-    call_args = provider.generate_stream.call_args
+    call_args = provider.generate_stream_async.call_args
     messages = call_args[1]["messages"] if "messages" in call_args[1] else call_args[0][0]
     assert messages[0].role == "system"
     assert "test assistant" in messages[0].content
@@ -197,7 +197,7 @@ async def test_agent_yields_error_on_provider_failure():
     provider = MagicMock()
     def failing_stream(*args, **kwargs):
         raise RuntimeError("LM Studio is down")
-    provider.generate_stream.side_effect = failing_stream
+    provider.generate_stream_async.side_effect = failing_stream
 
     agent = _make_agent(provider=provider)
     events = await _collect_events(agent, "hello")
@@ -205,3 +205,664 @@ async def test_agent_yields_error_on_provider_failure():
     assert len(events) == 1
     assert events[0]["type"] == "error"
     assert "LM Studio is down" in events[0]["message"]
+
+
+def _mock_parallel_tool_calls_then_text_stream(calls_json, text):
+    """First call yields several tool calls in one turn, second call yields text."""
+    calls = [0]
+    async def stream(*args, **kwargs):
+        calls[0] += 1
+        if calls[0] == 1:
+            for call_id, name, args_json in calls_json:
+                yield StreamDelta(tool_call_id=call_id, tool_call_name=name)
+                yield StreamDelta(tool_call_arguments=args_json)
+            yield StreamDelta(finish_reason="tool_calls")
+        else:
+            yield StreamDelta(content=text)
+            yield StreamDelta(finish_reason="stop")
+    return stream
+
+
+def _make_sleepy_agent(provider, max_parallel_tools=4):
+    import time
+    from agent import Agent
+    from tools import Tool, ToolRegistry, ToolResult
+
+    class SleepTool(Tool):
+        name = "sleep"
+        description = "Sleeps then echoes"
+        parameters = {"type": "object", "properties": {"seconds": {"type": "number"}, "text": {"type": "string"}}}
+
+        def execute(self, **kwargs) -> ToolResult:
+            time.sleep(kwargs["seconds"])
+            return ToolResult(content=kwargs["text"], success=True)
+
+    registry = ToolRegistry()
+    registry.register(SleepTool())
+    return Agent(
+        provider=provider,
+        registry=registry,
+        system_prompt="Test",
+        max_parallel_tools=max_parallel_tools,
+    )
+
+
+@pytest.mark.asyncio
+async def test_agent_runs_tool_calls_in_parallel_and_keeps_message_order():
+    import time
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_parallel_tool_calls_then_text_stream([
+        ("call_slow", "sleep", '{"seconds": 0.3, "text": "slow"}'),
+        ("call_fast", "sleep", '{"seconds": 0.3, "text": "fast"}'),
+    ], "done")
+
+    agent = _make_sleepy_agent(provider)
+    started = time.perf_counter()
+    events = await _collect_events(agent, "two things")
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.55
+    assert [e["id"] for e in events if e["type"] == "tool_start"] == ["call_slow", "call_fast"]
+    assert {e["id"] for e in events if e["type"] == "tool_end"} == {"call_slow", "call_fast"}
+
+    messages = provider.generate_stream_async.call_args_list[1][1]["messages"]
+    tool_messages = [m for m in messages if m.role == "tool"]
+    assert [m.tool_call_id for m in tool_messages] == ["call_slow", "call_fast"]
+    assert [m.content for m in tool_messages] == ["slow", "fast"]
+
+
+@pytest.mark.asyncio
+async def test_agent_tool_end_events_follow_completion_order():
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_parallel_tool_calls_then_text_stream([
+        ("call_slow", "sleep", '{"seconds": 0.3, "text": "slow"}'),
+        ("call_fast", "sleep", '{"seconds": 0.0, "text": "fast"}'),
+    ], "done")
+
+    agent = _make_sleepy_agent(provider)
+    events = await _collect_events(agent, "two things")
+
+    assert [e["id"] for e in events if e["type"] == "tool_end"] == ["call_fast", "call_slow"]
+
+
+@pytest.mark.asyncio
+async def test_agent_limits_parallel_tool_calls():
+    import time
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_parallel_tool_calls_then_text_stream([
+        ("call_1", "sleep", '{"seconds": 0.2, "text": "a"}'),
+        ("call_2", "sleep", '{"seconds": 0.2, "text": "b"}'),
+    ], "done")
+
+    agent = _make_sleepy_agent(provider, max_parallel_tools=1)
+    started = time.perf_counter()
+    await _collect_events(agent, "two things")
+
+    assert time.perf_counter() - started >= 0.4
+
+
+@pytest.mark.asyncio
+async def test_agent_starts_tool_before_stream_finishes():
+    import asyncio
+    import time
+
+    calls = [0]
+    async def slow_tail_stream(*args, **kwargs):
+        calls[0] += 1
+        if calls[0] == 1:
+            yield StreamDelta(tool_call_id="call_1", tool_call_name="sleep")
+            yield StreamDelta(tool_call_arguments='{"seconds": 0.3, "text": "early"}')
+            # Slow tail of the stream after the call is complete
+            await asyncio.sleep(0.3)
+            yield StreamDelta(finish_reason="tool_calls")
+        else:
+            yield StreamDelta(content="done")
+            yield StreamDelta(finish_reason="stop")
+
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = slow_tail_stream
+
+    agent = _make_sleepy_agent(provider)
+    started = time.perf_counter()
+    events = await _collect_events(agent, "early")
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.55
+    assert [e["type"] for e in events][:2] == ["tool_start", "tool_end"]
+    messages = provider.generate_stream_async.call_args_list[1][1]["messages"]
+    assert messages[-1].content == "early"
+
+
+@pytest.mark.asyncio
+async def test_agent_strips_thinking_split_across_deltas():
+    async def stream(*args, **kwargs):
+        for piece in ["Hel", "lo<|cha", "nnel>secret<chan", "nel|> world"]:
+            yield StreamDelta(content=piece)
+        yield StreamDelta(finish_reason="stop")
+
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = stream
+
+    agent = _make_agent(provider=provider)
+    events = await _collect_events(agent, "hi")
+
+    assert _get_answer(events) == "Hello world"
+    assert "thinking_chunk" not in [e["type"] for e in events]
+
+
+@pytest.mark.asyncio
+async def test_agent_emits_thinking_chunks_when_enabled():
+    async def stream(*args, **kwargs):
+        yield StreamDelta(content="<|channel>pondering<channel|>Answer")
+        yield StreamDelta(finish_reason="stop")
+
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = stream
+
+    agent = _make_agent(provider=provider)
+    agent.emit_thinking = True
+    events = await _collect_events(agent, "hi")
+
+    assert [e["chunk"] for e in events if e["type"] == "thinking_chunk"] == ["pondering"]
+    assert _get_answer(events) == "Answer"
+
+
+@pytest.mark.asyncio
+async def test_agent_compacts_prompt_with_history_manager():
+    from history import HistoryManager
+    from providers import AIMessage, UserMessage
+
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_text_stream("ok")
+
+    agent = _make_agent(provider=provider)
+    agent.history = HistoryManager(token_budget=80, count_tokens=lambda text: len(text.split()))
+
+    history = []
+    for i in range(20):
+        history += [UserMessage(f"question {i}"), AIMessage("answer " * 20)]
+    await _collect_events(agent, "latest", chat_history=history)
+
+    messages = provider.generate_stream_async.call_args[1]["messages"]
+    assert agent.history.total_tokens(messages) <= 80
+    assert messages[-1].content == "latest"
+
+
+@pytest.mark.asyncio
+async def test_agent_replays_cached_answer_for_first_turn():
+    from answer_cache import AnswerCache
+
+    embedder = MagicMock()
+    embedder.embed.return_value = [1.0, 0.0]
+
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_text_stream("Refunds are prorated.")
+
+    agent = _make_agent(provider=provider)
+    agent.answer_cache = AnswerCache(embedder=embedder)
+
+    first = await _collect_events(agent, "tuition refund")
+    second = await _collect_events(agent, "tuition refund?")
+
+    assert _get_answer(second) == _get_answer(first) == "Refunds are prorated."
+    assert [e["type"] for e in second] == ["answer_chunk", "answer_done"]
+    assert provider.generate_stream_async.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_agent_skips_answer_cache_with_chat_history():
+    from answer_cache import AnswerCache
+    from providers import AIMessage, UserMessage
+
+    embedder = MagicMock()
+    embedder.embed.return_value = [1.0, 0.0]
+
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_text_stream("Hi")
+
+    agent = _make_agent(provider=provider)
+    agent.answer_cache = AnswerCache(embedder=embedder)
+
+    history = [UserMessage("hello"), AIMessage("hey")]
+    await _collect_events(agent, "tuition refund", chat_history=history)
+    await _collect_events(agent, "tuition refund", chat_history=history)
+
+    embedder.embed.assert_not_called()
+    assert provider.generate_stream_async.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_agent_does_not_cache_budgeted_answers():
+    from answer_cache import AnswerCache
+
+    embedder = MagicMock()
+    embedder.embed.return_value = [1.0, 0.0]
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_tool_then_text_stream("echo", '{"text": "hi"}', "partial answer")
+
+    agent = _make_agent(provider=provider)
+    agent.answer_cache = AnswerCache(embedder=embedder)
+
+    events = [e async for e in agent.run("tuition refund", [], latency_budget=0.0)]
+
+    assert _get_answer(events) == "partial answer"
+    assert agent.answer_cache.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_agent_does_not_cache_answers_after_failed_tools():
+    from answer_cache import AnswerCache
+
+    embedder = MagicMock()
+    embedder.embed.return_value = [1.0, 0.0]
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_tool_then_text_stream("missing_tool", "{}", "no idea")
+
+    agent = _make_agent(provider=provider)
+    agent.answer_cache = AnswerCache(embedder=embedder)
+
+    await _collect_events(agent, "tuition refund")
+
+    assert agent.answer_cache.stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_agent_finishes_stream_when_answer_cache_store_fails():
+    from answer_cache import AnswerCache
+
+    embedder = MagicMock()
+    embedder.embed.return_value = [1.0, 0.0]
+    agent = _make_agent()
+    agent.answer_cache = AnswerCache(embedder=embedder)
+    agent.answer_cache.store = MagicMock(side_effect=ValueError("shape mismatch"))
+
+    events = await _collect_events(agent, "tuition refund")
+
+    assert events[-1]["type"] == "answer_done"
+    agent.answer_cache.store.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_agent_prefetch_is_handed_to_first_matching_call():
+    from agent import Agent
+    from tools import PrefetchResult, Tool, ToolRegistry, ToolResult
+
+    class PrefetchingTool(Tool):
+        name = "search"
+        description = "Search"
+        parameters = {"type": "object", "properties": {"q": {"type": "string"}}}
+
+        def __init__(self):
+            self.prefetched_inputs = []
+            self.received = []
+
+        def prefetch(self, text):
+            self.prefetched_inputs.append(text)
+            return PrefetchResult(query=text, data="cached", elapsed=0.5)
+
+        def execute(self, **kwargs):
+            self.received.append(None)
+            return ToolResult(content="plain", success=True)
+
+        def execute_prefetched(self, prefetched, **kwargs):
+            prefetched.reused = True
+            self.received.append(prefetched.data)
+            return ToolResult(content="from prefetch", success=True)
+
+    tool = PrefetchingTool()
+    registry = ToolRegistry()
+    registry.register(tool)
+
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_tool_then_text_stream(
+        "search", '{"q": "refunds"}', "done"
+    )
+    agent = Agent(provider=provider, registry=registry, system_prompt="Test", prefetch_tool="search")
+
+    await _collect_events(agent, "tuition refunds")
+
+    assert tool.prefetched_inputs == ["tuition refunds"]
+    assert tool.received == ["cached"]
+    stats = agent.prefetch_stats.as_dict()
+    assert stats["started"] == 1
+    assert stats["reused"] == 1
+    assert stats["hit_rate"] == 1.0
+    assert stats["time_saved"] > 0
+
+
+@pytest.mark.asyncio
+async def test_agent_counts_unused_prefetch():
+    from agent import Agent
+    from tools import PrefetchResult, Tool, ToolRegistry, ToolResult
+
+    class PrefetchingTool(Tool):
+        name = "search"
+        description = "Search"
+        parameters = {"type": "object", "properties": {}}
+
+        def prefetch(self, text):
+            return PrefetchResult(query=text)
+
+        def execute(self, **kwargs):
+            return ToolResult(content="", success=True)
+
+    registry = ToolRegistry()
+    registry.register(PrefetchingTool())
+
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_text_stream("Hello!")
+    agent = Agent(provider=provider, registry=registry, system_prompt="Test", prefetch_tool="search")
+
+    await _collect_events(agent, "hi")
+
+    assert agent.prefetch_stats.as_dict()["unused"] == 1
+
+
+def _make_search_agent(provider, mode):
+    from agent import Agent
+    from tools import Tool, ToolRegistry, ToolResult
+
+    class SearchTool(Tool):
+        name = "search"
+        description = "Search"
+        parameters = {"type": "object", "properties": {"queries": {"type": "array"}}}
+
+        def __init__(self):
+            self.calls = []
+
+        def execute(self, **kwargs):
+            self.calls.append(kwargs)
+            return ToolResult(content="Refunds take 30 days.", success=True)
+
+    tool = SearchTool()
+    registry = ToolRegistry()
+    registry.register(tool)
+    agent = Agent(provider=provider, registry=registry, system_prompt="Test", mode=mode, retrieval_tool="search")
+    return agent, tool
+
+
+@pytest.mark.asyncio
+async def test_agent_direct_mode_answers_in_one_generation():
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_text_stream("30 days.")
+    agent, tool = _make_search_agent(provider, "direct")
+
+    events = await _collect_events(agent, "How long do refunds take?")
+
+    assert tool.calls == [{"queries": ["How long do refunds take?"]}]
+    assert [e["type"] for e in events][:2] == ["tool_start", "tool_end"]
+    assert _get_answer(events) == "30 days."
+    assert provider.generate_stream_async.call_count == 1
+    kwargs = provider.generate_stream_async.call_args.kwargs
+    assert "tools" not in kwargs
+    assert "Refunds take 30 days." in kwargs["messages"][-1].content
+
+
+@pytest.mark.asyncio
+async def test_agent_auto_mode_routes_calculations_to_tools():
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_text_stream("Hello!")
+    agent, tool = _make_search_agent(provider, "auto")
+
+    await _collect_events(agent, "Calculate my GWA for 3 subjects")
+
+    assert tool.calls == []
+    assert "tools" in provider.generate_stream_async.call_args.kwargs
+
+
+@pytest.mark.asyncio
+async def test_agent_run_mode_overrides_default():
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_text_stream("Hello!")
+    agent, tool = _make_search_agent(provider, "tools")
+
+    async for _ in agent.run("What is the dress code?", [], mode="direct"):
+        pass
+
+    assert len(tool.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_agent_closing_run_closes_provider_stream():
+    from contextlib import aclosing
+    from agent import RunStats
+
+    closed = []
+
+    async def endless_stream(*args, **kwargs):
+        try:
+            while True:
+                yield StreamDelta(content="word ")
+        finally:
+            closed.append(True)
+
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = endless_stream
+    agent = _make_agent(provider=provider)
+
+    # Teach the agent what a full answer costs before abandoning one
+    finished = RunStats("tools")
+    finished.output_tokens = 100
+    agent.cancellation_stats.record(finished, cancelled=False)
+
+    async with aclosing(agent.run("hi", [])) as events:
+        async for event in events:
+            if event["type"] == "answer_chunk":
+                break
+
+    assert closed == [True]
+    stats = agent.cancellation_stats.as_dict()
+    assert stats["cancelled"] == 1
+    assert stats["tokens_saved"] == 99
+
+
+@pytest.mark.asyncio
+async def test_agent_emits_stats_and_records_metrics():
+    from metrics import MetricsSink
+
+    class ListSink(MetricsSink):
+        def __init__(self):
+            self.runs = []
+
+        def record(self, stats):
+            self.runs.append(stats)
+
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_tool_then_text_stream("echo", '{"text": "hi"}', "done")
+    agent = _make_agent(provider=provider)
+    agent.emit_stats = True
+    agent.metrics = ListSink()
+
+    events = await _collect_events(agent, "hello")
+
+    assert events[-1]["type"] == "stats"
+    stats = events[-1]["stats"]
+    assert stats["generations"] == 2
+    assert len(stats["iterations"]) == 2
+    assert all(it["ttft"] >= 0 for it in stats["iterations"])
+    assert [t["tool"] for t in stats["tools"]] == ["echo"]
+    assert stats["output_tokens"] > 0
+    assert agent.metrics.runs[0]["cancelled"] is False
+
+
+@pytest.mark.asyncio
+async def test_agent_records_answer_cache_hits_as_runs():
+    from answer_cache import AnswerCache
+
+    embedder = MagicMock()
+    embedder.embed.return_value = [1.0, 0.0]
+    agent = _make_agent()
+    agent.answer_cache = AnswerCache(embedder=embedder)
+    agent.emit_stats = True
+    agent.metrics = MagicMock()
+
+    await _collect_events(agent, "tuition refund")
+    events = await _collect_events(agent, "tuition refund?")
+
+    assert [e["type"] for e in events] == ["answer_chunk", "answer_done", "stats"]
+    assert events[-1]["stats"]["mode"] == "cache"
+    assert events[-1]["stats"]["generations"] == 0
+    assert [call.args[0]["mode"] for call in agent.metrics.record.call_args_list] == ["tools", "cache"]
+    assert agent.cancellation_stats.as_dict()["completed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_agent_runs_tools_on_tool_executor():
+    import threading
+    from executors import Executors, NamedExecutor
+    from tools import Tool, ToolResult
+
+    class ThreadNameTool(Tool):
+        name = "echo"
+        description = "Reports its thread"
+        parameters = {"type": "object", "properties": {}}
+
+        def __init__(self):
+            self.thread = None
+
+        def execute(self, **kwargs):
+            self.thread = threading.current_thread().name
+            return ToolResult(content="ok", success=True)
+
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_tool_then_text_stream("echo", "{}", "done")
+    agent = _make_agent(provider=provider)
+    tool = ThreadNameTool()
+    agent.registry.register(tool)
+    agent.executors = Executors(tools=NamedExecutor("tools", 2))
+
+    await _collect_events(agent, "hello")
+
+    assert tool.thread.startswith("tools")
+    agent.executors.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_agent_request_n_results_reaches_retrieval_tool():
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_text_stream("ok")
+    agent, tool = _make_search_agent(provider, "direct")
+
+    async for _ in agent.run("What is the dress code?", [], n_results=7):
+        pass
+
+    assert tool.calls == [{"queries": ["What is the dress code?"], "n_results": 7}]
+
+
+@pytest.mark.asyncio
+async def test_agent_skips_tool_rounds_when_budget_is_spent():
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_tool_then_text_stream("echo", '{"text": "hi"}', "done")
+    agent = _make_agent(provider=provider)
+
+    events = [e async for e in agent.run("hello", [], latency_budget=0.0)]
+
+    assert _get_answer(events) == "done"
+    assert provider.generate_stream_async.call_count == 2
+    final = provider.generate_stream_async.call_args.kwargs
+    assert "tools" not in final
+    assert final["messages"][-1].content == "Please respond now with the information you have."
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("finish_reason", ["stop", "length"])
+async def test_agent_ends_early_tools_when_turn_ends_without_them(finish_reason):
+    import asyncio
+
+    calls = [0]
+    async def stream(*args, **kwargs):
+        calls[0] += 1
+        if calls[0] == 1:
+            yield StreamDelta(tool_call_id="call_1", tool_call_name="sleep")
+            yield StreamDelta(tool_call_arguments='{"seconds": 0.3, "text": "early"}')
+            await asyncio.sleep(0)
+            yield StreamDelta(content="answered anyway")
+            yield StreamDelta(finish_reason=finish_reason)
+        else:
+            yield StreamDelta(content="done")
+            yield StreamDelta(finish_reason="stop")
+
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = stream
+
+    events = await _collect_events(_make_sleepy_agent(provider), "early")
+
+    tool_events = [e for e in events if e["type"] in ("tool_start", "tool_end")]
+    assert [(e["type"], e["id"]) for e in tool_events] == [("tool_start", "call_1"), ("tool_end", "call_1")]
+    assert tool_events[1]["success"] is False
+    assert events[-1]["type"] == "answer_done"
+
+
+@pytest.mark.asyncio
+async def test_agent_times_out_slow_prefetch_under_budget(monkeypatch):
+    import time
+    import agent as agent_module
+    from agent import Agent
+    from tools import PrefetchResult, Tool, ToolRegistry, ToolResult
+
+    monkeypatch.setattr(agent_module, "MIN_TOOL_TIMEOUT", 0.05)
+
+    class SlowPrefetchTool(Tool):
+        name = "search"
+        description = "Search"
+        parameters = {"type": "object", "properties": {}}
+
+        def prefetch(self, text):
+            time.sleep(0.5)
+            return PrefetchResult(query=text, data="late", elapsed=0.5)
+
+        def execute(self, **kwargs):
+            return ToolResult(content="plain", success=True)
+
+    registry = ToolRegistry()
+    registry.register(SlowPrefetchTool())
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_tool_then_text_stream("search", "{}", "done")
+    agent = Agent(provider=provider, registry=registry, system_prompt="Test", prefetch_tool="search")
+
+    started = time.perf_counter()
+    events = [e async for e in agent.run("hello", [], latency_budget=0.0)]
+
+    tool_end = next(e for e in events if e["type"] == "tool_end")
+    assert tool_end["success"] is False
+    assert time.perf_counter() - started < 0.4
+
+
+@pytest.mark.asyncio
+async def test_agent_times_out_slow_tools_under_budget(monkeypatch):
+    import time
+    import agent as agent_module
+    from tools import Tool, ToolResult
+
+    monkeypatch.setattr(agent_module, "MIN_TOOL_TIMEOUT", 0.05)
+
+    class SlowTool(Tool):
+        name = "echo"
+        description = "Slow"
+        parameters = {"type": "object", "properties": {}}
+
+        def execute(self, **kwargs):
+            time.sleep(0.5)
+            return ToolResult(content="late", success=True)
+
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_tool_then_text_stream("echo", "{}", "done")
+    agent = _make_agent(provider=provider)
+    agent.registry.register(SlowTool())
+
+    events = [e async for e in agent.run("hello", [], latency_budget=0.0)]
+
+    tool_end = next(e for e in events if e["type"] == "tool_end")
+    assert tool_end["success"] is False
+    tool_message = provider.generate_stream_async.call_args.kwargs["messages"][-2]
+    assert "timed out" in tool_message.content
+
+
+@pytest.mark.asyncio
+async def test_agent_reports_unknown_mode_as_error_event():
+    agent = _make_agent()
+
+    events = [event async for event in agent.run("hi", [], mode="fast")]
+
+    assert events == [{"type": "error", "message": "Unknown agent mode: fast"}]
+    agent.provider.generate_stream_async.assert_not_called()
@@ -0,0 +1,63 @@
+from unittest.mock import MagicMock
+
+
+VECTORS = {
+    "tuition refund": [1.0, 0.0, 0.0],
+    "tuition refunds": [0.99, 0.05, 0.0],
+    "dress code": [0.0, 1.0, 0.0],
+    "library hours": [0.0, 0.0, 1.0],
+}
+
+
+def _cache(**kwargs):
+    from answer_cache import AnswerCache
+    embedder = MagicMock()
+    embedder.embed.side_effect = lambda text, purpose: VECTORS[text]
+    return AnswerCache(embedder=embedder, **kwargs)
+
+
+def test_answer_cache_hits_near_duplicate_question():
+    cache = _cache()
+    answer, vector = cache.lookup("tuition refund")
+    assert answer is None
+    cache.store(vector, "Refunds are prorated.")
+
+    answer, _ = cache.lookup("tuition refunds")
+    assert answer == "Refunds are prorated."
+    assert cache.lookup("dress code")[0] is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_answer_cache_evicts_least_recently_used():
+    cache = _cache(max_entries=2)
+    for question in ["tuition refund", "dress code"]:
+        cache.store(cache.lookup(question)[1], question.upper())
+
+    cache.lookup("tuition refund")
+    cache.store(cache.lookup("library hours")[1], "LIBRARY HOURS")
+
+    assert cache.lookup("dress code")[0] is None
+    assert cache.lookup("tuition refund")[0] == "TUITION REFUND"
+    assert cache.stats()["size"] == 2
+
+
+def test_answer_cache_invalidates_when_collection_version_changes():
+    version = ["v1"]
+    cache = _cache(version=lambda: version[0])
+    cache.store(cache.lookup("dress code")[1], "Wear the uniform.")
+
+    version[0] = "v2"
+    assert cache.lookup("dress code")[0] is None
+
+
+def test_answer_cache_accepts_new_dimension_after_version_change():
+    import numpy as np
+    version = ["v1"]
+    cache = _cache(version=lambda: version[0])
+    cache.store(cache.lookup("dress code")[1], "Wear the uniform.")
+
+    version[0] = "v2"
+    cache.store(np.array([0.6, 0.8], dtype=np.float32), "Re-embedded answer.")
+
+    assert cache.stats()["size"] == 1
@@ -0,0 +1,96 @@
+from unittest.mock import MagicMock
+
+
+DOCS = [
+    "Students must wear the prescribed uniform on campus.",
+    "CS 101 covers introductory programming. CS 101 is required for all freshmen.",
+    "The registrar's office issues transcripts and certifications.",
+]
+
+
+def _collection_with(documents, collection_id="c1"):
+    collection = MagicMock()
+    collection.id = collection_id
+    collection.count.return_value = len(documents)
+    collection.get.return_value = {"ids": [f"d{i}" for i in range(len(documents))], "documents": documents}
+    return collection
+
+
+def test_bm25_ranks_exact_term_matches_first():
+    from bm25 import BM25Index
+    index = BM25Index(DOCS)
+
+    results = index.search("cs 101 programming", k=3)
+
+    assert results[0][0] == DOCS[1]
+    assert all(doc != DOCS[0] for doc, _ in results)
+
+
+def test_bm25_returns_at_most_k_best_first():
+    from bm25 import BM25Index
+    index = BM25Index(DOCS)
+
+    results = index.search("uniform registrar transcripts campus", k=1)
+
+    assert len(results) == 1
+    assert results[0][0] in (DOCS[0], DOCS[2])
+
+
+def test_bm25_unknown_terms_return_nothing():
+    from bm25 import BM25Index
+
+    assert BM25Index(DOCS).search("zzz", k=3) == []
+    assert BM25Index([]).search("uniform", k=3) == []
+
+
+def test_collection_index_rebuilds_when_collection_changes():
+    from bm25 import CollectionBM25Index
+    from vector_store import ChromaVectorStore
+    collection = _collection_with(DOCS[:1])
+    index = CollectionBM25Index(ChromaVectorStore(collection), refresh_interval=0)
+
+    assert index.search("registrar", k=3) == []
+
+    collection.count.return_value = 3
+    collection.get.return_value = {"ids": ["d0", "d1", "d2"], "documents": DOCS}
+
+    # The rebuild runs on a background thread started by the next search
+    index.search("registrar", k=3)
+    index._refresh_thread.join()
+    assert index.search("registrar", k=3)[0][0] == DOCS[2]
+
+
+def test_collection_index_skips_rebuild_when_unchanged():
+    from bm25 import CollectionBM25Index
+    from vector_store import ChromaVectorStore
+    collection = _collection_with(DOCS)
+    index = CollectionBM25Index(ChromaVectorStore(collection), refresh_interval=0)
+
+    for _ in range(2):
+        index.search("uniform", k=3)
+        index._refresh_thread.join()
+
+    collection.get.assert_called_once()
+
+
+def test_collection_index_serves_searches_while_rebuilding():
+    import threading
+    from bm25 import CollectionBM25Index
+    from vector_store import ChromaVectorStore, StoredChunks
+    store = ChromaVectorStore(_collection_with(DOCS[:1]))
+    index = CollectionBM25Index(store, refresh_interval=0)
+
+    release = threading.Event()
+
+    def slow_get_by_ids(*args, **kwargs):
+        release.wait(5)
+        return StoredChunks(ids=["d0", "d1", "d2"], documents=DOCS, metadatas=[None] * 3)
+
+    store.version = lambda: "v2"
+    store.get_by_ids = slow_get_by_ids
+
+    # Answered from the old index while the rebuild is held up
+    assert index.search("registrar", k=3) == []
+    release.set()
+    index._refresh_thread.join()
+    assert index.search("registrar", k=3)[0][0] == DOCS[2]
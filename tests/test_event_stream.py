@@ -0,0 +1,81 @@
+import asyncio
+import json
+from contextlib import aclosing
+
+import pytest
+
+from event_stream import coalesce_chunks, encode_event
+
+
+async def _events(*events, delay=0.0):
+    for event in events:
+        if delay:
+            await asyncio.sleep(delay)
+        yield event
+
+
+def _chunk(text, type="answer_chunk"):
+    return {"type": type, "chunk": text}
+
+
+def test_encode_event_is_json():
+    assert json.loads(encode_event({"type": "answer_chunk", "chunk": "héllo"})) == {"type": "answer_chunk", "chunk": "héllo"}
+
+
+@pytest.mark.asyncio
+async def test_coalesce_merges_chunks_and_keeps_order():
+    source = _events(
+        {"type": "tool_start", "id": "1", "tool": "search", "arguments": {}},
+        {"type": "tool_end", "id": "1", "tool": "search", "success": True},
+        _chunk("Hel"), _chunk("lo"), _chunk("hmm", "thinking_chunk"), _chunk(" world"),
+        {"type": "answer_done"},
+    )
+
+    out = [e async for e in coalesce_chunks(source, window=10)]
+
+    assert [e["type"] for e in out] == ["tool_start", "tool_end", "answer_chunk", "thinking_chunk", "answer_chunk", "answer_done"]
+    assert [e.get("chunk") for e in out] == [None, None, "Hello", "hmm", " world", None]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_flushes_at_size_limit():
+    out = [e async for e in coalesce_chunks(_events(_chunk("ab"), _chunk("cd"), _chunk("e")), window=10, max_chars=4)]
+
+    assert [e["chunk"] for e in out] == ["abcd", "e"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_flushes_after_window_while_source_is_slow():
+    received = []
+
+    async def slow():
+        yield _chunk("a")
+        await asyncio.sleep(0.2)
+        yield _chunk("b")
+
+    async for event in coalesce_chunks(slow(), window=0.01):
+        received.append((event["chunk"], asyncio.get_running_loop().time()))
+
+    assert [c for c, _ in received] == ["a", "b"]
+    assert received[1][1] - received[0][1] > 0.1
+
+
+@pytest.mark.asyncio
+async def test_coalesce_closing_early_lets_source_be_closed():
+    closed = []
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield _chunk("x")
+        finally:
+            closed.append(True)
+
+    source = endless()
+    async with aclosing(source):
+        async with aclosing(coalesce_chunks(source, window=0.005)) as events:
+            async for _ in events:
+                break
+
+    assert closed == [True]
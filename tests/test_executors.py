@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+from executors import NamedExecutor, create_executors, run_in
+
+
+def test_named_executor_counts_active_and_queued():
+    executor = NamedExecutor("tools", max_workers=1)
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(1)
+
+    running = executor.submit(block)
+    waiting = executor.submit(lambda: None)
+    started.wait(1)
+
+    assert executor.stats() == {"max_workers": 1, "active": 1, "queued": 1}
+
+    release.set()
+    running.result(1)
+    waiting.result(1)
+    assert executor.active == 0
+    assert executor.queued == 0
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_run_in_uses_the_given_executor():
+    executor = NamedExecutor("embedding", max_workers=1)
+
+    name = await run_in(executor, lambda: threading.current_thread().name)
+
+    assert name.startswith("embedding")
+    executor.shutdown()
+
+
+def test_create_executors_reads_sizes_from_environment(monkeypatch):
+    monkeypatch.setenv("TOOL_THREADS", "3")
+
+    executors = create_executors(stream_threads=2)
+
+    assert executors.stats() == {
+        "stream": {"max_workers": 2, "active": 0, "queued": 0},
+        "tools": {"max_workers": 3, "active": 0, "queued": 0},
+        "embedding": {"max_workers": 4, "active": 0, "queued": 0},
+    }
+    executors.shutdown()
@@ -0,0 +1,62 @@
+from providers import AIMessage, ChatMessage, SystemMessage, UserMessage
+
+
+def _count_words(text):
+    return len(text.split())
+
+
+def _manager(budget, **kwargs):
+    from history import HistoryManager
+    return HistoryManager(token_budget=budget, count_tokens=_count_words, **kwargs)
+
+
+def test_compact_returns_messages_unchanged_within_budget():
+    messages = [SystemMessage("sys"), UserMessage("hello")]
+    assert _manager(100).compact(messages, history_end=1, live_from=2) is messages
+
+
+def test_compact_stubs_stale_tool_outputs_but_keeps_latest():
+    stale = ChatMessage(role="tool", tool_call_id="a", content="old " * 200)
+    latest = ChatMessage(role="tool", tool_call_id="b", content="new " * 200)
+    messages = [SystemMessage("sys"), UserMessage("q"), stale, latest]
+
+    result = _manager(300, tool_stub_chars=20).compact(messages, history_end=1, live_from=3)
+
+    assert result[2].content.startswith("old old")
+    assert "truncated" in result[2].content
+    assert result[3].content == latest.content
+
+
+def test_compact_drops_oldest_turns_and_summarizes_them():
+    history = [
+        UserMessage("first question about tuition"), AIMessage("long answer " * 50),
+        UserMessage("second question about uniforms"), AIMessage("short answer"),
+    ]
+    messages = [SystemMessage("sys"), *history, UserMessage("third question")]
+
+    manager = _manager(60)
+    result = manager.compact(messages, history_end=5, live_from=6)
+
+    assert manager.total_tokens(result) <= 60
+    assert "first question about tuition" in result[0].content
+    assert [m.content for m in result[1:]] == ["second question about uniforms", "short answer", "third question"]
+
+
+def test_compact_bounds_prompt_for_very_long_sessions():
+    history = []
+    for i in range(200):
+        history += [UserMessage(f"question {i}"), AIMessage("answer " * 30)]
+    messages = [SystemMessage("sys"), *history, UserMessage("latest")]
+
+    manager = _manager(500)
+    result = manager.compact(messages, history_end=len(history) + 1, live_from=len(messages))
+
+    assert manager.total_tokens(result) <= 500
+    assert result[-1].content == "latest"
+    assert result[-2].role == "assistant"
+
+
+def test_load_token_counter_falls_back_to_approximation():
+    from history import approximate_token_count, load_token_counter
+    assert load_token_counter(None) is approximate_token_count
+    assert approximate_token_count("abcdefgh") == 2
@@ -0,0 +1,93 @@
+from unittest.mock import MagicMock
+
+
+def _index():
+    from keyword_index import KeywordIndex
+    index = KeywordIndex()
+    index.add("doc_0", ["tuition", "refund"])
+    index.add("doc_1", ["uniform"])
+    index.add("doc_2", ["refund", "uniform", "refund"])
+    return index
+
+
+def test_lookup_unions_posting_lists():
+    index = _index()
+
+    assert index.lookup(["refund", "uniform"]) == ["doc_0", "doc_1", "doc_2"]
+    assert index.lookup(["tuition", "unknown"]) == ["doc_0"]
+    assert index.lookup(["unknown"]) == []
+
+
+def test_lookup_match_all_intersects_posting_lists():
+    index = _index()
+
+    assert index.lookup(["refund", "uniform"], match_all=True) == ["doc_2"]
+    assert index.lookup(["refund", "unknown"], match_all=True) == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    from keyword_index import KeywordIndex
+    index = _index()
+    index.version = "c1:3"
+    path = str(tmp_path / "documents.keywords.npz")
+    index.save(path)
+
+    loaded = KeywordIndex.load(path)
+    loaded.add("doc_3", ["tuition"])
+
+    assert loaded.version == "c1:3"
+    assert loaded.keyword_count == 3
+    assert loaded.lookup(["tuition"]) == ["doc_0", "doc_3"]
+    assert KeywordIndex.load(str(tmp_path / "missing.npz")) is None
+
+
+def test_load_keyword_index_converts_tag_metadata_once(tmp_path):
+    from keyword_index import KeywordIndex, load_keyword_index
+    from vector_store import StoredChunks
+    store = MagicMock()
+    store.version.return_value = "c1:2"
+    store.get_by_ids.return_value = StoredChunks(
+        ids=["doc_0", "doc_1"],
+        documents=["a", "b"],
+        metadatas=[{"page_number": 1, "tag_fees": True}, {"tag_fees": True, "tag_uniform": True}],
+    )
+    path = str(tmp_path / "documents.keywords.npz")
+
+    index = load_keyword_index(store, path)
+
+    assert index.lookup(["uniform"]) == ["doc_1"]
+    assert KeywordIndex.load(path).lookup(["fees"]) == ["doc_0", "doc_1"]
+
+
+def test_load_keyword_index_reads_the_file_next_to_the_store(tmp_path):
+    from keyword_index import load_keyword_index
+    from vector_store import ChromaVectorStore
+    collection = MagicMock()
+    collection.id = "c1"
+    collection.name = "handbook"
+    collection.count.return_value = 3
+    index = _index()
+    index.version = "c1:3"
+    index.save(str(tmp_path / "handbook.keywords.npz"))
+
+    loaded = load_keyword_index(ChromaVectorStore(collection, directory=str(tmp_path)))
+
+    assert loaded.lookup(["uniform"]) == ["doc_1", "doc_2"]
+    collection.get.assert_not_called()
+
+
+def test_load_keyword_index_ignores_index_of_another_version(tmp_path):
+    from keyword_index import load_keyword_index
+    from vector_store import StoredChunks
+    index = _index()
+    index.version = "other:3"
+    path = str(tmp_path / "documents.keywords.npz")
+    index.save(path)
+    store = MagicMock()
+    store.version.return_value = "c1:3"
+    store.get_by_ids.return_value = StoredChunks(ids=["doc_0", "doc_1", "doc_2"], documents=["a", "b", "c"], metadatas=[None] * 3)
+
+    loaded = load_keyword_index(store, path)
+
+    assert loaded.keyword_count == 0
+    assert loaded.lookup(["refund"]) == []
@@ -0,0 +1,65 @@
+from metrics import AggregatingMetricsSink
+
+
+def _run(latency, mode="tools", cancelled=False, ttft=0.5, tools=()):
+    return {
+        "mode": mode,
+        "cancelled": cancelled,
+        "latency": latency,
+        "generations": 1,
+        "prompt_tokens": 100,
+        "output_tokens": 10,
+        "iterations": [{"queue_wait": 0.0, "ttft": ttft, "tokens": 10, "tokens_per_sec": 20.0}],
+        "tools": [{"id": f"call_{i}", "tool": name, "seconds": s, "success": True} for i, (name, s) in enumerate(tools)],
+    }
+
+
+def test_empty_summary():
+    assert AggregatingMetricsSink().summary() == {"runs": 0}
+
+
+def test_summary_aggregates_runs():
+    sink = AggregatingMetricsSink()
+    sink.record(_run(1.0, ttft=0.2, tools=[("search_handbook", 0.4)]))
+    sink.record(_run(3.0, mode="direct", cancelled=True, ttft=0.4, tools=[("search_handbook", 0.2)]))
+
+    summary = sink.summary()
+
+    assert summary["runs"] == 2
+    assert summary["cancelled"] == 1
+    assert summary["modes"] == {"tools": 1, "direct": 1}
+    assert summary["latency_p50"] == 2.0
+    assert abs(summary["mean_ttft"] - 0.3) < 1e-9
+    assert abs(summary["mean_tool_seconds"]["search_handbook"] - 0.3) < 1e-9
+
+
+def test_summary_keeps_only_recent_runs():
+    sink = AggregatingMetricsSink(max_runs=2)
+    for latency in (10.0, 1.0, 1.0):
+        sink.record(_run(latency))
+
+    assert sink.summary()["latency_p95"] == 1.0
+
+
+def test_prometheus_sink_observes_run():
+    from metrics import PrometheusMetricsSink
+    from prometheus_client import REGISTRY
+
+    def value(name, labels=None):
+        return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+    before = (
+        value("emma_agent_iterations_total"),
+        value("emma_tool_seconds_count", {"tool": "search_handbook"}),
+        value("emma_soft_cap_fallbacks_total"),
+        value("emma_agent_errors_total"),
+    )
+    run = _run(1.0, tools=[("search_handbook", 0.1)])
+    run.update(generations=3, soft_cap=True, error=False)
+
+    PrometheusMetricsSink().record(run)
+
+    assert value("emma_agent_iterations_total") == before[0] + 3
+    assert value("emma_tool_seconds_count", {"tool": "search_handbook"}) == before[1] + 1
+    assert value("emma_soft_cap_fallbacks_total") == before[2] + 1
+    assert value("emma_agent_errors_total") == before[3]
@@ -164,6 +164,30 @@ def test_lm_studio_embed():
     assert call_kwargs["model"] == "test-embed"
 
 
+def test_lm_studio_embed_batch_sends_one_request():
+    from providers.lm_studio import LMStudioProvider
+    provider = LMStudioProvider(
+        base_url="http://localhost:1234/v1",
+        api_key="test",
+        llm_model="test-model",
+        vlm_model="test-vlm",
+        embedding_model="test-embed",
+    )
+
+    first, second = MagicMock(), MagicMock()
+    first.index, first.embedding = 0, [0.1]
+    second.index, second.embedding = 1, [0.2]
+    mock_response = MagicMock()
+    mock_response.data = [second, first]
+
+    with patch.object(provider._client.embeddings, "create", return_value=mock_response) as mock_create:
+        result = provider.embed_batch(["a", "b"], "search_query")
+
+    assert result == [[0.1], [0.2]]
+    mock_create.assert_called_once()
+    assert mock_create.call_args[1]["input"] == ["search_query: a", "search_query: b"]
+
+
 def test_stream_delta_holds_content():
     from providers import StreamDelta
     d = StreamDelta(content="hello")
@@ -184,6 +208,42 @@ def test_stream_delta_holds_finish_reason():
     assert d.finish_reason == "stop"
 
 
+class _FakeStream:
+    """Stands in for the OpenAI client's Stream/AsyncStream."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+
+    async def __aiter__(self):
+        for chunk in self._chunks:
+            yield chunk
+
+
+def _content_chunk(content, finish_reason=None):
+    chunk = MagicMock()
+    chunk.choices = [MagicMock()]
+    chunk.choices[0].delta.content = content
+    chunk.choices[0].delta.tool_calls = None
+    chunk.choices[0].finish_reason = finish_reason
+    return chunk
+
+
 def test_lm_studio_stream_yields_content_deltas():
     from providers import StreamDelta, UserMessage
     from providers.lm_studio import LMStudioProvider
@@ -213,7 +273,7 @@ def test_lm_studio_stream_yields_content_deltas():
     mock_chunk_3.choices[0].delta.tool_calls = None
     mock_chunk_3.choices[0].finish_reason = "stop"
 
-    with patch.object(provider._client.chat.completions, "create", return_value=iter([mock_chunk_1, mock_chunk_2, mock_chunk_3])):
+    with patch.object(provider._client.chat.completions, "create", return_value=_FakeStream([mock_chunk_1, mock_chunk_2, mock_chunk_3])):
         deltas = list(provider.generate_stream(messages=[UserMessage("hi")]))
 
     contents = [d.content for d in deltas if d.content]
@@ -264,9 +324,358 @@ def test_lm_studio_stream_yields_tool_call_deltas():
 
     tools = [ToolDefinition(name="search_handbook", description="search", parameters={"type": "object", "properties": {}})]
 
-    with patch.object(provider._client.chat.completions, "create", return_value=iter([mock_chunk_1, mock_chunk_2, mock_chunk_3])):
+    with patch.object(provider._client.chat.completions, "create", return_value=_FakeStream([mock_chunk_1, mock_chunk_2, mock_chunk_3])):
         deltas = list(provider.generate_stream(messages=[UserMessage("test")], tools=tools))
 
     tool_deltas = [d for d in deltas if d.tool_call_id or d.tool_call_arguments]
     assert len(tool_deltas) >= 1
     assert deltas[-1].finish_reason == "tool_calls"
+
+
+@pytest.mark.asyncio
+async def test_lm_studio_stream_async_yields_content_deltas():
+    from unittest.mock import AsyncMock
+    from providers import UserMessage
+    from providers.lm_studio import LMStudioProvider
+    provider = LMStudioProvider(
+        base_url="http://localhost:1234/v1",
+        api_key="test",
+        llm_model="test-model",
+        vlm_model="test-vlm",
+        embedding_model="test-embed",
+    )
+
+    mock_chunk_1 = MagicMock()
+    mock_chunk_1.choices = [MagicMock()]
+    mock_chunk_1.choices[0].delta.content = "Hello "
+    mock_chunk_1.choices[0].delta.tool_calls = None
+    mock_chunk_1.choices[0].finish_reason = None
+
+    mock_chunk_2 = MagicMock()
+    mock_chunk_2.choices = [MagicMock()]
+    mock_chunk_2.choices[0].delta.content = None
+    mock_chunk_2.choices[0].delta.tool_calls = None
+    mock_chunk_2.choices[0].finish_reason = "stop"
+
+    chunks = _FakeStream([mock_chunk_1, mock_chunk_2])
+
+    with patch.object(provider._async_client.chat.completions, "create", new=AsyncMock(return_value=chunks)) as mock_create:
+        deltas = [d async for d in provider.generate_stream_async(messages=[UserMessage("hi")])]
+
+    assert [d.content for d in deltas if d.content] == ["Hello "]
+    assert deltas[-1].finish_reason == "stop"
+    assert mock_create.call_args[1]["stream"] is True
+    assert chunks.closed
+
+
+@pytest.mark.asyncio
+async def test_lm_studio_stream_async_closes_upstream_when_abandoned():
+    from contextlib import aclosing
+    from unittest.mock import AsyncMock
+    from providers import UserMessage
+    from providers.lm_studio import LMStudioProvider
+    provider = LMStudioProvider(
+        base_url="http://localhost:1234/v1",
+        api_key="test",
+        llm_model="test-model",
+        vlm_model="test-vlm",
+        embedding_model="test-embed",
+    )
+    chunks = _FakeStream([_content_chunk("a"), _content_chunk("b"), _content_chunk(None, "stop")])
+
+    with patch.object(provider._async_client.chat.completions, "create", new=AsyncMock(return_value=chunks)):
+        async with aclosing(provider.generate_stream_async(messages=[UserMessage("hi")])) as stream:
+            async for _ in stream:
+                break
+
+    assert chunks.closed
+
+
+@pytest.mark.asyncio
+async def test_llm_provider_default_stream_async_wraps_sync_stream():
+    from providers import LLMProvider, StreamDelta, UserMessage
+
+    class SyncOnlyProvider(LLMProvider):
+        def generate(self, messages, temperature=0.7, max_tokens=-1):
+            return ""
+
+        def generate_with_tools(self, messages, tools, temperature=0.7, tool_choice="auto"):
+            return None
+
+        def generate_stream(self, messages, tools=None, temperature=0.7, tool_choice="auto"):
+            yield StreamDelta(content="a")
+            yield StreamDelta(finish_reason="stop")
+
+        def embed(self, text, purpose):
+            return []
+
+        def vision(self, image_data, prompt, temperature=0.1, response_format=None):
+            return ""
+
+    deltas = [d async for d in SyncOnlyProvider().generate_stream_async(messages=[UserMessage("hi")])]
+    assert deltas[0].content == "a"
+    assert deltas[-1].finish_reason == "stop"
+
+
+@pytest.mark.asyncio
+async def test_llm_provider_default_stream_async_closes_sync_stream_when_abandoned():
+    import asyncio
+    import threading
+    from contextlib import aclosing
+    from providers import LLMProvider, StreamDelta, UserMessage
+
+    closed = threading.Event()
+
+    class SyncOnlyProvider(LLMProvider):
+        def generate(self, messages, temperature=0.7, max_tokens=-1):
+            return ""
+
+        def generate_with_tools(self, messages, tools, temperature=0.7, tool_choice="auto"):
+            return None
+
+        def generate_stream(self, messages, tools=None, temperature=0.7, tool_choice="auto"):
+            try:
+                while True:
+                    yield StreamDelta(content="a")
+            finally:
+                closed.set()
+
+        def embed(self, text, purpose):
+            return []
+
+        def vision(self, image_data, prompt, temperature=0.1, response_format=None):
+            return ""
+
+    async with aclosing(SyncOnlyProvider().generate_stream_async(messages=[UserMessage("hi")])) as stream:
+        async for _ in stream:
+            break
+
+    assert await asyncio.to_thread(closed.wait, 1)
+
+
+def _fake_embedder(model="embed-v1"):
+    embedder = MagicMock()
+    embedder.embedding_model = model
+    embedder.embed_batch.side_effect = lambda texts, purpose: [[float(len(t))] for t in texts]
+    return embedder
+
+
+def test_cached_embedding_provider_hits_on_normalized_text():
+    from providers.embedding_cache import CachedEmbeddingProvider, EmbeddingCache
+    inner = _fake_embedder()
+    cached = CachedEmbeddingProvider(inner, EmbeddingCache(max_entries=10))
+
+    first = cached.embed("Tuition refund", "search_query")
+    second = cached.embed("  tuition   REFUND ", "search_query")
+
+    assert first == second
+    assert inner.embed_batch.call_count == 1
+    assert cached.cache.stats()["hits"] == 1
+    assert cached.cache.stats()["misses"] == 1
+
+
+def test_cached_embedding_provider_only_fetches_misses_in_batch():
+    from providers.embedding_cache import CachedEmbeddingProvider, EmbeddingCache
+    inner = _fake_embedder()
+    cached = CachedEmbeddingProvider(inner, EmbeddingCache(max_entries=10))
+
+    cached.embed("dress code", "search_query")
+    result = cached.embed_batch(["dress code", "uniform"], "search_query")
+
+    assert result == [[10.0], [7.0]]
+    assert inner.embed_batch.call_args[0][0] == ["uniform"]
+
+
+def test_embedding_cache_evicts_least_recently_used():
+    from providers.embedding_cache import EmbeddingCache
+    cache = EmbeddingCache(max_entries=2)
+    cache.put(("m", "q", "a"), [1.0])
+    cache.put(("m", "q", "b"), [2.0])
+    cache.get(("m", "q", "a"))
+    cache.put(("m", "q", "c"), [3.0])
+
+    assert cache.get(("m", "q", "b")) is None
+    assert cache.get(("m", "q", "a")) == [1.0]
+
+
+def test_embedding_cache_persists_and_invalidates_on_model_change():
+    import os
+    import tempfile
+    from providers.embedding_cache import CachedEmbeddingProvider, EmbeddingCache
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "cache.db")
+        CachedEmbeddingProvider(_fake_embedder(), EmbeddingCache(path=path)).embed("hello", "search_query")
+
+        inner = _fake_embedder()
+        CachedEmbeddingProvider(inner, EmbeddingCache(path=path)).embed("hello", "search_query")
+        assert inner.embed_batch.call_count == 0
+
+        inner = _fake_embedder(model="embed-v2")
+        CachedEmbeddingProvider(inner, EmbeddingCache(path=path)).embed("hello", "search_query")
+        assert inner.embed_batch.call_count == 1
+
+
+def test_embedding_cache_writes_a_batch_of_misses_in_one_commit(tmp_path):
+    from providers.embedding_cache import CachedEmbeddingProvider, EmbeddingCache
+    path = str(tmp_path / "cache.db")
+    cache = EmbeddingCache(path=path)
+    cached = CachedEmbeddingProvider(_fake_embedder(), cache)
+    statements = []
+    cache._db.set_trace_callback(statements.append)
+
+    cached.embed_batch(["tuition", "dress code", "uniform"], "search_query")
+
+    assert sum(1 for sql in statements if sql.strip().upper() == "COMMIT") == 1
+    inner = _fake_embedder()
+    reopened = CachedEmbeddingProvider(inner, EmbeddingCache(path=path))
+    assert reopened.embed_batch(["uniform", "tuition"], "search_query") == [[7.0], [7.0]]
+    inner.embed_batch.assert_not_called()
+
+
+def test_composite_provider_routes_embeddings_and_chat():
+    from providers.composite import CompositeProvider
+    chat = MagicMock()
+    chat.generate.return_value = "answer"
+    embedder = _fake_embedder(model="local-embed")
+
+    composite = CompositeProvider(chat=chat, embedder=embedder)
+
+    assert composite.generate([]) == "answer"
+    assert composite.embed_batch(["abc"], "search_query") == [[3.0]]
+    assert composite.embedding_model == "local-embed"
+    chat.embed_batch.assert_not_called()
+
+
+def _fake_onnx_provider(hidden_states, max_batch_size=16):
+    import numpy as np
+    from providers.onnx_embedder import OnnxEmbeddingProvider
+
+    encoding = MagicMock()
+    encoding.ids = [1, 2, 0]
+    encoding.attention_mask = [1, 1, 0]
+    tokenizer = MagicMock()
+    tokenizer.encode_batch.side_effect = lambda batch: [encoding for _ in batch]
+
+    session = MagicMock()
+    session.get_inputs.return_value = []
+    session.run.side_effect = lambda names, feed: [np.repeat(hidden_states[None], len(feed["input_ids"]), axis=0)]
+
+    with patch("providers.onnx_embedder.Tokenizer.from_file", return_value=tokenizer), \
+            patch("providers.onnx_embedder.ort.InferenceSession", return_value=session):
+        provider = OnnxEmbeddingProvider(
+            model_dir="/models/nomic", model_name="nomic", max_batch_size=max_batch_size,
+        )
+    return provider, tokenizer, session
+
+
+def test_onnx_embedder_mean_pools_and_normalizes():
+    import numpy as np
+    # Third token is padding and must not affect the pooled vector
+    hidden = np.array([[3.0, 0.0], [3.0, 8.0], [100.0, 100.0]], dtype=np.float32)
+    provider, tokenizer, _ = _fake_onnx_provider(hidden)
+
+    vector = provider.embed("dress code", "search_query")
+
+    assert np.allclose(vector, [0.6, 0.8])
+    assert tokenizer.encode_batch.call_args[0][0] == ["search_query: dress code"]
+
+
+def test_onnx_embedder_splits_large_batches():
+    import numpy as np
+    hidden = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 0.0]], dtype=np.float32)
+    provider, _, session = _fake_onnx_provider(hidden, max_batch_size=2)
+
+    vectors = provider.embed_batch(["a", "b", "c"], "search_document")
+
+    assert len(vectors) == 3
+    assert session.run.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_scheduler_serves_continuations_before_new_requests():
+    import asyncio
+    from providers.scheduler import CONTINUATION, NEW_REQUEST, GenerationScheduler
+
+    scheduler = GenerationScheduler(max_concurrent=1, max_queue=4)
+    assert await scheduler.acquire(NEW_REQUEST) == 0.0
+
+    order = []
+
+    async def wait(name, priority):
+        await scheduler.acquire(priority)
+        order.append(name)
+
+    new = asyncio.ensure_future(wait("new", NEW_REQUEST))
+    continuation = asyncio.ensure_future(wait("continuation", CONTINUATION))
+    await asyncio.sleep(0)
+    assert scheduler.queued == 2
+
+    scheduler.release(1.0)
+    await asyncio.sleep(0)
+    scheduler.release(1.0)
+    await asyncio.gather(new, continuation)
+
+    assert order == ["continuation", "new"]
+    assert scheduler.running == 1
+
+
+@pytest.mark.asyncio
+async def test_scheduler_refuses_new_requests_when_queue_is_full():
+    import asyncio
+    from providers.scheduler import CONTINUATION, NEW_REQUEST, GenerationScheduler, QueueFullError
+
+    scheduler = GenerationScheduler(max_concurrent=1, max_queue=1)
+    await scheduler.acquire(NEW_REQUEST)
+    queued = asyncio.ensure_future(scheduler.acquire(NEW_REQUEST))
+    await asyncio.sleep(0)
+
+    assert scheduler.saturated
+    with pytest.raises(QueueFullError) as excinfo:
+        await scheduler.acquire(NEW_REQUEST)
+    assert excinfo.value.retry_after >= 1
+
+    # In-progress agent loops are never refused
+    continuation = asyncio.ensure_future(scheduler.acquire(CONTINUATION))
+    await asyncio.sleep(0)
+    assert scheduler.queued == 2
+
+    queued.cancel()
+    await asyncio.sleep(0)
+    assert scheduler.queued == 1
+    scheduler.release()
+    await continuation
+
+
+@pytest.mark.asyncio
+async def test_scheduled_provider_reports_queue_wait_and_frees_slot():
+    import asyncio
+    from providers import StreamDelta, UserMessage
+    from providers.scheduler import GenerationScheduler, GenerationTicket, ScheduledProvider, scheduling
+
+    inner = MagicMock()
+
+    async def stream(*args, **kwargs):
+        yield StreamDelta(content="hi")
+        yield StreamDelta(finish_reason="stop")
+
+    inner.generate_stream_async.side_effect = stream
+    scheduler = GenerationScheduler(max_concurrent=1)
+    provider = ScheduledProvider(inner, scheduler)
+
+    await scheduler.acquire(0)
+    ticket = GenerationTicket()
+    with scheduling(ticket):
+        gen = provider.generate_stream_async(messages=[UserMessage("hi")])
+
+    async def consume():
+        return [d async for d in gen]
+
+    task = asyncio.ensure_future(consume())
+    await asyncio.sleep(0.01)
+    scheduler.release()
+    deltas = await task
+
+    assert deltas[0].content == "hi"
+    assert ticket.queue_wait > 0
+    assert scheduler.running == 0
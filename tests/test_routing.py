@@ -0,0 +1,23 @@
+from routing import choose_mode, needs_tools
+
+
+def test_simple_question_is_answered_directly():
+    assert choose_mode("What is the dress code for students?") == "direct"
+
+
+def test_page_lookup_needs_tools():
+    assert needs_tools("What does page 42 say?")
+
+
+def test_calculation_needs_tools():
+    assert needs_tools("What is 3 * 4.5?")
+    assert needs_tools("Compute my average grade")
+
+
+def test_multi_part_question_needs_tools():
+    assert needs_tools("What is the dress code? Is there a curfew?")
+    assert needs_tools("When is enrollment and how do I pay?")
+
+
+def test_long_question_needs_tools():
+    assert choose_mode("word " * 100) == "tools"
@@ -6,7 +6,7 @@ from unittest.mock import MagicMock, patch
 def mock_agent():
     agent = MagicMock()
 
-    async def default_run(input, chat_history):
+    async def default_run(input, chat_history, **kwargs):
         yield {"type": "answer_chunk", "chunk": "Test answer"}
         yield {"type": "answer_done"}
 
@@ -40,7 +40,7 @@ def test_invoke_returns_sse_stream(client, mock_agent):
 
 
 def test_invoke_stream_contains_answer_chunks(client, mock_agent):
-    async def fake_run(input, chat_history):
+    async def fake_run(input, chat_history, **kwargs):
         yield {"type": "answer_chunk", "chunk": "The answer"}
         yield {"type": "answer_chunk", "chunk": " is 42"}
         yield {"type": "answer_done"}
@@ -60,7 +60,7 @@ def test_invoke_stream_contains_answer_chunks(client, mock_agent):
 
 
 def test_invoke_stream_contains_tool_events(client, mock_agent):
-    async def fake_run(input, chat_history):
+    async def fake_run(input, chat_history, **kwargs):
         yield {"type": "tool_start", "tool": "search_handbook", "arguments": {"query": "test"}}
         yield {"type": "tool_end", "tool": "search_handbook", "success": True}
         yield {"type": "answer_chunk", "chunk": "Found it"}
@@ -78,3 +78,160 @@ def test_invoke_stream_contains_tool_events(client, mock_agent):
     assert "tool_start" in body
     assert "tool_end" in body
     assert "answer_chunk" in body
+
+
+def test_stats_reports_aggregated_runs(client, mock_agent):
+    import server
+
+    mock_agent.cancellation_stats.as_dict.return_value = {"completed": 1, "cancelled": 0, "tokens_saved": 0}
+    mock_agent.prefetch_stats.as_dict.return_value = {"started": 0}
+    mock_agent.answer_cache.stats.return_value = {"hits": 1, "misses": 3, "hit_rate": 0.25, "size": 2}
+    mock_agent.embedding_cache.stats.return_value = {"hits": 5, "misses": 5, "hit_rate": 0.5, "size": 5}
+    mock_agent.executors.stats.return_value = {"tools": {"max_workers": 8, "active": 0, "queued": 0}}
+    server.metrics.record({
+        "mode": "tools", "cancelled": False, "latency": 1.5, "generations": 2, "prompt_tokens": 300,
+        "output_tokens": 40, "iterations": [{"queue_wait": 0.0, "ttft": 0.2, "tokens": 40, "tokens_per_sec": 20.0}],
+        "tools": [{"id": "call_1", "tool": "search_handbook", "seconds": 0.3, "success": True}],
+    })
+
+    response = client.get("/stats")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["runs"]["runs"] == 1
+    assert body["runs"]["mean_tool_seconds"] == {"search_handbook": 0.3}
+    assert body["cancellation"]["completed"] == 1
+    assert body["answer_cache"]["hits"] == 1
+    assert body["embedding_cache"]["hit_rate"] == 0.5
+    assert body["executors"]["tools"]["max_workers"] == 8
+
+
+def test_metrics_exposes_prometheus_histograms(client, mock_agent):
+    client.post("/invoke", json={
+        "config": {},
+        "input": {"input": "test question", "chat_history": [], "n_results": 10},
+        "kwargs": {},
+    })
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "text/plain" in response.headers["content-type"]
+    assert "emma_invoke_seconds_count" in response.text
+    assert "emma_in_flight_streams 0.0" in response.text
+
+
+def test_invoke_returns_429_when_generation_queue_is_full(client, monkeypatch):
+    import server
+    from providers.scheduler import GenerationScheduler
+
+    monkeypatch.setattr(server, "scheduler", GenerationScheduler(max_concurrent=1, max_queue=0))
+
+    response = client.post("/invoke", json={
+        "config": {},
+        "input": {"input": "test question", "chat_history": [], "n_results": 10},
+        "kwargs": {},
+    })
+
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_invoke_passes_budget_and_n_results_to_agent(client, mock_agent):
+    received = {}
+
+    async def fake_run(input, chat_history, **kwargs):
+        received.update(kwargs)
+        yield {"type": "answer_done"}
+
+    mock_agent.run = fake_run
+
+    client.post("/invoke", json={
+        "config": {},
+        "input": {"input": "q", "chat_history": [], "n_results": 5, "latency_budget": 8},
+        "kwargs": {},
+    })
+
+    assert received["n_results"] == 5
+    assert received["latency_budget"] == 8
+
+
+@pytest.mark.parametrize("options", [{"n_results": 0}, {"n_results": -3}, {"latency_budget": 0}, {"latency_budget": -1.5}])
+def test_invoke_rejects_non_positive_budget_and_n_results(client, options):
+    response = client.post("/invoke", json={
+        "config": {},
+        "input": {"input": "q", **options},
+        "kwargs": {},
+    })
+
+    assert response.status_code == 422
+
+
+def test_invoke_coalesces_answer_chunks_when_enabled(client, mock_agent, monkeypatch):
+    import server
+
+    async def fake_run(input, chat_history, **kwargs):
+        yield {"type": "answer_chunk", "chunk": "The answer"}
+        yield {"type": "answer_chunk", "chunk": " is 42"}
+        yield {"type": "answer_done"}
+
+    mock_agent.run = fake_run
+    monkeypatch.setattr(server, "coalesce_window", 0.05)
+
+    response = client.post("/invoke", json={
+        "config": {},
+        "input": {"input": "what is the answer?", "chat_history": []},
+        "kwargs": {},
+    })
+
+    assert response.text.count("event: answer_chunk") == 1
+    assert "The answer is 42" in response.text
+    assert "answer_done" in response.text
+
+
+def test_invoke_keeps_history_in_session(client, mock_agent):
+    histories = []
+
+    async def fake_run(input, chat_history, **kwargs):
+        histories.append([m.content for m in chat_history])
+        yield {"type": "answer_chunk", "chunk": f"re: {input}"}
+        yield {"type": "answer_done"}
+
+    mock_agent.run = fake_run
+
+    first = client.post("/invoke", json={
+        "config": {},
+        "input": {"input": "one", "chat_history": [{"role": "user", "content": "zero"}], "session": True},
+        "kwargs": {},
+    })
+    session_id = first.headers["X-Session-Id"]
+    # sse-starlette binds its exit event to the loop of the first request
+    from sse_starlette.sse import AppStatus
+    AppStatus.should_exit_event = None
+    client.post("/invoke", json={
+        "config": {},
+        "input": {"input": "two", "session_id": session_id},
+        "kwargs": {},
+    })
+
+    assert histories == [["zero"], ["zero", "one", "re: one"]]
+
+
+def test_invoke_rejects_unknown_session(client):
+    response = client.post("/invoke", json={
+        "config": {},
+        "input": {"input": "two", "session_id": "missing"},
+        "kwargs": {},
+    })
+
+    assert response.status_code == 404
+
+
+def test_invoke_rejects_unknown_mode(client):
+    response = client.post("/invoke", json={
+        "config": {},
+        "input": {"input": "q", "mode": "fast"},
+        "kwargs": {},
+    })
+
+    assert response.status_code == 422
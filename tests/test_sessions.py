@@ -0,0 +1,38 @@
+from unittest.mock import patch
+
+from providers import AIMessage, UserMessage
+from sessions import InMemorySessionStore
+
+
+def test_session_history_accumulates():
+    store = InMemorySessionStore()
+    session_id = store.create()
+
+    store.append(session_id, [UserMessage("hi"), AIMessage("hello")])
+    store.append(session_id, [UserMessage("bye")])
+
+    assert [m.content for m in store.get(session_id)] == ["hi", "hello", "bye"]
+
+
+def test_unknown_session_is_none():
+    assert InMemorySessionStore().get("missing") is None
+
+
+def test_session_expires_after_ttl():
+    store = InMemorySessionStore(ttl=10)
+    with patch("sessions.time.monotonic", return_value=100.0):
+        session_id = store.create()
+    with patch("sessions.time.monotonic", return_value=111.0):
+        assert store.get(session_id) is None
+
+
+def test_least_recently_used_session_is_evicted():
+    store = InMemorySessionStore(max_sessions=2)
+    first = store.create()
+    second = store.create()
+    store.get(first)
+    store.create()
+
+    assert store.get(second) is None
+    assert store.get(first) == []
+    assert len(store) == 2
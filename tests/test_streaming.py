@@ -0,0 +1,85 @@
+from providers import StreamDelta
+
+
+def test_assembler_reports_call_when_arguments_close():
+    from streaming import ToolCallAssembler
+    assembler = ToolCallAssembler()
+
+    assert assembler.feed(StreamDelta(tool_call_id="call_1", tool_call_name="search")) == []
+    assert assembler.feed(StreamDelta(tool_call_arguments='{"queries": ["a", "b}')) == []
+    ready = assembler.feed(StreamDelta(tool_call_arguments='"]}'))
+
+    assert len(ready) == 1
+    assert ready[0].id == "call_1"
+    assert ready[0].arguments == {"queries": ["a", "b}"]}
+    assert assembler.finish() == []
+
+
+def test_assembler_ignores_braces_inside_strings():
+    from streaming import ToolCallAssembler
+    assembler = ToolCallAssembler()
+    assembler.feed(StreamDelta(tool_call_id="call_1", tool_call_name="calculate"))
+
+    assert assembler.feed(StreamDelta(tool_call_arguments='{"expression": "}\\"{"')) == []
+    ready = assembler.feed(StreamDelta(tool_call_arguments="}"))
+    assert ready[0].arguments == {"expression": '}"{'}
+
+
+def test_assembler_reports_previous_call_when_next_starts():
+    from streaming import ToolCallAssembler
+    assembler = ToolCallAssembler()
+    assembler.feed(StreamDelta(tool_call_id="call_1", tool_call_name="get_page"))
+
+    ready = assembler.feed(StreamDelta(tool_call_id="call_2", tool_call_name="calculate"))
+    assert [tc.id for tc in ready] == ["call_1"]
+    assert ready[0].arguments == {}
+
+    ready = assembler.finish()
+    assert [tc.id for tc in ready] == ["call_2"]
+
+
+def test_assembler_assigns_ids_to_calls_without_one():
+    from streaming import ToolCallAssembler
+    assembler = ToolCallAssembler()
+    assembler.feed(StreamDelta(tool_call_name="echo", tool_call_arguments='{"text": "x"'))
+
+    ready = assembler.finish()
+    assert ready[0].id == "call_0"
+    assert ready[0].arguments == {}
+
+
+def _run_filter(chunks):
+    from streaming import ThinkingFilter
+    f = ThinkingFilter()
+    segments = []
+    for chunk in chunks:
+        segments.extend(f.feed(chunk))
+    segments.extend(f.flush())
+    answer = "".join(text for thinking, text in segments if not thinking)
+    thinking = "".join(text for thinking, text in segments if thinking)
+    return answer, thinking
+
+
+def test_thinking_filter_strips_thinking_block():
+    answer, thinking = _run_filter(["Hi <|channel>plan it<channel|>there"])
+    assert answer == "Hi there"
+    assert thinking == "plan it"
+
+
+def test_thinking_filter_handles_tags_split_across_deltas():
+    text = "A<|channel>think<channel|>B<|channel>more<channel|>C"
+    # Every possible split point, including inside both tags
+    for i in range(len(text) + 1):
+        assert _run_filter([text[:i], text[i:]]) == ("ABC", "thinkmore")
+    assert _run_filter(list(text)) == ("ABC", "thinkmore")
+
+
+def test_thinking_filter_holds_back_only_possible_tag_prefix():
+    from streaming import ThinkingFilter
+    f = ThinkingFilter()
+    assert f.feed("Answer <|chan") == [(False, "Answer ")]
+    assert f.feed("ge") == [(False, "<|change")]
+
+
+def test_thinking_filter_flushes_partial_tag_text_at_end():
+    assert _run_filter(["price < 5 <|"]) == ("price < 5 <|", "")
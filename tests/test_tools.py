@@ -152,9 +152,10 @@ from unittest.mock import MagicMock
 
 def test_search_handbook_returns_results_with_grounding_reminder():
     from tools.search_handbook import SearchHandbookTool
+    from vector_store import ChromaVectorStore
 
     mock_provider = MagicMock()
-    mock_provider.embed.return_value = [0.1, 0.2, 0.3]
+    mock_provider.embed_batch.side_effect = lambda texts, purpose: [[0.1, 0.2, 0.3] for _ in texts]
 
     mock_collection = MagicMock()
     mock_collection.query.return_value = {
@@ -162,7 +163,7 @@ def test_search_handbook_returns_results_with_grounding_reminder():
         "distances": [[0.3, 0.4]],
     }
 
-    tool = SearchHandbookTool(provider=mock_provider, collection=mock_collection)
+    tool = SearchHandbookTool(provider=mock_provider, store=ChromaVectorStore(mock_collection))
     result = tool.execute(queries=["attendance policy"])
 
     assert result.success is True
@@ -172,17 +173,18 @@ def test_search_handbook_returns_results_with_grounding_reminder():
 
 def test_search_handbook_multiple_queries_deduplicates():
     from tools.search_handbook import SearchHandbookTool
+    from vector_store import ChromaVectorStore
 
     mock_provider = MagicMock()
-    mock_provider.embed.return_value = [0.1, 0.2, 0.3]
+    mock_provider.embed_batch.side_effect = lambda texts, purpose: [[0.1, 0.2, 0.3] for _ in texts]
 
     mock_collection = MagicMock()
-    mock_collection.query.side_effect = [
-        {"documents": [["Shared doc", "Doc A"]], "distances": [[0.2, 0.3]]},
-        {"documents": [["Shared doc", "Doc B"]], "distances": [[0.2, 0.5]]},
-    ]
+    mock_collection.query.return_value = {
+        "documents": [["Shared doc", "Doc A"], ["Shared doc", "Doc B"]],
+        "distances": [[0.2, 0.3], [0.2, 0.5]],
+    }
 
-    tool = SearchHandbookTool(provider=mock_provider, collection=mock_collection)
+    tool = SearchHandbookTool(provider=mock_provider, store=ChromaVectorStore(mock_collection))
     result = tool.execute(queries=["query one", "query two"])
 
     assert result.success is True
@@ -192,16 +194,40 @@ def test_search_handbook_multiple_queries_deduplicates():
     assert result.content.count("Shared doc") == 1
 
 
+def test_search_handbook_batches_queries_into_one_lookup():
+    from tools.search_handbook import SearchHandbookTool
+    from vector_store import ChromaVectorStore
+
+    mock_provider = MagicMock()
+    mock_provider.embed_batch.side_effect = lambda texts, purpose: [[float(i)] for i in range(len(texts))]
+
+    mock_collection = MagicMock()
+    mock_collection.query.return_value = {
+        "documents": [["Doc A"], ["Doc B"], ["Doc C"]],
+        "distances": [[0.2], [0.3], [0.4]],
+    }
+
+    tool = SearchHandbookTool(provider=mock_provider, store=ChromaVectorStore(mock_collection))
+    result = tool.execute(queries=["one", "two", "three"])
+
+    assert result.success is True
+    mock_provider.embed_batch.assert_called_once_with(["one", "two", "three"], "search_query")
+    mock_provider.embed.assert_not_called()
+    mock_collection.query.assert_called_once()
+    assert mock_collection.query.call_args[1]["query_embeddings"] == [[0.0], [1.0], [2.0]]
+
+
 def test_search_handbook_accepts_single_string():
     from tools.search_handbook import SearchHandbookTool
+    from vector_store import ChromaVectorStore
 
     mock_provider = MagicMock()
-    mock_provider.embed.return_value = [0.1, 0.2, 0.3]
+    mock_provider.embed_batch.side_effect = lambda texts, purpose: [[0.1, 0.2, 0.3] for _ in texts]
 
     mock_collection = MagicMock()
     mock_collection.query.return_value = {"documents": [["Some doc"]], "distances": [[0.3]]}
 
-    tool = SearchHandbookTool(provider=mock_provider, collection=mock_collection)
+    tool = SearchHandbookTool(provider=mock_provider, store=ChromaVectorStore(mock_collection))
     result = tool.execute(queries="single query string")
 
     assert result.success is True
@@ -210,14 +236,15 @@ def test_search_handbook_accepts_single_string():
 
 def test_search_handbook_no_results():
     from tools.search_handbook import SearchHandbookTool
+    from vector_store import ChromaVectorStore
 
     mock_provider = MagicMock()
-    mock_provider.embed.return_value = [0.1, 0.2, 0.3]
+    mock_provider.embed_batch.side_effect = lambda texts, purpose: [[0.1, 0.2, 0.3] for _ in texts]
 
     mock_collection = MagicMock()
     mock_collection.query.return_value = {"documents": [[]], "distances": [[]]}
 
-    tool = SearchHandbookTool(provider=mock_provider, collection=mock_collection)
+    tool = SearchHandbookTool(provider=mock_provider, store=ChromaVectorStore(mock_collection))
     result = tool.execute(queries=["nonexistent topic"])
 
     assert result.success is False
@@ -227,16 +254,17 @@ def test_search_handbook_no_results():
 
 def test_search_handbook_tool_metadata():
     from tools.search_handbook import SearchHandbookTool
-    tool = SearchHandbookTool(provider=MagicMock(), collection=MagicMock())
+    tool = SearchHandbookTool(provider=MagicMock(), store=MagicMock())
     assert tool.name == "search_handbook"
     assert "queries" in tool.parameters["properties"]
 
 
 def test_search_handbook_high_confidence():
     from tools.search_handbook import SearchHandbookTool
+    from vector_store import ChromaVectorStore
 
     mock_provider = MagicMock()
-    mock_provider.embed.return_value = [0.1, 0.2, 0.3]
+    mock_provider.embed_batch.side_effect = lambda texts, purpose: [[0.1, 0.2, 0.3] for _ in texts]
 
     mock_collection = MagicMock()
     mock_collection.query.return_value = {
@@ -244,7 +272,7 @@ def test_search_handbook_high_confidence():
         "distances": [[0.2]],
     }
 
-    tool = SearchHandbookTool(provider=mock_provider, collection=mock_collection)
+    tool = SearchHandbookTool(provider=mock_provider, store=ChromaVectorStore(mock_collection))
     result = tool.execute(queries=["tardiness policy"])
 
     assert result.success is True
@@ -253,9 +281,10 @@ def test_search_handbook_high_confidence():
 
 def test_search_handbook_low_confidence():
     from tools.search_handbook import SearchHandbookTool
+    from vector_store import ChromaVectorStore
 
     mock_provider = MagicMock()
-    mock_provider.embed.return_value = [0.1, 0.2, 0.3]
+    mock_provider.embed_batch.side_effect = lambda texts, purpose: [[0.1, 0.2, 0.3] for _ in texts]
 
     mock_collection = MagicMock()
     mock_collection.query.return_value = {
@@ -263,9 +292,117 @@ def test_search_handbook_low_confidence():
         "distances": [[1.5]],
     }
 
-    tool = SearchHandbookTool(provider=mock_provider, collection=mock_collection)
+    tool = SearchHandbookTool(provider=mock_provider, store=ChromaVectorStore(mock_collection))
     result = tool.execute(queries=["something obscure"])
 
     assert result.success is True
     assert "low confidence" in result.content
     assert "may not be relevant" in result.content
+
+
+def test_search_handbook_prefetch_reuses_matching_query():
+    from tools.search_handbook import SearchHandbookTool
+    from vector_store import ChromaVectorStore
+
+    mock_provider = MagicMock()
+    mock_provider.embed_batch.side_effect = lambda texts, purpose: [[0.1, 0.2, 0.3] for _ in texts]
+
+    mock_collection = MagicMock()
+    mock_collection.query.return_value = {"documents": [["Refund doc"]], "distances": [[0.2]]}
+
+    tool = SearchHandbookTool(provider=mock_provider, store=ChromaVectorStore(mock_collection))
+    prefetched = tool.prefetch("What is the tuition refund policy?")
+
+    mock_collection.query.return_value = {"documents": [["Fees doc"]], "distances": [[0.3]]}
+    result = tool.execute_prefetched(
+        prefetched, queries=["tuition refund policy", "school fees"],
+    )
+
+    assert prefetched.reused is True
+    assert mock_provider.embed_batch.call_args[0][0] == ["school fees"]
+    assert result.content.index("Refund doc") < result.content.index("Fees doc")
+
+
+def test_search_handbook_prefetch_merges_when_no_query_matches():
+    from tools.search_handbook import SearchHandbookTool
+    from vector_store import ChromaVectorStore
+
+    mock_provider = MagicMock()
+    mock_provider.embed_batch.side_effect = lambda texts, purpose: [[0.1, 0.2, 0.3] for _ in texts]
+
+    mock_collection = MagicMock()
+    mock_collection.query.return_value = {"documents": [["Uniform doc"]], "distances": [[0.2]]}
+
+    tool = SearchHandbookTool(provider=mock_provider, store=ChromaVectorStore(mock_collection))
+    prefetched = tool.prefetch("can I wear sneakers")
+
+    mock_collection.query.return_value = {"documents": [["Dress code doc"]], "distances": [[0.3]]}
+    result = tool.execute_prefetched(prefetched, queries=["dress code footwear"])
+
+    assert prefetched.reused is False
+    assert "Dress code doc" in result.content
+    assert "Uniform doc" in result.content
+
+
+def test_search_handbook_fuses_bm25_hits_with_vector_results():
+    from tools.search_handbook import SearchHandbookTool
+    from vector_store import ChromaVectorStore
+
+    mock_provider = MagicMock()
+    mock_provider.embed_batch.side_effect = lambda texts, purpose: [[0.1, 0.2, 0.3] for _ in texts]
+
+    mock_collection = MagicMock()
+    mock_collection.query.return_value = {
+        "documents": [["Course overview doc", "CS 101 syllabus doc"]],
+        "distances": [[0.3, 0.5]],
+    }
+    lexical_index = MagicMock()
+    lexical_index.search.return_value = [("CS 101 syllabus doc", 4.2), ("CS 101 schedule doc", 3.1)]
+
+    tool = SearchHandbookTool(provider=mock_provider, store=ChromaVectorStore(mock_collection), lexical_index=lexical_index)
+    result = tool.execute(queries=["CS 101"])
+
+    assert result.success is True
+    # Ranked by both searches, so it leads the fused list
+    assert result.content.index("CS 101 syllabus doc") < result.content.index("Course overview doc")
+    assert "CS 101 schedule doc" in result.content
+    assert "3 of 3 results shown, high confidence" in result.content
+
+
+def test_search_handbook_fuses_each_query_ranking_separately():
+    from tools.search_handbook import SearchHandbookTool
+
+    mock_provider = MagicMock()
+    mock_provider.embed_batch.side_effect = lambda texts, purpose: [[0.1, 0.2, 0.3] for _ in texts]
+
+    store = MagicMock()
+    store.query_batch.return_value = [[("Tuition doc", 0.2), ("Refund doc", 0.3)], [("Refund doc", 0.25), ("Fees doc", 0.4)]]
+    lexical_index = MagicMock()
+    lexical_index.search.return_value = [("Scholarship doc", 2.0)]
+
+    tool = SearchHandbookTool(provider=mock_provider, store=store, lexical_index=lexical_index)
+    result = tool.execute(queries=["tuition", "refund policy"])
+
+    # Both queries found the refund doc, so it outranks the first query's top hit
+    assert result.content.index("Refund doc") < result.content.index("Tuition doc")
+    assert "4 of 4 results shown" in result.content
+
+
+def test_search_handbook_keyword_fallback_searches_tagged_ids():
+    from keyword_index import KeywordIndex
+    from tools.search_handbook import SearchHandbookTool
+
+    mock_provider = MagicMock()
+    mock_provider.embed_batch.side_effect = lambda texts, purpose: [[0.1, 0.2, 0.3] for _ in texts]
+
+    store = MagicMock()
+    store.query_batch.side_effect = lambda embeddings, n_results, ids=None: [[("Refund doc", 0.4)]] if ids else [[]]
+    keyword_index = KeywordIndex()
+    keyword_index.add("doc_7", ["refund"])
+
+    tool = SearchHandbookTool(provider=mock_provider, store=store, keyword_index=keyword_index)
+    result = tool.execute(queries=["refund"])
+
+    assert result.success is True
+    assert "Refund doc" in result.content
+    assert store.query_batch.call_args[1]["ids"] == ["doc_7"]
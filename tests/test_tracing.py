@@ -0,0 +1,58 @@
+from unittest.mock import MagicMock
+
+import pytest
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from tests.test_agent import _collect_events, _make_agent, _mock_tool_then_text_stream
+
+_exporter = InMemorySpanExporter()
+
+
+@pytest.fixture
+def spans():
+    # The global provider can only be set once per process
+    if not isinstance(trace.get_tracer_provider(), TracerProvider):
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(_exporter))
+        trace.set_tracer_provider(provider)
+    _exporter.clear()
+    yield _exporter
+    _exporter.clear()
+
+
+def test_tracing_is_off_without_exporter(monkeypatch):
+    from tracing import configure_tracing
+
+    monkeypatch.delenv("TRACING_EXPORTER", raising=False)
+    assert configure_tracing() is False
+
+
+@pytest.mark.asyncio
+async def test_agent_run_spans_nest(spans):
+    provider = MagicMock()
+    provider.generate_stream_async.side_effect = _mock_tool_then_text_stream("echo", '{"text": "hi"}', "done")
+    agent = _make_agent(provider=provider)
+
+    await _collect_events(agent, "hello")
+
+    by_name: dict[str, list] = {}
+    for span in spans.get_finished_spans():
+        by_name.setdefault(span.name, []).append(span)
+
+    run = by_name["agent.run"][0]
+    iterations = by_name["agent.iteration"]
+    assert len(iterations) == 2
+    assert all(it.parent.span_id == run.context.span_id for it in iterations)
+
+    generations = by_name["llm.generate_stream"]
+    assert len(generations) == 2
+    assert generations[1].attributes["output_tokens"] == 1
+
+    tool = by_name["tool.execute"][0]
+    assert tool.attributes["tool"] == "echo"
+    assert tool.attributes["success"] is True
+    assert tool.parent.span_id == iterations[0].context.span_id
+    assert run.attributes["generations"] == 2
@@ -0,0 +1,235 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+
+def _collection_with(documents, embeddings):
+    from vector_store import ChromaVectorStore
+    collection = MagicMock()
+    collection.get.return_value = {
+        "ids": [f"d{i}" for i in range(len(documents))],
+        "documents": documents,
+        "embeddings": embeddings,
+    }
+    return ChromaVectorStore(collection)
+
+
+def test_embedder_matches_collection_accepts_same_vectors():
+    from vector_store import embedder_matches_collection
+    embedder = MagicMock()
+    embedder.embed_batch.return_value = [[0.6, 0.8], [2.0, 0.0]]
+
+    collection = _collection_with(["a", "b"], [[0.6, 0.8], [1.0, 0.0]])
+
+    assert embedder_matches_collection(embedder, collection) is True
+    embedder.embed_batch.assert_called_once_with(["a", "b"], "search_document")
+
+
+def test_embedder_matches_collection_rejects_different_vectors():
+    from vector_store import embedder_matches_collection
+    embedder = MagicMock()
+    embedder.embed_batch.return_value = [[0.0, 1.0]]
+
+    collection = _collection_with(["a"], [[1.0, 0.0]])
+
+    assert embedder_matches_collection(embedder, collection) is False
+
+
+def test_embedder_matches_collection_rejects_dimension_mismatch():
+    from vector_store import embedder_matches_collection
+    embedder = MagicMock()
+    embedder.embed_batch.return_value = [[1.0, 0.0, 0.0]]
+
+    collection = _collection_with(["a"], [[1.0, 0.0]])
+
+    assert embedder_matches_collection(embedder, collection) is False
+
+
+def _indexed_collection():
+    collection = MagicMock()
+    collection.id = "c1"
+    collection.count.return_value = 4
+    collection.get.return_value = {
+        "ids": ["a", "b", "c", "d"],
+        "documents": ["doc a", "doc b", "doc c", "doc d"],
+        "embeddings": [[0.0, 0.0], [1.0, 0.0], [0.0, 2.0], [3.0, 3.0]],
+        "metadatas": [{"page_number": 1, "tag_fees": True}, {"page_number": 2}, {"page_number": 2, "tag_fees": True}, None],
+    }
+    return collection
+
+
+def test_chroma_store_flattens_query_results():
+    from vector_store import ChromaVectorStore
+    collection = MagicMock()
+    collection.query.return_value = {"documents": [["doc a", "doc b"], ["doc c"]], "distances": [[0.1, 0.2], [0.3]]}
+
+    results = ChromaVectorStore(collection).query_batch([[0.0], [1.0]], n_results=2, where={"tag_fees": True})
+
+    assert results == [[("doc a", 0.1), ("doc b", 0.2)], [("doc c", 0.3)]]
+    assert collection.query.call_args[1]["where"] == {"tag_fees": True}
+
+
+def test_get_client_is_shared_per_path(tmp_path, monkeypatch):
+    import vector_store
+    created = []
+    monkeypatch.setattr(vector_store, "PersistentClient", lambda path: created.append(path) or MagicMock())
+    monkeypatch.setattr(vector_store, "_clients", {})
+
+    first = vector_store.get_client(str(tmp_path))
+    assert vector_store.get_client(str(tmp_path / ".")) is first
+    vector_store.get_client(str(tmp_path / "other"))
+
+    assert len(created) == 2
+
+
+def test_in_memory_index_returns_nearest_by_squared_l2():
+    from vector_store import ChromaVectorStore, InMemoryVectorIndex
+    index = InMemoryVectorIndex(ChromaVectorStore(_indexed_collection()))
+
+    results = index.query_batch([[0.9, 0.0], [3.0, 2.5]], n_results=2)
+
+    assert [doc for doc, _ in results[0]] == ["doc b", "doc a"]
+    assert [dist for _, dist in results[0]] == pytest.approx([0.01, 0.81])
+    assert [doc for doc, _ in results[1]] == ["doc d", "doc c"]
+
+
+def test_in_memory_index_applies_where_filters():
+    from vector_store import ChromaVectorStore, InMemoryVectorIndex
+    index = InMemoryVectorIndex(ChromaVectorStore(_indexed_collection()))
+    query = [[1.0, 0.0]]
+
+    tagged = index.query_batch(query, n_results=5, where={"tag_fees": {"$eq": True}})
+    either = index.query_batch(query, n_results=5, where={"$or": [{"tag_fees": {"$eq": True}}, {"page_number": 2}]})
+    missing = index.query_batch(query, n_results=5, where={"tag_unknown": {"$eq": True}})
+
+    assert [doc for doc, _ in tagged[0]] == ["doc a", "doc c"]
+    assert [doc for doc, _ in either[0]] == ["doc b", "doc a", "doc c"]
+    assert missing == [[]]
+
+
+def test_in_memory_index_reloads_when_collection_changes():
+    from vector_store import ChromaVectorStore, InMemoryVectorIndex
+    collection = _indexed_collection()
+    index = InMemoryVectorIndex(ChromaVectorStore(collection), refresh_interval=0)
+    assert len(index) == 4
+
+    collection.count.return_value = 1
+    collection.get.return_value = {"ids": ["e"], "documents": ["doc e"], "embeddings": [[5.0, 5.0]], "metadatas": [None]}
+
+    # The reload runs on a background thread started by the next query
+    index.query_batch([[0.0, 0.0]], n_results=3)
+    index._refresh_thread.join()
+    assert index.query_batch([[0.0, 0.0]], n_results=3) == [[("doc e", 50.0)]]
+
+
+def test_in_memory_query_finishes_on_its_snapshot_when_a_refresh_overlaps():
+    from vector_store import ChromaVectorStore, InMemoryVectorIndex
+    collection = _indexed_collection()
+    index = InMemoryVectorIndex(ChromaVectorStore(collection), refresh_interval=3600)
+    nearest = index._nearest
+
+    def refresh_then_search(*args):
+        # Another thread reloads a smaller collection after this query read the snapshot
+        collection.count.return_value = 1
+        collection.get.return_value = {"ids": ["e"], "documents": ["doc e"], "embeddings": [[5.0, 5.0]], "metadatas": [None]}
+        index._refresh()
+        return nearest(*args)
+
+    index._nearest = refresh_then_search
+    results = index.query_batch([[3.0, 2.5]], n_results=2, where={"tag_fees": {"$eq": True}})
+    index._nearest = nearest
+
+    assert [doc for doc, _ in results[0]] == ["doc c", "doc a"]
+    assert index.query_batch([[0.0, 0.0]], n_results=3) == [[("doc e", 50.0)]]
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_faiss_index_matches_exact_search(tmp_path, index_type):
+    pytest.importorskip("faiss")
+    from vector_store import ChromaVectorStore, FaissVectorIndex
+    index = FaissVectorIndex(ChromaVectorStore(_indexed_collection()), index_type=index_type, directory=str(tmp_path))
+
+    results = index.query_batch([[0.9, 0.0]], n_results=2)
+    tagged = index.query_batch([[1.0, 0.0]], n_results=5, where={"tag_fees": {"$eq": True}})
+
+    assert [doc for doc, _ in results[0]] == ["doc b", "doc a"]
+    assert [dist for _, dist in results[0]] == pytest.approx([0.01, 0.81])
+    assert [doc for doc, _ in tagged[0]] == ["doc a", "doc c"]
+
+
+def test_faiss_ivfpq_index_finds_neighbours(tmp_path):
+    pytest.importorskip("faiss")
+    from vector_store import ChromaVectorStore, FaissVectorIndex
+    embeddings = np.random.default_rng(0).standard_normal((300, 8), dtype=np.float32)
+    collection = MagicMock()
+    collection.id = "c1"
+    collection.count.return_value = len(embeddings)
+    collection.get.return_value = {
+        "ids": [f"d{i}" for i in range(len(embeddings))],
+        "documents": [f"doc {i}" for i in range(len(embeddings))],
+        "embeddings": embeddings.tolist(),
+        "metadatas": [None] * len(embeddings),
+    }
+    index = FaissVectorIndex(ChromaVectorStore(collection), index_type="ivfpq", directory=str(tmp_path), pq_m=4, pq_bits=6)
+
+    results = index.query_batch(embeddings[:2].tolist(), n_results=5)
+
+    assert [len(found) for found in results] == [5, 5]
+    assert "doc 0" in [doc for doc, _ in results[0]]
+    assert "doc 1" in [doc for doc, _ in results[1]]
+
+
+def test_faiss_ivfpq_index_searches_small_collections_exactly(tmp_path):
+    pytest.importorskip("faiss")
+    from vector_store import ChromaVectorStore, FaissVectorIndex
+    # Four chunks cannot train 2^8 PQ centroids
+    index = FaissVectorIndex(ChromaVectorStore(_indexed_collection()), index_type="ivfpq", directory=str(tmp_path), pq_m=2)
+
+    results = index.query_batch([[0.9, 0.0]], n_results=2)
+    tagged = index.query_batch([[1.0, 0.0]], n_results=5, where={"tag_fees": {"$eq": True}})
+
+    assert [doc for doc, _ in results[0]] == ["doc b", "doc a"]
+    assert [dist for _, dist in results[0]] == pytest.approx([0.01, 0.81])
+    assert [doc for doc, _ in tagged[0]] == ["doc a", "doc c"]
+
+
+def test_faiss_index_is_reused_from_disk(tmp_path):
+    pytest.importorskip("faiss")
+    from vector_store import ChromaVectorStore, FaissVectorIndex
+    collection = _indexed_collection()
+    FaissVectorIndex(ChromaVectorStore(collection), index_type="flat", directory=str(tmp_path))
+
+    stored = collection.get.return_value
+    collection.get.return_value = {key: list(reversed(stored[key])) for key in ("ids", "documents", "metadatas")}
+    index = FaissVectorIndex(ChromaVectorStore(collection), index_type="flat", directory=str(tmp_path))
+
+    assert "embeddings" not in collection.get.call_args[1]["include"]
+    assert index.query_batch([[0.9, 0.0]], n_results=1)[0][0][0] == "doc b"
+
+
+def test_faiss_index_rejects_unknown_type():
+    from vector_store import ChromaVectorStore, FaissVectorIndex
+    with pytest.raises(ValueError):
+        FaissVectorIndex(ChromaVectorStore(_indexed_collection()), index_type="annoy")
+
+
+def test_chroma_store_ranks_only_the_given_ids():
+    from vector_store import ChromaVectorStore
+    collection = _indexed_collection()
+    collection.get.return_value = {"ids": ["c", "d"], "documents": ["doc c", "doc d"], "embeddings": [[0.0, 2.0], [3.0, 3.0]]}
+
+    results = ChromaVectorStore(collection).query_batch([[0.0, 0.0]], n_results=5, ids=["c", "d"])
+
+    assert results == [[("doc c", 4.0), ("doc d", 18.0)]]
+    assert collection.get.call_args[1]["ids"] == ["c", "d"]
+    collection.query.assert_not_called()
+
+
+def test_in_memory_index_limits_to_ids():
+    from vector_store import ChromaVectorStore, InMemoryVectorIndex
+    index = InMemoryVectorIndex(ChromaVectorStore(_indexed_collection()))
+
+    results = index.query_batch([[1.0, 0.0]], n_results=5, ids=["d", "c", "unknown"])
+
+    assert [doc for doc, _ in results[0]] == ["doc c", "doc d"]
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from typing import Any
 
 from pydantic import BaseModel
 
@@ -12,6 +13,14 @@ class ToolResult(BaseModel):
     success: bool
 
 
+class PrefetchResult(BaseModel):
+    """Speculative work a tool did on the raw user input before the model asked for it."""
+    query: str
+    data: Any = None
+    elapsed: float = 0.0
+    reused: bool = False  # set by execute_prefetched when the work replaced part of the call
+
+
 class Tool(ABC):
     name: str
     description: str
@@ -21,6 +30,14 @@ class Tool(ABC):
     def execute(self, **kwargs) -> ToolResult:
         ...
 
+    def prefetch(self, text: str) -> PrefetchResult | None:
+        """Start work for a likely call about ``text``. Tools that can't speculate return None."""
+        return None
+
+    def execute_prefetched(self, prefetched: PrefetchResult, **kwargs) -> ToolResult:
+        """Execute a call, reusing or merging the output of an earlier prefetch."""
+        return self.execute(**kwargs)
+
 
 class ToolRegistry:
     def __init__(self) -> None:
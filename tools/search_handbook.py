@@ -1,10 +1,16 @@
 import logging
+import re
+import time
+from concurrent.futures import Executor
 
-from chromadb import Collection
-
+from bm25 import CollectionBM25Index
+from keyword_index import KeywordIndex
+from metrics import CHROMA_QUERY_LATENCY, EMBEDDING_LATENCY, LEXICAL_SEARCH_LATENCY
 from nlp import extract_keywords
 from providers import LLMProvider
-from tools import Tool, ToolResult
+from tools import PrefetchResult, Tool, ToolResult
+from tracing import tracer
+from vector_store import VectorStore
 
 log = logging.getLogger(__name__)
 
@@ -13,6 +19,42 @@ CONFIDENCE_THRESHOLD = 1.0
 HIGH_CONFIDENCE_REMINDER = "\n\n---\nBase your answer on the information above. You may reason about or build upon this content, but do not invent facts not found here."
 LOW_CONFIDENCE_REMINDER = "\n\n---\nThese results may not be relevant to the question. If none are relevant, say you don't have that information rather than guessing."
 MAX_CONTEXT_CHARS = 6000
+PREFETCH_MATCH_THRESHOLD = 0.8
+DEFAULT_N_RESULTS = 3
+RRF_K = 60
+
+
+def _words(text: str) -> set[str]:
+    return {w for w in re.findall(r"\w+", text.lower()) if len(w) > 2}
+
+
+def _similar_queries(a: str, b: str) -> bool:
+    """Cheap lexical check (word overlap coefficient) for whether two queries ask the same thing."""
+    wa, wb = _words(a), _words(b)
+    if not wa or not wb:
+        return False
+    return len(wa & wb) / min(len(wa), len(wb)) >= PREFETCH_MATCH_THRESHOLD
+
+
+def _reciprocal_rank_fusion(rankings: list[list[str]], k: int = RRF_K) -> list[str]:
+    """Merge ranked lists of documents, scoring each by the sum of 1 / (k + rank) over the lists it appears in."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            scores[doc] = scores.get(doc, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.__getitem__, reverse=True)
+
+
+def _deduplicate(rankings: list[list[tuple[str, float]]]) -> list[tuple[str, float]]:
+    """Concatenate ranked (doc, distance) lists, keeping each document's first occurrence."""
+    seen: set[str] = set()
+    docs: list[tuple[str, float]] = []
+    for ranking in rankings:
+        for doc, dist in ranking:
+            if doc not in seen:
+                seen.add(doc)
+                docs.append((doc, dist))
+    return docs
 
 
 class SearchHandbookTool(Tool):
@@ -39,38 +81,80 @@ class SearchHandbookTool(Tool):
         "required": ["queries"],
     }
 
-    def __init__(self, provider: LLMProvider, collection: Collection):
+    def __init__(
+        self,
+        provider: LLMProvider,
+        store: VectorStore,
+        embed_executor: Executor | None = None,
+        lexical_index: CollectionBM25Index | None = None,
+        keyword_index: KeywordIndex | None = None,
+    ):
         self._provider = provider
-        self._collection = collection
-
-    def _search(self, queries: list[str], n_results: int, where_filter: dict | None = None) -> list[tuple[str, float]]:
-        """Search for each query, return deduplicated (doc, distance) pairs preserving order."""
-        seen: set[str] = set()
-        docs: list[tuple[str, float]] = []
-        for q in queries:
-            embedding = self._provider.embed(q, "search_query")
-            try:
-                params = {
-                    "query_embeddings": [embedding],
-                    "n_results": n_results,
-                    "include": ["documents", "distances"],
-                }
-                if where_filter:
-                    params["where"] = where_filter
-                results = self._collection.query(**params)
-                result_docs = results.get("documents", [[]])[0]
-                result_distances = results.get("distances", [[]])[0]
-                for doc, dist in zip(result_docs, result_distances):
-                    if doc not in seen:
-                        seen.add(doc)
-                        docs.append((doc, dist))
-            except Exception:
-                continue
-        return docs
+        self._store = store
+        # Embedding calls are funneled through this pool (if set) to bound their concurrency
+        self._embed_executor = embed_executor
+        # BM25 over the same chunks; when set, its hits are fused with the vector results
+        self._lexical_index = lexical_index
+        # Keyword → chunk ids, used to narrow the last-resort search
+        self._keyword_index = keyword_index
+
+    def _search_rankings(
+        self,
+        embeddings: list[list[float]],
+        n_results: int,
+        ids: list[str] | None = None,
+    ) -> list[list[tuple[str, float]]]:
+        """Query all embeddings in one call, return each query's (doc, distance) pairs, nearest first."""
+        try:
+            with tracer.start_as_current_span("chroma.query", attributes={"queries": len(embeddings), "n_results": n_results}), \
+                    CHROMA_QUERY_LATENCY.time():
+                return self._store.query_batch(embeddings, n_results, ids=ids)
+        except Exception:
+            log.exception("Handbook search failed")
+            return []
+
+    def _search(
+        self,
+        embeddings: list[list[float]],
+        n_results: int,
+        ids: list[str] | None = None,
+    ) -> list[tuple[str, float]]:
+        """Query all embeddings in one call, return deduplicated (doc, distance) pairs preserving order."""
+        return _deduplicate(self._search_rankings(embeddings, n_results, ids))
+
+    def _lexical_search(self, queries: list[str], n_results: int) -> list[str]:
+        if self._lexical_index is None:
+            return []
+        with tracer.start_as_current_span("bm25.search", attributes={"queries": len(queries)}), \
+                LEXICAL_SEARCH_LATENCY.time():
+            return [doc for doc, _ in self._lexical_index.search(" ".join(queries), n_results)]
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        with tracer.start_as_current_span("embed", attributes={"texts": len(texts)}), EMBEDDING_LATENCY.time():
+            if self._embed_executor is None:
+                return self._provider.embed_batch(texts, "search_query")
+            return self._embed_executor.submit(self._provider.embed_batch, texts, "search_query").result()
+
+    def prefetch(self, text: str) -> PrefetchResult:
+        """Search the raw user input while the model is still deciding on its queries."""
+        started = time.perf_counter()
+        embedding = self._embed([text])[0]
+        docs = self._search([embedding], DEFAULT_N_RESULTS)
+        return PrefetchResult(
+            query=text,
+            data={"embedding": embedding, "docs": docs},
+            elapsed=time.perf_counter() - started,
+        )
 
     def execute(self, **kwargs) -> ToolResult:
+        return self._execute(kwargs, prefetched=None)
+
+    def execute_prefetched(self, prefetched: PrefetchResult, **kwargs) -> ToolResult:
+        return self._execute(kwargs, prefetched=prefetched)
+
+    def _execute(self, kwargs: dict, prefetched: PrefetchResult | None) -> ToolResult:
         queries = kwargs.get("queries", [])
-        n_results = kwargs.get("n_results", 3)
+        n_results = kwargs.get("n_results", DEFAULT_N_RESULTS)
 
         # Support single string for model flexibility
         if isinstance(queries, str):
@@ -81,25 +165,51 @@ class SearchHandbookTool(Tool):
 
         log.info(f"Search queries: {queries} (n_results={n_results})")
 
-        # Primary: pure vector search
-        docs = self._search(queries, n_results)
+        # Queries that match the prefetched user input reuse its embedding and results
+        matched: set[int] = set()
+        if prefetched is not None:
+            matched = {i for i, q in enumerate(queries) if _similar_queries(q, prefetched.query)}
+            prefetched.reused = bool(matched)
+
+        # Primary: pure vector search, remaining queries embedded in one request
+        pending = [q for i, q in enumerate(queries) if i not in matched]
+        fresh = iter(self._embed(pending) if pending else [])
+        embeddings = [
+            prefetched.data["embedding"] if i in matched else next(fresh)
+            for i in range(len(queries))
+        ]
+        rankings = self._search_rankings([e for i, e in enumerate(embeddings) if i not in matched], n_results) if pending else []
+
+        if prefetched is not None:
+            # Matched results lead; otherwise the raw-input results are merged in after the model's own
+            rankings = [prefetched.data["docs"], *rankings] if matched else [*rankings, prefetched.data["docs"]]
+            log.info(f"Prefetch {'reused' if matched else 'merged'} for query {prefetched.query!r}")
+        docs = _deduplicate(rankings)
 
         log.info(f"Vector search returned {len(docs)} docs")
         for i, (doc, dist) in enumerate(docs):
             log.debug(f"  [{i}] dist={dist:.3f} ({len(doc)} chars) {doc[:80]}...")
 
+        # Hybrid: BM25 catches exact terms (course codes, office names) the embeddings rank poorly
+        lexical = self._lexical_search(queries, n_results)
+        if lexical:
+            # Each query's ranking is fused on its own, so documents several queries agree on rise
+            distances = dict(docs)
+            fused = _reciprocal_rank_fusion([[doc for doc, _ in ranking] for ranking in rankings] + [lexical])
+            docs = [(doc, distances.get(doc)) for doc in fused]
+            log.info(f"BM25 returned {len(lexical)} docs, {len(docs)} after fusion")
+
         # Last resort: keyword filter (may surface tagged docs that vector search missed)
-        if not docs:
+        if not docs and self._keyword_index is not None:
             all_keywords: list[str] = []
             for q in queries:
                 all_keywords.extend(extract_keywords(q, use_fallback=True, include_verb=True))
             all_keywords = list(set(all_keywords))
 
-            log.info(f"Keyword fallback with: {all_keywords}")
-            if all_keywords:
-                or_conditions = [{f"tag_{kw}": {"$eq": True}} for kw in all_keywords]
-                where_filter = {"$or": or_conditions} if len(or_conditions) > 1 else or_conditions[0]
-                docs = self._search(queries, n_results, where_filter)
+            tagged_ids = self._keyword_index.lookup(all_keywords)
+            log.info(f"Keyword fallback with: {all_keywords} ({len(tagged_ids)} tagged docs)")
+            if tagged_ids:
+                docs = self._search(embeddings, n_results, ids=tagged_ids)
                 log.info(f"Keyword fallback returned {len(docs)} docs")
 
         if not docs:
@@ -111,8 +221,9 @@ class SearchHandbookTool(Tool):
                 success=False,
             )
 
-        # Compute average distance to determine confidence
-        avg_distance = sum(dist for _, dist in docs) / len(docs)
+        # Compute average distance to determine confidence (BM25-only hits have none)
+        distances = [dist for _, dist in docs if dist is not None]
+        avg_distance = sum(distances) / len(distances) if distances else float("inf")
         high_confidence = avg_distance < CONFIDENCE_THRESHOLD
         confidence_label = "high confidence" if high_confidence else "low confidence"
         reminder = HIGH_CONFIDENCE_REMINDER if high_confidence else LOW_CONFIDENCE_REMINDER
@@ -0,0 +1,68 @@
+"""Opt-in OpenTelemetry tracing.
+
+Spans are always created through the API, which makes them no-ops until
+configure_tracing installs an SDK tracer provider.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+from opentelemetry import trace
+from opentelemetry.trace import Span
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+tracer = trace.get_tracer("emma")
+
+
+def configure_tracing() -> bool:
+    """Install an exporter chosen by TRACING_EXPORTER ("otlp" or "file"); return whether tracing is on.
+
+    The OTLP exporter reads the standard OTEL_EXPORTER_OTLP_* variables. The
+    file exporter appends one JSON span per line to TRACING_FILE.
+    """
+    exporter_name = os.environ.get("TRACING_EXPORTER", "").lower()
+    if not exporter_name:
+        return False
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+    if exporter_name == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        exporter = OTLPSpanExporter()
+    elif exporter_name == "file":
+        out = open(os.environ.get("TRACING_FILE", "./traces.jsonl"), "a")
+        exporter = ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+    else:
+        log.warning(f"Unknown TRACING_EXPORTER {exporter_name!r}, tracing disabled")
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": "emma"}))
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+    log.info(f"Tracing enabled with the {exporter_name} exporter")
+    return True
+
+
+def start_span(name: str, parent: Span | None = None, **attributes: Any) -> Span:
+    """Start a span under an explicit parent.
+
+    The agent's async generators yield to their caller mid-span, so spans are
+    passed around explicitly instead of being attached to the current context.
+    """
+    context = trace.set_span_in_context(parent) if parent is not None else None
+    return tracer.start_span(name, context=context, attributes=attributes)
+
+
+def call_in_span(span: Span, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Call fn with span as the current span, so spans opened inside it (e.g. in a worker thread) nest under it."""
+    with trace.use_span(span, end_on_exit=False):
+        return fn(*args, **kwargs)
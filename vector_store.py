@@ -1,9 +1,575 @@
-from chromadb import PersistentClient
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any
 
-def load_vector_store():
+import numpy as np
+from chromadb import Collection, PersistentClient
+from chromadb.api import ClientAPI
+from pydantic import BaseModel
+
+from providers import LLMProvider
+
+log = logging.getLogger(__name__)
+
+
+DEFAULT_DB_PATH = "./embeddings_db"
+DEFAULT_COLLECTION = "documents"
+
+
+class StoredChunks(BaseModel):
+    """Rows read back from a vector store, in matching order."""
+    ids: list[str]
+    documents: list[str]
+    metadatas: list[dict | None]
+    embeddings: Any = None  # float32 array of shape (rows, dim), when asked for
+
+
+class VectorStore(ABC):
+    """
+    Where handbook chunks and their embeddings are kept and searched.
+
+    Distances are squared L2. ``where`` filters use Chroma's syntax, which
+    every implementation accepts at least for ``$and``, ``$or``, ``$eq``,
+    ``$ne`` and ``$in``.
+    """
+
+    @abstractmethod
+    def add_batch(
+        self,
+        ids: list[str],
+        documents: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict] | None = None,
+    ) -> None:
+        ...
+
+    @abstractmethod
+    def query_batch(
+        self,
+        embeddings: list[list[float]],
+        n_results: int,
+        where: dict | None = None,
+        ids: list[str] | None = None,
+    ) -> list[list[tuple[str, float]]]:
+        """Nearest (document, distance) pairs for each query embedding, best first, among ``ids`` if given."""
+        ...
+
+    @abstractmethod
+    def get_by_ids(
+        self,
+        ids: list[str] | None = None,
+        limit: int | None = None,
+        include_embeddings: bool = False,
+    ) -> StoredChunks:
+        """The given rows, or all of them (up to ``limit``) when ``ids`` is None."""
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def version(self) -> str:
+        """Fingerprint that changes when the store is rebuilt or documents are added."""
+        ...
+
+    def sidecar_path(self, suffix: str) -> str | None:
+        """Path for a file kept next to this store's data, or None if the store is not saved to disk."""
+        return None
+
+
+_clients: dict[str, ClientAPI] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(path: str = DEFAULT_DB_PATH) -> ClientAPI:
+    """
+    The process-wide Chroma client for a database directory, created on first use.
+    """
+    path = os.path.abspath(path)
+    with _clients_lock:
+        if path not in _clients:
+            _clients[path] = PersistentClient(path=path)
+        return _clients[path]
+
+
+class ChromaVectorStore(VectorStore):
+    def __init__(self, collection: Collection, directory: str | None = None):
+        self._collection = collection
+        # Database directory, when known; files belonging to the collection are kept there
+        self._directory = directory
+
+    def add_batch(
+        self,
+        ids: list[str],
+        documents: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict] | None = None,
+    ) -> None:
+        self._collection.add(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+
+    def query_batch(
+        self,
+        embeddings: list[list[float]],
+        n_results: int,
+        where: dict | None = None,
+        ids: list[str] | None = None,
+    ) -> list[list[tuple[str, float]]]:
+        if ids is not None:
+            return self._query_ids(embeddings, n_results, where, ids)
+        params = {
+            "query_embeddings": embeddings,
+            "n_results": n_results,
+            "include": ["documents", "distances"],
+        }
+        if where:
+            params["where"] = where
+        results = self._collection.query(**params)
+        return [
+            list(zip(docs, distances))
+            for docs, distances in zip(results.get("documents") or [], results.get("distances") or [])
+        ]
+
+    def _query_ids(
+        self,
+        embeddings: list[list[float]],
+        n_results: int,
+        where: dict | None,
+        ids: list[str],
+    ) -> list[list[tuple[str, float]]]:
+        # Chroma queries cannot be limited to ids, so the few candidates are fetched and ranked here
+        params = {"ids": ids, "include": ["documents", "embeddings"]}
+        if where:
+            params["where"] = where
+        stored = self._collection.get(**params)
+        documents = stored.get("documents") or []
+        queries = np.asarray(embeddings, dtype=np.float32)
+        k = min(n_results, len(documents))
+        if k == 0:
+            return [[] for _ in queries]
+        matrix = _embedding_matrix(stored.get("embeddings"))
+        rows, distances = _nearest_l2(matrix, (matrix * matrix).sum(axis=1), queries, k)
+        return [
+            [(documents[i], max(d, 0.0)) for i, d in zip(row, dists)]
+            for row, dists in zip(rows.tolist(), distances.tolist())
+        ]
+
+    def get_by_ids(
+        self,
+        ids: list[str] | None = None,
+        limit: int | None = None,
+        include_embeddings: bool = False,
+    ) -> StoredChunks:
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        stored = self._collection.get(ids=ids, limit=limit, include=include)
+        ids = stored.get("ids") or []
+        embeddings = stored.get("embeddings") if include_embeddings else None
+        return StoredChunks(
+            ids=ids,
+            documents=stored.get("documents") or [],
+            metadatas=stored.get("metadatas") or [None] * len(ids),
+            embeddings=_embedding_matrix(embeddings) if include_embeddings else None,
+        )
+
+    def count(self) -> int:
+        return self._collection.count()
+
+    def version(self) -> str:
+        return f"{self._collection.id}:{self._collection.count()}"
+
+    def sidecar_path(self, suffix: str) -> str | None:
+        if self._directory is None:
+            return None
+        return os.path.join(self._directory, f"{self._collection.name}.{suffix}")
+
+
+def load_vector_store(path: str | None = None, collection_name: str | None = None) -> ChromaVectorStore:
+    """
+    Open the Chroma collection at VECTOR_DB_PATH named VECTOR_COLLECTION, unless given explicitly.
+    """
+    if path is None:
+        path = os.environ.get("VECTOR_DB_PATH", DEFAULT_DB_PATH)
+    if collection_name is None:
+        collection_name = os.environ.get("VECTOR_COLLECTION", DEFAULT_COLLECTION)
+    return ChromaVectorStore(get_client(path).get_or_create_collection(collection_name), directory=path)
+
+
+def embedder_matches_collection(
+    embedder: LLMProvider,
+    store: VectorStore,
+    sample_size: int = 3,
+    min_similarity: float = 0.99,
+) -> bool:
+    """
+    Re-embed a few stored documents and check the vectors agree with the stored ones.
+    """
+    stored = store.get_by_ids(limit=sample_size, include_embeddings=True)
+    if not stored.documents:
+        return True
+
+    expected = np.array(stored.embeddings, dtype=np.float32)
+    actual = np.asarray(embedder.embed_batch(stored.documents, "search_document"), dtype=np.float32)
+    if expected.shape != actual.shape:
+        log.warning(f"Embedding dimension mismatch: collection has {expected.shape[1]}, embedder returns {actual.shape[1]}")
+        return False
+
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    actual /= np.linalg.norm(actual, axis=1, keepdims=True)
+    similarity = float((expected * actual).sum(axis=1).min())
+    if similarity < min_similarity:
+        log.warning(f"Embedder disagrees with stored vectors (min cosine similarity {similarity:.4f})")
+        return False
+    return True
+
+
+def _embedding_matrix(embeddings: Any) -> np.ndarray:
+    if embeddings is None or len(embeddings) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def _nearest_l2(matrix: np.ndarray, norms: np.ndarray, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Row numbers and squared L2 distances of the k rows nearest to each query, best first."""
+    # matrix @ queries.T keeps the large operand row-major for BLAS, which is faster than queries @ matrix.T
+    products = np.ascontiguousarray((matrix @ queries.T).T)
+    distances = (queries * queries).sum(axis=1, keepdims=True) + norms - 2.0 * products
+
+    top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    top_distances = np.take_along_axis(distances, top, axis=1)
+    order = np.argsort(top_distances, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_distances, order, axis=1)
+
+
+class MirrorSnapshot:
+    """
+    One consistent version of a mirrored store: its rows, their filter masks, and the structure searched.
+
+    Snapshots are never changed after they are built; a reload builds a new
+    one and swaps it in, so a query that started on the old one can finish
+    with it.
+    """
+
+    def __init__(self, ids: list[str], documents: list[str], metadatas: list[dict | None], searcher: Any = None):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.searcher = searcher
+        self.rows = {id_: i for i, id_ in enumerate(ids)}
+        self.masks: dict[str, np.ndarray] = {}
+        for i, metadata in enumerate(metadatas):
+            for key, value in (metadata or {}).items():
+                if value is True:
+                    self.masks.setdefault(key, np.zeros(len(ids), dtype=bool))[i] = True
+
+    def id_mask(self, ids: list[str]) -> np.ndarray:
+        mask = np.zeros(len(self.ids), dtype=bool)
+        mask[[self.rows[id_] for id_ in ids if id_ in self.rows]] = True
+        return mask
+
+    def mask(self, where: dict) -> np.ndarray:
+        """Boolean mask of the rows matching a Chroma ``where`` filter ($and, $or, $eq, $ne, $in)."""
+        masks = []
+        for key, condition in where.items():
+            if key in ("$and", "$or"):
+                parts = [self.mask(part) for part in condition]
+                masks.append(np.logical_and.reduce(parts) if key == "$and" else np.logical_or.reduce(parts))
+                continue
+            op, value = next(iter(condition.items())) if isinstance(condition, dict) else ("$eq", condition)
+            if op == "$eq" and value is True:
+                masks.append(self.masks.get(key, np.zeros(len(self.ids), dtype=bool)))
+            elif op in ("$eq", "$ne", "$in"):
+                values = [(m or {}).get(key) for m in self.metadatas]
+                if op == "$eq":
+                    masks.append(np.array([v == value for v in values], dtype=bool))
+                elif op == "$ne":
+                    masks.append(np.array([v != value for v in values], dtype=bool))
+                else:
+                    masks.append(np.array([v in value for v in values], dtype=bool))
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+        return np.logical_and.reduce(masks)
+
+
+class MirroredVectorStore(VectorStore):
     """
-    Load the vector store from the local database.
+    Base for stores that search an in-memory copy of another store.
+
+    Writes and reads go to the source store; only ``query_batch`` is served
+    from the copy. Subclasses build a MirrorSnapshot in ``_load`` and find
+    neighbours in it with ``_nearest``. Boolean metadata becomes masks once;
+    other ``where`` values are compared on the fly. The copy is reloaded
+    when the source's version changes, checked at most every
+    ``refresh_interval`` seconds on a background thread; queries keep
+    using the previous copy until the new one is ready.
     """
-    client = PersistentClient(path="./embeddings_db")
-    vector_store = client.get_or_create_collection("documents")
-    return vector_store
\ No newline at end of file
+
+    def __init__(self, source: VectorStore, refresh_interval: float = 30.0):
+        self._source = source
+        self._refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._version: str | None = None
+        self._snapshot = MirrorSnapshot([], [], [])
+        self._refresh_thread: threading.Thread | None = None
+
+    def __len__(self) -> int:
+        return len(self._snapshot.ids)
+
+    @abstractmethod
+    def _load(self, version: str) -> MirrorSnapshot:
+        """Build a snapshot of the source, with its rows in the order ``_nearest`` numbers them."""
+        ...
+
+    @abstractmethod
+    def _nearest(
+        self,
+        snapshot: MirrorSnapshot,
+        queries: np.ndarray,
+        k: int,
+        candidates: np.ndarray | None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Row numbers and distances of the k nearest rows per query, best first, among ``candidates`` if given."""
+        ...
+
+    def add_batch(
+        self,
+        ids: list[str],
+        documents: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict] | None = None,
+    ) -> None:
+        self._source.add_batch(ids, documents, embeddings, metadatas)
+
+    def query_batch(
+        self,
+        embeddings: list[list[float]],
+        n_results: int,
+        where: dict | None = None,
+        ids: list[str] | None = None,
+    ) -> list[list[tuple[str, float]]]:
+        if time.monotonic() - self._checked_at > self._refresh_interval:
+            self._refresh_in_background()
+        # Read once: a reload may swap in a new snapshot while this query runs
+        snapshot = self._snapshot
+
+        queries = np.asarray(embeddings, dtype=np.float32)
+        candidates = None
+        if where or ids is not None:
+            mask = snapshot.mask(where) if where else np.ones(len(snapshot.ids), dtype=bool)
+            if ids is not None:
+                mask &= snapshot.id_mask(ids)
+            candidates = np.flatnonzero(mask)
+        k = min(n_results, len(snapshot.ids) if candidates is None else len(candidates))
+        if k == 0:
+            return [[] for _ in queries]
+        rows, distances = self._nearest(snapshot, queries, k, candidates)
+        # Approximate indexes mark missing neighbours with -1
+        return [
+            [(snapshot.documents[i], max(d, 0.0)) for i, d in zip(row, dists) if i >= 0]
+            for row, dists in zip(rows.tolist(), distances.tolist())
+        ]
+
+    def get_by_ids(
+        self,
+        ids: list[str] | None = None,
+        limit: int | None = None,
+        include_embeddings: bool = False,
+    ) -> StoredChunks:
+        return self._source.get_by_ids(ids, limit, include_embeddings)
+
+    def count(self) -> int:
+        return self._source.count()
+
+    def version(self) -> str:
+        return self._source.version()
+
+    def sidecar_path(self, suffix: str) -> str | None:
+        return self._source.sidecar_path(suffix)
+
+    def _refresh_in_background(self) -> None:
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        # Checked now so the queries arriving while the thread starts do not start another
+        self._checked_at = time.monotonic()
+        self._refresh_thread = threading.Thread(target=self._refresh, name=f"{type(self).__name__}-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def _refresh(self) -> None:
+        with self._lock:
+            self._checked_at = time.monotonic()
+            version = self._source.version()
+            if version == self._version:
+                return
+            started = time.perf_counter()
+            snapshot = self._load(version)
+            self._snapshot = snapshot
+            self._version = version
+            log.info(f"Loaded {len(snapshot.ids)} embeddings into {type(self).__name__} in {time.perf_counter() - started:.2f}s")
+
+
+class InMemoryVectorIndex(MirroredVectorStore):
+    """
+    Brute-force search over all of a store's embeddings, for collections small enough to hold in memory.
+
+    The embeddings live in one contiguous float32 matrix, so the queries of a
+    call are answered with a single matrix multiply and ``argpartition``.
+    """
+
+    def __init__(self, source: VectorStore, refresh_interval: float = 30.0):
+        super().__init__(source, refresh_interval)
+        self._refresh()
+
+    def _load(self, version: str) -> MirrorSnapshot:
+        stored = self._source.get_by_ids(include_embeddings=True)
+        matrix = stored.embeddings
+        return MirrorSnapshot(stored.ids, stored.documents, stored.metadatas, (matrix, (matrix * matrix).sum(axis=1)))
+
+    def _nearest(
+        self,
+        snapshot: MirrorSnapshot,
+        queries: np.ndarray,
+        k: int,
+        candidates: np.ndarray | None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        matrix, norms = snapshot.searcher
+        if candidates is not None:
+            # Only the matching rows are scored; filters usually leave a small fraction
+            matrix, norms = matrix[candidates], norms[candidates]
+        top, top_distances = _nearest_l2(matrix, norms, queries, k)
+        if candidates is not None:
+            top = candidates[top]
+        return top, top_distances
+
+
+FAISS_INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+
+class FaissVectorIndex(MirroredVectorStore):
+    """
+    Search through a FAISS index built from a store's embeddings.
+
+    ``index_type`` selects exact search (``flat``), a graph index (``hnsw``,
+    tuned with ``hnsw_m``, ``ef_construction`` and ``ef_search``), or a
+    compressed inverted file (``ivfpq``, tuned with ``nlist``, ``pq_m``,
+    ``pq_bits`` and ``nprobe``) for corpora too large for exact search. The
+    index is saved in ``directory`` together with the source's version
+    and build settings it was made from, and loaded from there on the next
+    start while both still match.
+    """
+
+    def __init__(
+        self,
+        source: VectorStore,
+        index_type: str = "hnsw",
+        directory: str = os.path.join(DEFAULT_DB_PATH, "faiss"),
+        hnsw_m: int = 32,
+        ef_construction: int = 200,
+        ef_search: int = 64,
+        nlist: int = 1024,
+        pq_m: int = 64,
+        pq_bits: int = 8,
+        nprobe: int = 16,
+        refresh_interval: float = 30.0,
+    ):
+        if index_type not in FAISS_INDEX_TYPES:
+            raise ValueError(f"Unknown FAISS index type {index_type!r}, expected one of {', '.join(FAISS_INDEX_TYPES)}")
+        # Imported here so the default Chroma setup does not load FAISS
+        import faiss
+
+        super().__init__(source, refresh_interval)
+        self._faiss = faiss
+        self._index_type = index_type
+        self._directory = directory
+        self._build_settings = {"index_type": index_type}
+        if index_type == "hnsw":
+            self._build_settings.update(hnsw_m=hnsw_m, ef_construction=ef_construction)
+        elif index_type == "ivfpq":
+            self._build_settings.update(nlist=nlist, pq_m=pq_m, pq_bits=pq_bits)
+        self._ef_search = ef_search
+        self._nprobe = nprobe
+        self._refresh()
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self._directory, f"{self._index_type}.faiss")
+
+    def _load(self, version: str) -> MirrorSnapshot:
+        manifest_path = self._index_path + ".json"
+        if os.path.exists(manifest_path) and os.path.exists(self._index_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get("version") == version and manifest.get("settings") == self._build_settings:
+                stored = self._source.get_by_ids(manifest["ids"])
+                # Stores do not promise to return rows in the order asked for
+                position = {id_: i for i, id_ in enumerate(stored.ids)}
+                order = [position[id_] for id_ in manifest["ids"]]
+                index = self._faiss.read_index(self._index_path)
+                log.info(f"Loaded FAISS index from {self._index_path}")
+                return MirrorSnapshot(
+                    manifest["ids"],
+                    [stored.documents[i] for i in order],
+                    [stored.metadatas[i] for i in order],
+                    index,
+                )
+
+        stored = self._source.get_by_ids(include_embeddings=True)
+        matrix = stored.embeddings
+        if len(matrix) == 0:
+            return MirrorSnapshot(stored.ids, stored.documents, stored.metadatas)
+        index = self._build(matrix)
+
+        os.makedirs(self._directory, exist_ok=True)
+        self._faiss.write_index(index, self._index_path + ".tmp")
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump({"version": version, "settings": self._build_settings, "ids": stored.ids}, f)
+        os.replace(self._index_path + ".tmp", self._index_path)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        return MirrorSnapshot(stored.ids, stored.documents, stored.metadatas, index)
+
+    def _build(self, matrix: np.ndarray):
+        faiss = self._faiss
+        dim = matrix.shape[1]
+        if self._index_type == "flat":
+            index = faiss.IndexFlatL2(dim)
+        elif self._index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dim, self._build_settings["hnsw_m"])
+            index.hnsw.efConstruction = self._build_settings["ef_construction"]
+        else:
+            pq_m = self._build_settings["pq_m"]
+            if dim % pq_m:
+                raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dim}")
+            pq_bits = self._build_settings["pq_bits"]
+            if len(matrix) < 2 ** pq_bits:
+                # PQ training needs a point per centroid; collections this small are cheap to search exactly
+                log.warning(f"Only {len(matrix)} embeddings for 2^{pq_bits} PQ centroids, building a flat FAISS index instead")
+                index = faiss.IndexFlatL2(dim)
+            else:
+                # k-means wants roughly 39 training points per list; small collections get fewer lists
+                nlist = max(1, min(self._build_settings["nlist"], len(matrix) // 39))
+                index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, nlist, pq_m, pq_bits)
+                index.train(matrix)
+        index.add(matrix)
+        return index
+
+    def _nearest(
+        self,
+        snapshot: MirrorSnapshot,
+        queries: np.ndarray,
+        k: int,
+        candidates: np.ndarray | None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        faiss = self._faiss
+        selector = faiss.IDSelectorBatch(candidates.astype(np.int64)) if candidates is not None else None
+        # Checked on the index itself, since small ivfpq collections are built flat
+        if isinstance(snapshot.searcher, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(efSearch=max(self._ef_search, k), sel=selector)
+        elif isinstance(snapshot.searcher, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF(nprobe=self._nprobe, sel=selector)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        distances, rows = snapshot.searcher.search(queries, k, params=params)
+        return rows, distances